@@ -0,0 +1,301 @@
+"""
+Structured Aggregation Engine
+Answers total / average / largest / smallest questions over the full crop
+and soil datasets using the pre-built metadata group indexes
+"""
+
+import re
+import numpy as np
+
+# Aggregate operation keywords, matched as whole words
+OPERATIONS = {
+    'sum': ('total', 'sum', 'overall', 'combined', 'altogether'),
+    'mean': ('average', 'avg', 'mean'),
+    'max': ('largest', 'highest', 'maximum', 'max', 'biggest', 'most'),
+    'min': ('smallest', 'lowest', 'minimum', 'min', 'least'),
+}
+
+CROP_METRICS = {
+    'production': ('production', 'produced', 'produce', 'output'),
+    'area': ('area', 'hectares', 'cultivated', 'acreage'),
+    'yield': ('yield', 'productivity'),
+}
+
+SOIL_METRICS = {
+    'pH': ('ph',),
+    'organic_carbon': ('organic', 'carbon'),
+    'nitrogen': ('nitrogen',),
+    'phosphorus': ('phosphorus',),
+    'potassium': ('potassium',),
+}
+
+UNITS = {
+    'production': 'tons', 'area': 'hectares', 'yield': 'tons/hectare',
+    'pH': '', 'organic_carbon': '%', 'nitrogen': 'kg/ha',
+    'phosphorus': 'kg/ha', 'potassium': 'kg/ha',
+}
+
+LABELS = {
+    'production': 'production', 'area': 'area', 'yield': 'yield',
+    'pH': 'pH', 'organic_carbon': 'organic carbon', 'nitrogen': 'nitrogen',
+    'phosphorus': 'phosphorus', 'potassium': 'potassium',
+}
+
+SOURCE_FIELDS = {
+    'crop_production': ('state', 'district', 'crop', 'season', 'year'),
+    'soil_health': ('state', 'district', 'soil_type'),
+}
+
+GROUP_BY_RE = re.compile(r'\b(?:which|what|each|per|by|every)\s+(state|district|crop|season|year)s?\b')
+WORD_RE = re.compile(r'\w+')
+
+
+def detect_aggregate_intent(question):
+    """Return (operation, source, metric, group_by) or None if not an aggregate question"""
+    words = set(WORD_RE.findall(question.lower()))
+
+    operation = None
+    for op, keywords in OPERATIONS.items():
+        if words.intersection(keywords):
+            operation = op
+            break
+    if operation is None:
+        return None
+
+    source, metric = detect_metric(words)
+
+    match = GROUP_BY_RE.search(question.lower())
+    group_by = match.group(1) if match else None
+    if group_by and group_by not in SOURCE_FIELDS[source]:
+        group_by = None
+
+    return operation, source, metric, group_by
+
+
+def detect_metric(words):
+    """(source, metric) a set of question words asks about; crop production by default"""
+    source, metric = 'crop_production', 'production'
+    for name, keywords in CROP_METRICS.items():
+        if words.intersection(keywords):
+            metric = name
+            break
+    else:
+        for name, keywords in SOIL_METRICS.items():
+            if words.intersection(keywords):
+                source, metric = 'soil_health', name
+                break
+        else:
+            if 'soil' in words:
+                source, metric = 'soil_health', 'pH'
+    return source, metric
+
+
+class AggregationEngine:
+    def __init__(self, metadata, index):
+        """
+        Args:
+            metadata: ColumnarMetadata store
+            index: MetadataIndex built over the same store
+        """
+        self.metadata = metadata
+        self.index = index
+
+    def _metric_values(self, metric, rows):
+        if metric == 'yield':
+            return self.metadata.numeric('production')[rows], self.metadata.numeric('area')[rows]
+        return self.metadata.numeric(metric)[rows], None
+
+    def aggregate(self, source, metric, operation, filters=None, group_by=None):
+        """Aggregate a metric over every row of source matching filters
+
+        Returns a result dict, or None if no rows match.
+        """
+        filters = {f: v for f, v in (filters or {}).items() if f in SOURCE_FIELDS[source]}
+        rows = self.index.select(dict(filters, source=[source]))
+
+        values, area = self._metric_values(metric, rows)
+        valid = ~np.isnan(values)
+        if area is not None:
+            valid &= ~np.isnan(area)
+        rows, values = rows[valid], values[valid]
+        area = area[valid] if area is not None else None
+
+        if len(rows) == 0:
+            return None
+
+        result = {
+            'source': source,
+            'metric': metric,
+            'operation': operation,
+            'filters': filters,
+            'group_by': group_by,
+            'count': int(len(rows)),
+        }
+
+        if group_by:
+            result['groups'] = self._grouped(rows, values, area, operation, group_by)
+            return result
+
+        if operation in ('sum', 'mean'):
+            if metric == 'yield':
+                # Yield of a region is total production over total area
+                total_area = area.sum()
+                result['value'] = float(values.sum() / total_area) if total_area else 0.0
+            else:
+                total = float(values.sum())
+                result['value'] = total if operation == 'sum' else total / len(rows)
+        else:
+            if metric == 'yield':
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    values = np.where(area > 0, values / area, np.nan)
+                if np.all(np.isnan(values)):
+                    return None
+                pick = np.nanargmax(values) if operation == 'max' else np.nanargmin(values)
+            else:
+                pick = np.argmax(values) if operation == 'max' else np.argmin(values)
+            result['value'] = float(values[pick])
+            result['record'] = dict(self.metadata[rows[pick]])
+
+        return result
+
+    def _grouped(self, rows, values, area, operation, group_by):
+        """Per-group totals, sorted by the requested operation"""
+        group_codes = np.asarray(self.metadata.columns[group_by])[rows]
+        labels, inverse = np.unique(group_codes, return_inverse=True)
+
+        sums = np.bincount(inverse, weights=values)
+        counts = np.bincount(inverse)
+        if area is not None:
+            area_sums = np.bincount(inverse, weights=area)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                scores = np.where(area_sums > 0, sums / area_sums, 0.0)
+        elif operation == 'mean':
+            scores = sums / counts
+        else:
+            scores = sums
+
+        order = np.argsort(scores, kind='stable')
+        if operation != 'min':
+            order = order[::-1]
+
+        groups = []
+        for i in order[:5]:
+            groups.append({
+                'value': self._label(group_by, labels[i]),
+                'metric': float(scores[i]),
+                'count': int(counts[i]),
+            })
+        return groups
+
+    def _label(self, field, code):
+        if field in self.metadata.categories:
+            return self.metadata.categories[field][code]
+        return int(code)
+
+    def answer(self, question, entities, intent=None):
+        """Aggregate answer for a question, or None if it is not an aggregate query
+
+        Args:
+            intent: the IntentRouter intent when the question was routed;
+                only 'aggregate' and 'comparison' questions are aggregated
+        """
+        if not entities or intent not in (None, 'aggregate', 'comparison'):
+            return None
+        if intent == 'comparison':
+            return self.compare(question, entities)
+
+        detected = detect_aggregate_intent(question)
+        if detected is None:
+            return None
+
+        operation, source, metric, group_by = detected
+        result = self.aggregate(source, metric, operation, entities, group_by)
+        if result is None:
+            return None
+
+        result['answer'] = self.format_answer(result)
+        return result
+
+    def compare(self, question, entities):
+        """Side-by-side totals for a comparison question naming several values of one field
+
+        'Compare rice production in Punjab and Bihar' is grouped by state over
+        both states; soil metrics are compared by their averages.
+        """
+        words = set(WORD_RE.findall(question.lower()))
+        source, metric = detect_metric(words)
+        compared = [field for field in SOURCE_FIELDS[source] if len(entities.get(field, [])) > 1]
+        if not compared:
+            return None
+
+        detected = detect_aggregate_intent(question)
+        if detected is not None:
+            operation = detected[0]
+        else:
+            operation = 'mean' if source == 'soil_health' else 'sum'
+        result = self.aggregate(source, metric, operation, entities, group_by=compared[0])
+        if result is None:
+            return None
+
+        result['answer'] = self.format_answer(result)
+        return result
+
+    def format_answer(self, result):
+        """Human readable sentence for an aggregation result"""
+        metric = result['metric']
+        unit = UNITS[metric]
+        label = LABELS[metric]
+        scope = describe_filters(result['filters'])
+        records = f"{result['count']:,} records"
+
+        def amount(value):
+            return f"{value:,.2f} {unit}".rstrip()
+
+        if result.get('groups'):
+            group_by = result['group_by']
+            noun = {'sum': f'total {label}', 'mean': f'average {label}',
+                    'max': f'total {label}', 'min': f'total {label}'}[result['operation']]
+            if metric == 'yield':
+                noun = 'yield'
+            best = result['groups'][0]
+            if result['operation'] in ('max', 'min'):
+                word = 'highest' if result['operation'] == 'max' else 'lowest'
+                return (f"{best['value']} has the {word} {noun}{scope}: {amount(best['metric'])} "
+                        f"(from {best['count']:,} records).")
+            ranked = ", ".join(f"{g['value']} ({amount(g['metric'])})" for g in result['groups'])
+            return f"{noun.capitalize()} by {group_by}{scope}: {ranked}."
+
+        operation = result['operation']
+        if operation == 'sum':
+            return f"Total {label}{scope} across {records}: {amount(result['value'])}."
+        if operation == 'mean':
+            return f"Average {label}{scope} across {records}: {amount(result['value'])}."
+
+        record = result['record']
+        word = 'Largest' if operation == 'max' else 'Smallest'
+        if result['source'] == 'crop_production':
+            return (f"{word} {label}{scope}: {record['crop']} in {record['state']} district "
+                    f"{record['district']} ({record['season']} {record['year']}) with "
+                    f"{record['production']:,.2f} tons from {record['area']:,.2f} hectares "
+                    f"(out of {records}).")
+        return (f"{word} {label}{scope}: {amount(result['value'])} in {record['state']}, district "
+                f"{record['district']} (subdistrict: {record['subdistrict']}, {record['soil_type']} soil) "
+                f"(out of {records}).")
+
+
+def describe_filters(filters):
+    """' for Rice in Bihar (Kharif, 2010)' style description of the filters"""
+    if not filters:
+        return ""
+    parts = []
+    if filters.get('crop'):
+        parts.append(f" for {', '.join(filters['crop'])}")
+    if filters.get('soil_type'):
+        parts.append(f" for {', '.join(filters['soil_type'])} soil")
+    places = filters.get('district', []) + filters.get('state', [])
+    if places:
+        parts.append(f" in {', '.join(places)}")
+    extra = [str(v) for f in ('season', 'year') for v in filters.get(f, [])]
+    if extra:
+        parts.append(f" ({', '.join(extra)})")
+    return "".join(parts)
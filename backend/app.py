@@ -3,11 +3,15 @@ Flask API Server for Intelligent Q&A System
 Provides REST API endpoint for answering questions
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response, stream_with_context
 from flask_cors import CORS
 import sys
 import os
+import hmac
+import json
 import pickle
+import threading
+import time
 
 # Add parent directory to path to import qa_system
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -15,6 +19,13 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 try:
     import qa_system
     from qa_system import IntelligentQASystem
+    from hot_reload import QASystemManager
+    from response_cache import create_response_cache, cache_key
+    from query_memo import QueryMemo
+    from semantic_cache import create_semantic_cache, evidence_key, AUDIT_AGREEMENT
+    from metrics import create_metrics
+    from intent_router import OPEN_INTENTS
+    import config
 except ImportError:
     print("Warning: Could not import qa_system. Make sure qa_system.py exists.")
 
@@ -68,21 +79,152 @@ def add_cors_headers(response):
     response.headers.setdefault('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
     return response
 
-# Global variable to hold Q&A system
-qa_system = None
+# Per-stage latency histograms and event counters for /metrics (METRICS=0 disables)
+metrics = create_metrics()
+metrics.describe('request_duration_seconds', 'Time to the response headers per endpoint (streams: until the first event)')
+metrics.describe('requests_total', 'Requests per endpoint and status code')
+metrics.describe('stage_duration_seconds', 'Time spent in one stage of answering a question')
+metrics.describe('retrieval_stage_duration_seconds', 'Time spent in one retrieval stage of IntelligentQASystem.search')
+metrics.describe('retrieval_skipped_total', 'Retrieval stages skipped for the latency budget')
+metrics.describe('gemini_fallbacks_total', 'Answers that fell back to the template after a Gemini timeout or error')
+metrics.describe('small_talk_total', 'Greetings answered without searching the knowledge base')
+metrics.describe('intents_total', 'Questions per intent picked by the intent router')
+metrics.describe('semantic_cache_total', 'Semantic cache lookups before a Gemini answer (hit, miss, or an audited hit)')
+metrics.describe('empty_results_total', 'Questions whose search found no relevant chunk')
+metrics.describe('response_cache_hits_total', 'Responses served from the response cache')
+
+@app.before_request
+def start_request_timer():
+    if metrics.enabled:
+        g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.endpoint or 'unmatched'
+        metrics.observe('request_duration_seconds', time.perf_counter() - start, endpoint=endpoint)
+        metrics.inc('requests_total', endpoint=endpoint, status=str(response.status_code))
+    return response
+
+def record_answer_metrics(result, seconds):
+    """Retrieval stage timings of one answer_question result, and the time left for composing the answer"""
+    if not metrics.enabled:
+        return
+    timings = result.get('retrieval') or {}
+    stages = timings.get('stages', {})
+    for name, ms in stages.items():
+        if name != 'total':
+            metrics.observe_ms('retrieval_stage_duration_seconds', ms, stage=name)
+    retrieval_ms = stages.get('total', sum(stages.values()))
+    metrics.observe_ms('stage_duration_seconds', retrieval_ms, stage='retrieval')
+    metrics.observe('stage_duration_seconds', max(seconds - retrieval_ms / 1000, 0.0), stage='compose')
+    for name in timings.get('skipped', []):
+        metrics.inc('retrieval_skipped_total', stage=name)
+    if not result.get('search_results_count'):
+        metrics.inc('empty_results_total')
+
+def route_question(qa, question):
+    """qa.route, timed and counted per intent"""
+    with metrics.timer('stage_duration_seconds', stage='route'):
+        route = qa.route(question)
+    metrics.inc('intents_total', intent=route['intent'])
+    return route
+
+def answer_question(qa, question, top_k, route):
+    """qa.answer_question, recording its stage timings"""
+    start = time.perf_counter()
+    result = qa.answer_question(question, top_k=top_k, route=route)
+    if route['intent'] not in OPEN_INTENTS:
+        record_answer_metrics(result, time.perf_counter() - start)
+    return result
+
+# Token for the admin endpoints; they are disabled when it is not set
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# Vector database to serve, relative to this directory (e.g. a load-test corpus)
+VECTOR_DB_PATH = os.environ.get("VECTOR_DB_PATH", "vector_database.pkl")
+
+# Seconds between checks of the vector database files for a retrained index (0 disables)
+RELOAD_WATCH_INTERVAL = float(os.environ.get("RELOAD_WATCH_INTERVAL", "30"))
+
+# Cache of serialized /query responses (RESPONSE_CACHE=memory|sqlite|off)
+response_cache = create_response_cache()
+
+# Query vectors and rankings of repeated questions, kept across hot reloads
+query_memo = QueryMemo(config.QUERY_MEMO_VECTORS, config.QUERY_MEMO_RESULTS)
+
+# Gemini answers reused for reworded questions with the same retrieval (SEMANTIC_CACHE=off disables)
+semantic_cache = create_semantic_cache()
+
+def invalidate_caches(qa):
+    """Answers and rankings computed on a replaced vector database must not be served again"""
+    if response_cache is not None:
+        response_cache.invalidate(qa.db_version)
+    if semantic_cache is not None:
+        semantic_cache.invalidate(qa.db_version)
+    query_memo.invalidate(qa.db_version)
+
+def semantic_hit(qa, question, top_k, result):
+    """Semantic cache entry whose Gemini answer fits a retrieved question, or None"""
+    if semantic_cache is None:
+        return None
+    hit = semantic_cache.get((qa.db_version, top_k), qa.query_vector(question), evidence_key(result))
+    metrics.inc('semantic_cache_total', result='miss' if hit is None else 'audit' if hit['audit'] else 'hit')
+    return hit
+
+def store_semantic_answer(qa, question, top_k, result, answer, hit=None):
+    """Keep a fresh Gemini answer; after an audited hit, only if the cached one disagreed"""
+    if semantic_cache is None:
+        return
+    if hit is not None:
+        agreement = semantic_cache.audit(hit, answer)
+        if agreement >= AUDIT_AGREEMENT:
+            return
+        print(f"🔎 Semantic cache audit: suspected false hit (similarity {hit['similarity']}, "
+              f"agreement {agreement:.2f}): {question!r} vs cached {hit['question']!r}")
+    semantic_cache.set((qa.db_version, top_k), qa.query_vector(question), evidence_key(result), question, answer)
+
+# Holds the live Q&A system and swaps in retrained ones without a restart
+qa_manager = None
+qa_manager_lock = threading.Lock()
 
 def init_qa_system():
-    """Initialize Q&A system lazily"""
-    global qa_system
-    if qa_system is None:
-        try:
-            print("Initializing Q&A System...")
-            qa_system = IntelligentQASystem()
-            print("✅ Q&A System ready!")
-        except Exception as e:
-            print(f"❌ Error initializing Q&A system: {e}")
-            raise e
-    return qa_system
+    """Initialize Q&A system lazily and return the instance serving this request
+
+    A request keeps the instance it got first even if a reload swaps in a
+    new one meanwhile; the lease is released in release_qa_system.
+    """
+    if 'qa_lease' in g:
+        return g.qa_lease.qa
+    with metrics.timer('stage_duration_seconds', stage='init_qa_system'):
+        return _init_qa_system()
+
+def _init_qa_system():
+    global qa_manager
+    with qa_manager_lock:
+        if qa_manager is None:
+            try:
+                print("Initializing Q&A System...")
+                manager = QASystemManager(lambda: IntelligentQASystem(VECTOR_DB_PATH, memo=query_memo),
+                                          on_swap=invalidate_caches)
+                manager.load()
+                # Started here rather than at import so it also runs in forked gunicorn workers
+                manager.watch(RELOAD_WATCH_INTERVAL)
+                qa_manager = manager
+                print("✅ Q&A System ready!")
+            except Exception as e:
+                print(f"❌ Error initializing Q&A system: {e}")
+                raise e
+    g.qa_lease = qa_manager.acquire()
+    return g.qa_lease.qa
+
+@app.teardown_request
+def release_qa_system(exc):
+    """Let a pending reload know this request is done with its Q&A system"""
+    lease = g.pop('qa_lease', None)
+    if lease is not None:
+        lease.release()
 
 @app.route('/')
 def home():
@@ -93,7 +235,11 @@ def home():
         'gemini_available': GEMINI_AVAILABLE,
         'endpoints': {
             '/query': 'POST - Query the Q&A system',
-            '/health': 'GET - Health check'
+            '/query/stream': 'POST - Query with a Server-Sent Events stream',
+            '/query/batch': 'POST - Answer a list of questions in one request',
+            '/health': 'GET - Health check',
+            '/metrics': 'GET - Latency histograms and counters (Prometheus text format)',
+            '/admin/reload': 'POST - Reload the vector database without downtime'
         }
     })
 
@@ -113,6 +259,29 @@ def health():
             'message': str(e)
         }), 500
 
+def answer_mode(route, result, use_gemini):
+    """How a question is answered: 'open' Gemini response, 'smart' Gemini answer over the sources, or the 'template' answer"""
+    if not (GEMINI_AVAILABLE and use_gemini):
+        return 'template'
+    if route['intent'] == 'greeting':
+        return 'open'
+    count = result.get('search_results_count', 0)
+    if count > 0 and result.get('confidence', 0) > 0.1:
+        return 'smart'
+    if count == 0:
+        return 'open'
+    return 'template'
+
+def cache_response(key, response, version):
+    """Serialize a /query response, storing it in the response cache when cacheable"""
+    result = jsonify(response)
+    if key is not None:
+        # Degraded answers (Gemini failed) are not cached so the next request retries
+        if not response.get('fallback'):
+            response_cache.set(key, result.get_data(as_text=True), version)
+        result.headers['X-Cache'] = 'MISS'
+    return result, 200
+
 @app.route('/query', methods=['POST'])
 def query():
     """Handle Q&A queries"""
@@ -132,18 +301,26 @@ def query():
         
         print(f"\n🔍 Received question: {question}")
 
-        # Simple chit-chat/greeting detection
-        q_lower = (question or "").strip().lower()
-        greeting_triggers = [
-            'hi', 'hello', 'hey', 'namaste', 'good morning', 'good evening',
-            'what is your name', "who are you", 'your name', 'introduce yourself'
-        ]
-        is_greeting = any(t in q_lower for t in greeting_triggers) or q_lower in ['hi', 'hello', 'hey']
+        key = None
+        if response_cache is not None:
+            key = cache_key(question, top_k, use_gemini, qa.db_version)
+            body = response_cache.get(key)
+            if body is not None:
+                print("⚡ Served from response cache")
+                metrics.inc('response_cache_hits_total', endpoint='query')
+                cached = app.response_class(body, status=200, mimetype='application/json')
+                cached.headers['X-Cache'] = 'HIT'
+                return cached
+
+        route = route_question(qa, question)
+        is_greeting = route['intent'] == 'greeting'
         
         # If greeting or small talk, prefer Gemini open response directly
         if GEMINI_AVAILABLE and use_gemini and is_greeting:
             print("💬 Detected greeting/small talk → using Gemini open response")
-            open_resp = generate_open_response(question)
+            metrics.inc('small_talk_total')
+            with metrics.timer('stage_duration_seconds', stage='gemini_open'):
+                open_resp = generate_open_response(question)
             response = {
                 'question': question,
                 'answer': open_resp['answer'],
@@ -152,17 +329,35 @@ def query():
                 'num_results': 0,
                 'ai_enhanced': open_resp.get('ai_enhanced', False)
             }
-            return jsonify(response), 200
+            if open_resp.get('fallback'):
+                response['fallback'] = True
+                metrics.inc('gemini_fallbacks_total', reason=open_resp.get('fallback_reason', 'error'))
+            return cache_response(key, response, qa.db_version)
 
         # Get answer from Q&A system for domain queries
-        result = qa.answer_question(question, top_k=top_k)
-        print(f"✅ Q&A system returned answer with {result.get('search_results_count', 0)} results")
+        result = answer_question(qa, question, top_k, route)
+        print(f"✅ Q&A system returned answer with {result.get('search_results_count', 0)} results ({route['intent']})")
         
         # Enhance with Gemini if available and requested AND if we have relevant data
+        hit = None
         if GEMINI_AVAILABLE and use_gemini and result.get('search_results_count', 0) > 0 and result.get('confidence', 0) > 0.1:
+            hit = semantic_hit(qa, question, top_k, result)
+        if hit is not None and not hit['audit']:
+            # A reworded question with the same sources: the earlier Gemini answer applies
+            print(f"⚡ Reused a Gemini answer from the semantic cache (similarity {hit['similarity']})")
+            response = {
+                'question': question,
+                'answer': hit['answer'],
+                'confidence': result['confidence'],
+                'sources': result['sources'],
+                'num_results': result['search_results_count'],
+                'ai_enhanced': True
+            }
+        elif GEMINI_AVAILABLE and use_gemini and result.get('search_results_count', 0) > 0 and result.get('confidence', 0) > 0.1:
             try:
                 print("🤖 Attempting to enhance with Gemini...")
-                enhanced_result = generate_smart_response(question, result)
+                with metrics.timer('stage_duration_seconds', stage='gemini_smart'):
+                    enhanced_result = generate_smart_response(question, result)
                 response = {
                     'question': question,
                     'answer': enhanced_result['answer'],
@@ -171,9 +366,17 @@ def query():
                     'num_results': result['search_results_count'],
                     'ai_enhanced': enhanced_result.get('ai_enhanced', False)
                 }
-                print("✅ Response enhanced with Gemini")
+                if enhanced_result.get('fallback'):
+                    # Gemini missed its deadline or failed; this is the template answer
+                    response['fallback'] = True
+                    metrics.inc('gemini_fallbacks_total', reason=enhanced_result.get('fallback_reason', 'error'))
+                    print(f"⏱️ Gemini fallback ({enhanced_result.get('fallback_reason')}), using template answer")
+                else:
+                    print("✅ Response enhanced with Gemini")
+                    store_semantic_answer(qa, question, top_k, result, enhanced_result['answer'], hit)
             except Exception as e:
                 print(f"⚠️ Gemini enhancement failed: {e}")
+                metrics.inc('gemini_fallbacks_total', reason='error')
                 # Use basic response
                 response = {
                     'question': question,
@@ -187,8 +390,12 @@ def query():
         else:
             # If no relevant data, try Gemini open response for non-domain questions
             if GEMINI_AVAILABLE and use_gemini and result.get('search_results_count', 0) == 0:
-                print("💡 No KB data → using Gemini open response fallback")
-                open_resp = generate_open_response(question)
+                if route['intent'] == 'out_of_domain':
+                    print("💡 Out-of-domain question → using Gemini open response")
+                else:
+                    print("💡 No KB data → using Gemini open response fallback")
+                with metrics.timer('stage_duration_seconds', stage='gemini_open'):
+                    open_resp = generate_open_response(question)
                 response = {
                     'question': question,
                     'answer': open_resp['answer'],
@@ -197,6 +404,9 @@ def query():
                     'num_results': 0,
                     'ai_enhanced': open_resp.get('ai_enhanced', False)
                 }
+                if open_resp.get('fallback'):
+                    response['fallback'] = True
+                    metrics.inc('gemini_fallbacks_total', reason=open_resp.get('fallback_reason', 'error'))
             else:
                 # Use basic response without Gemini (no enhancement or Gemini disabled)
                 response = {
@@ -212,7 +422,7 @@ def query():
                 else:
                     print("✅ Using basic Q&A response")
         
-        return jsonify(response), 200
+        return cache_response(key, response, qa.db_version)
         
     except Exception as e:
         import traceback
@@ -223,6 +433,284 @@ def query():
             'details': traceback.format_exc()
         }), 500
 
+def sse_event(event, data):
+    """One Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/query/stream', methods=['POST'])
+def query_stream():
+    """Handle Q&A queries as a Server-Sent Events stream
+
+    Same request body as /query. Events, in order:
+      sources  retrieval results (sources, confidence, num_results and the
+               template answer), sent as soon as the search is done
+      token    Gemini answer chunks as they arrive ({"text": ...})
+      done     the final answer and summary; replaces any streamed tokens
+               when Gemini failed or missed its deadline
+    """
+    start = time.perf_counter()
+    try:
+        qa = init_qa_system()
+        data = request.get_json()
+        if not data or 'question' not in data:
+            return jsonify({
+                'error': 'Missing question parameter'
+            }), 400
+
+        question = data['question']
+        top_k = data.get('top_k', 10)
+        use_gemini = data.get('use_gemini', True)
+        print(f"\n🔍 Received streaming question: {question}")
+
+        key = None
+        cached = None
+        if response_cache is not None:
+            key = cache_key(question, top_k, use_gemini, qa.db_version)
+            body = response_cache.get(key)
+            cached = json.loads(body) if body is not None else None
+            if cached is not None:
+                metrics.inc('response_cache_hits_total', endpoint='query_stream')
+
+        if cached is None:
+            route = route_question(qa, question)
+            if GEMINI_AVAILABLE and use_gemini and route['intent'] == 'greeting':
+                metrics.inc('small_talk_total')
+                result = {'answer': '', 'sources': [], 'confidence': 0, 'search_results_count': 0}
+                mode = 'open'
+            else:
+                result = answer_question(qa, question, top_k, route)
+                mode = answer_mode(route, result, use_gemini)
+    except Exception as e:
+        import traceback
+        print(f"❌ Error in query stream endpoint: {e}")
+        traceback.print_exc()
+        return jsonify({
+            'error': str(e)
+        }), 500
+
+    def elapsed_ms():
+        return round((time.perf_counter() - start) * 1000, 1)
+
+    def events():
+        if cached is not None:
+            # Replay a cached /query answer in the same event shape
+            yield sse_event('sources', {
+                'question': question, 'sources': cached['sources'], 'confidence': cached['confidence'],
+                'num_results': cached['num_results'], 'answer': cached['answer'], 'cached': True,
+            })
+            yield sse_event('done', dict(cached, elapsed_ms=elapsed_ms(), cached=True))
+            return
+
+        yield sse_event('sources', {
+            'question': question,
+            'sources': result['sources'],
+            'confidence': result['confidence'],
+            'num_results': result.get('search_results_count', 0),
+            'answer': result['answer'],
+            'retrieval_ms': elapsed_ms(),
+        })
+
+        response = {
+            'question': question,
+            'answer': result['answer'],
+            'confidence': result['confidence'],
+            'sources': result['sources'],
+            'num_results': result.get('search_results_count', 0),
+            'ai_enhanced': False,
+        }
+        first_token_ms = None
+
+        hit = semantic_hit(qa, question, top_k, result) if mode == 'smart' else None
+        if hit is not None and not hit['audit']:
+            # A reworded question with the same sources: replay the earlier Gemini answer
+            yield sse_event('token', {'text': hit['answer']})
+            response['answer'] = hit['answer']
+            response['ai_enhanced'] = True
+        elif mode != 'template':
+            parts = []
+            gemini_start = time.perf_counter()
+            try:
+                if mode == 'smart':
+                    chunks = gemini_service.stream_smart_response(question, result)
+                else:
+                    chunks = gemini_service.stream_open_response(question)
+                for text in chunks:
+                    if not text:
+                        continue
+                    if first_token_ms is None:
+                        first_token_ms = elapsed_ms()
+                        metrics.observe('stage_duration_seconds', time.perf_counter() - gemini_start,
+                                        stage='gemini_first_token')
+                    parts.append(text)
+                    yield sse_event('token', {'text': text})
+                response['answer'] = ''.join(parts).strip()
+                response['ai_enhanced'] = True
+                if mode == 'open':
+                    response['confidence'] = 0.5
+                else:
+                    store_semantic_answer(qa, question, top_k, result, response['answer'], hit)
+            except Exception as e:
+                print(f"⚠️ Gemini stream failed: {e}")
+                response['fallback'] = True
+                response['fallback_reason'] = 'timeout' if isinstance(e, gemini_service.GeminiTimeout) else 'error'
+                metrics.inc('gemini_fallbacks_total', reason=response['fallback_reason'])
+                if mode == 'open':
+                    response['answer'] = "Hi! I'm SaarthiAI, your agriculture assistant. How can I help you today?"
+            metrics.observe('stage_duration_seconds', time.perf_counter() - gemini_start,
+                            stage=f'gemini_stream_{mode}')
+
+        if key is not None and not response.get('fallback'):
+            # Stored exactly as /query would serialize it, so both routes share entries
+            response_cache.set(key, jsonify(response).get_data(as_text=True), qa.db_version)
+
+        yield sse_event('done', dict(response, elapsed_ms=elapsed_ms(), first_token_ms=first_token_ms))
+
+    # stream_with_context keeps the request (and its Q&A system lease) alive while streaming
+    result_stream = Response(stream_with_context(events()), mimetype='text/event-stream')
+    result_stream.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    result_stream.headers['X-Accel-Buffering'] = 'no'
+    return result_stream
+
+# Most questions accepted by one /query/batch request
+MAX_BATCH_QUESTIONS = int(os.environ.get("MAX_BATCH_QUESTIONS", "1000"))
+
+@app.route('/query/batch', methods=['POST'])
+def query_batch():
+    """Answer many questions in one request (e.g. nightly evaluation runs)
+
+    Body: {"questions": [...], "top_k": 10, "use_gemini": false}
+    Uncached questions are retrieved with one batched search; Gemini
+    enhancement is off unless use_gemini is true, and then runs for the
+    whole batch concurrently under GEMINI_BATCH_CONCURRENCY. Each result has
+    the same shape as a /query response.
+    """
+    start = time.perf_counter()
+    try:
+        qa = init_qa_system()
+        data = request.get_json()
+        questions = data.get('questions') if data else None
+        if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+            return jsonify({
+                'error': 'Missing questions parameter (a list of strings)'
+            }), 400
+        if len(questions) > MAX_BATCH_QUESTIONS:
+            return jsonify({
+                'error': f'Too many questions ({len(questions)} > {MAX_BATCH_QUESTIONS})'
+            }), 400
+
+        top_k = data.get('top_k', 10)
+        use_gemini = data.get('use_gemini', False)
+        print(f"\n📦 Received batch of {len(questions)} questions")
+
+        responses = [None] * len(questions)
+        keys = [None] * len(questions)
+        if response_cache is not None:
+            for i, question in enumerate(questions):
+                keys[i] = cache_key(question, top_k, use_gemini, qa.db_version)
+                body = response_cache.get(keys[i])
+                if body is not None:
+                    responses[i] = json.loads(body)
+        cached = sum(response is not None for response in responses)
+        metrics.inc('response_cache_hits_total', cached, endpoint='query_batch')
+
+        pending = [i for i, response in enumerate(responses) if response is None]
+        routes = {i: route_question(qa, questions[i]) for i in pending}
+        # Greetings go straight to Gemini, so they are not searched
+        search = [i for i in pending if not (GEMINI_AVAILABLE and use_gemini and routes[i]['intent'] == 'greeting')]
+        metrics.inc('small_talk_total', len(pending) - len(search))
+        with metrics.timer('stage_duration_seconds', stage='answer_batch'):
+            results = dict(zip(search, qa.answer_questions([questions[i] for i in search], top_k=top_k,
+                                                           routes=[routes[i] for i in search])))
+        metrics.inc('empty_results_total', sum(not result.get('search_results_count')
+                                               for i, result in results.items()
+                                               if routes[i]['intent'] not in OPEN_INTENTS))
+        empty = {'answer': '', 'sources': [], 'confidence': 0, 'search_results_count': 0}
+
+        enhance = []
+        for i in pending:
+            result = results.get(i, empty)
+            responses[i] = {
+                'question': questions[i],
+                'answer': result['answer'],
+                'confidence': result['confidence'],
+                'sources': result['sources'],
+                'num_results': result.get('search_results_count', 0),
+                'ai_enhanced': False
+            }
+            mode = answer_mode(routes[i], result, use_gemini)
+            if mode != 'template':
+                enhance.append((i, result if mode == 'smart' else None))
+
+        if enhance:
+            print(f"🤖 Enhancing {len(enhance)} answers with Gemini...")
+            with metrics.timer('stage_duration_seconds', stage='gemini_batch'):
+                enhanced = gemini_service.generate_batch_responses(
+                    [(questions[i], result) for i, result in enhance]
+                )
+            for (i, result), enhanced_result in zip(enhance, enhanced):
+                responses[i].update({
+                    'answer': enhanced_result['answer'],
+                    'confidence': enhanced_result['confidence'],
+                    'sources': enhanced_result['sources'],
+                    'ai_enhanced': enhanced_result.get('ai_enhanced', False)
+                })
+                if result is None:
+                    responses[i]['num_results'] = 0
+                if enhanced_result.get('fallback'):
+                    responses[i]['fallback'] = True
+                    metrics.inc('gemini_fallbacks_total', reason=enhanced_result.get('fallback_reason', 'error'))
+
+        if response_cache is not None:
+            for i in pending:
+                if not responses[i].get('fallback'):
+                    response_cache.set(keys[i], jsonify(responses[i]).get_data(as_text=True), qa.db_version)
+
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        print(f"✅ Answered batch of {len(questions)} ({cached} cached) in {elapsed_ms} ms")
+        return jsonify({
+            'results': responses,
+            'count': len(responses),
+            'cached': cached,
+            'ai_enhanced': sum(bool(response.get('ai_enhanced')) for response in responses),
+            'elapsed_ms': elapsed_ms
+        })
+
+    except Exception as e:
+        import traceback
+        print(f"❌ Error in query batch endpoint: {e}")
+        traceback.print_exc()
+        return jsonify({
+            'error': str(e)
+        }), 500
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Load the vector database again in the background and swap it in
+
+    Needs the ADMIN_TOKEN in the X-Admin-Token header. Pass ?wait=1 to
+    return only after the new index is serving.
+    """
+    token = request.headers.get('X-Admin-Token', '')
+    if not ADMIN_TOKEN or not hmac.compare_digest(token, ADMIN_TOKEN):
+        return jsonify({'error': 'Forbidden'}), 403
+
+    try:
+        init_qa_system()
+        wait = request.args.get('wait', '').lower() in ('1', 'true', 'yes')
+        if wait:
+            # Do not hold a lease on the old instance while waiting for it to drain
+            release_qa_system(None)
+        started = qa_manager.reload(wait=wait)
+        return jsonify({
+            'reload_started': started,
+            'reload': qa_manager.status()
+        }), 202 if started and not wait else 200
+    except Exception as e:
+        return jsonify({
+            'error': str(e)
+        }), 500
+
 @app.route('/stats', methods=['GET'])
 def stats():
     """Get system statistics"""
@@ -232,6 +720,13 @@ def stats():
             'total_chunks': len(qa.chunks),
             'method': qa.vector_db['method'],
             'gemini_available': GEMINI_AVAILABLE,
+            'reload': qa_manager.status(),
+            'response_cache': response_cache.info() if response_cache is not None else None,
+            'query_memo': qa.memo.info(),
+            'semantic_cache': semantic_cache.info() if semantic_cache is not None else None,
+            'latency': metrics.summary(),
+            'gemini_client': gemini_service.client.status() if GEMINI_AVAILABLE and gemini_service.client else None,
+            'gemini_prompts': gemini_service.prompt_summary() if GEMINI_AVAILABLE else None,
             'datasets': {
                 'crop_production': 'soil_health_complete_dataset.csv',
                 'soil_health': 'soil_health_complete_dataset.csv'
@@ -242,6 +737,43 @@ def stats():
             'error': str(e)
         }), 500
 
+def metric_gauges():
+    """Cache, memo, Gemini client and reload state sampled at scrape time"""
+    gauges = []
+    if response_cache is not None:
+        info = response_cache.info()
+        gauges += [('response_cache_entries', info.get('entries'), {}),
+                   ('response_cache_lookups', info['hits'], {'result': 'hit'}),
+                   ('response_cache_lookups', info['misses'], {'result': 'miss'})]
+    if semantic_cache is not None:
+        info = semantic_cache.info()
+        gauges += [('semantic_cache_entries', info['entries'], {}),
+                   ('semantic_cache_near_misses', info['near_misses'], {}),
+                   ('semantic_cache_suspected_false_hits', info['suspected_false_hits'], {})]
+    for table, info in query_memo.info().items():
+        gauges += [('query_memo_entries', info['entries'], {'table': table}),
+                   ('query_memo_lookups', info['hits'], {'table': table, 'result': 'hit'}),
+                   ('query_memo_lookups', info['misses'], {'table': table, 'result': 'miss'})]
+    if GEMINI_AVAILABLE and gemini_service.client:
+        for name, value in gemini_service.client.stats.items():
+            gauges.append((f'gemini_client_{name}', value, {}))
+    if GEMINI_AVAILABLE:
+        stats = gemini_service.prompt_summary()
+        gauges += [('gemini_prompts', stats['prompts'], {}),
+                   ('gemini_prompt_context_tokens', stats['tokens'], {'layout': 'compact'}),
+                   ('gemini_prompt_context_tokens', stats['legacy_tokens'], {'layout': 'legacy'})]
+    if qa_manager is not None:
+        status = qa_manager.status()
+        gauges.append(('index_generation', status['generation'], {}))
+    return gauges
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Latency histograms and counters in the Prometheus text exposition format"""
+    if not metrics.enabled:
+        return jsonify({'error': 'Metrics are disabled (METRICS=0)'}), 404
+    return Response(metrics.render(metric_gauges()), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 if __name__ == '__main__':
     print("\n" + "=" * 80)
     print("Starting Q&A API Server...")
@@ -250,7 +782,11 @@ if __name__ == '__main__':
     print("  - GET  /          : API information")
     print("  - GET  /health     : Health check")
     print("  - GET  /stats      : System statistics")
+    print("  - GET  /metrics    : Latency histograms (Prometheus)")
     print("  - POST /query      : Query the Q&A system")
+    print("  - POST /query/stream: Query with streamed answer (SSE)")
+    print("  - POST /query/batch: Answer a list of questions")
+    print("  - POST /admin/reload: Reload the vector database (X-Admin-Token)")
     print(f"\n🤖 Gemini AI: {'Available' if GEMINI_AVAILABLE else 'Not available'}")
     print("\n🚀 Server will start on: http://localhost:5000")
     print("=" * 80 + "\n")
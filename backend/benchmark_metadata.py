@@ -0,0 +1,112 @@
+"""
+Memory benchmark: list-of-dicts metadata vs ColumnarMetadata
+
+Usage:
+    python benchmark_metadata.py [n_records]
+
+Builds crop/soil metadata records shaped like retrain_model.py output
+and reports the memory retained by each representation, measured with
+tracemalloc, plus the cost of reading rows back.
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from metadata_store import ColumnarMetadata
+
+STATES = ['Andhra Pradesh', 'Bihar', 'Karnataka', 'Kerala', 'Maharashtra',
+          'Punjab', 'Tamil Nadu', 'Uttar Pradesh', 'West Bengal', 'Odisha']
+CROPS = ['Rice', 'Wheat', 'Maize', 'Sugarcane', 'Cotton(lint)', 'Arhar/Tur',
+         'Groundnut', 'Jowar', 'Bajra', 'Moong(Green Gram)', 'Potato', 'Onion']
+SEASONS = ['Kharif', 'Rabi', 'Whole Year', 'Summer', 'Autumn', 'Winter']
+SOIL_TYPES = ['Alluvial', 'Black', 'Red', 'Laterite', 'Desert', 'Mountain']
+
+
+def synthetic_records(n_records, soil_fraction=0.04, seed=0):
+    """Metadata dicts in the same shape as create_crop_chunks / create_soil_chunks"""
+    rng = random.Random(seed)
+    records = []
+    for idx in range(n_records):
+        state = rng.choice(STATES)
+        # Fresh string objects per row, like str(row[...]).strip() in the trainer
+        district = f" {state[:4].upper()}_{rng.randrange(40)} ".strip()
+        if rng.random() < soil_fraction:
+            records.append({
+                'source': 'soil_health',
+                'state': f" {state} ".strip(),
+                'district': district,
+                'subdistrict': f" SUB_{rng.randrange(200)} ".strip(),
+                'soil_type': f" {rng.choice(SOIL_TYPES)} ".strip(),
+                'pH': round(rng.uniform(4.0, 9.0), 2),
+                'organic_carbon': round(rng.uniform(0.1, 2.0), 2),
+                'nitrogen': round(rng.uniform(50, 600), 1),
+                'phosphorus': round(rng.uniform(5, 80), 1),
+                'potassium': round(rng.uniform(50, 500), 1),
+                'record_id': idx
+            })
+        else:
+            records.append({
+                'source': 'crop_production',
+                'state': f" {state} ".strip(),
+                'district': district,
+                'year': rng.randrange(1997, 2016),
+                'season': f" {rng.choice(SEASONS)} ".strip(),
+                'crop': f" {rng.choice(CROPS)} ".strip(),
+                'area': round(rng.uniform(1, 50000), 1),
+                'production': round(rng.uniform(0, 200000), 1),
+                'record_id': idx
+            })
+    return records
+
+
+def traced(build):
+    """Run build() and return (result, bytes still allocated afterwards)"""
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current
+
+
+def read_rows(metadata, indices):
+    """Touch the fields answer_question reads for every index"""
+    start = time.perf_counter()
+    for idx in indices:
+        row = metadata[idx]
+        if row['source'] == 'crop_production':
+            row['state'], row['production'], row['area']
+        else:
+            row['state'], row['pH'], row['organic_carbon']
+    return time.perf_counter() - start
+
+
+def run_benchmark(n_records=250000):
+    print(f"\n📊 Metadata memory benchmark ({n_records:,} records)")
+    print("=" * 60)
+
+    records, dict_bytes = traced(lambda: synthetic_records(n_records))
+    store, columnar_bytes = traced(lambda: ColumnarMetadata.from_records(records))
+
+    assert all(dict(store[i]) == records[i] for i in range(0, n_records, max(n_records // 1000, 1)))
+
+    indices = random.Random(1).choices(range(n_records), k=100000)
+    dict_time = read_rows(records, indices)
+    columnar_time = read_rows(store, indices)
+
+    print(f"List of dicts:      {dict_bytes / 1024**2:10.2f} MB")
+    print(f"ColumnarMetadata:   {columnar_bytes / 1024**2:10.2f} MB "
+          f"(column arrays {store.nbytes / 1024**2:.2f} MB)")
+    print(f"Memory reduction:   {dict_bytes / max(columnar_bytes, 1):10.1f}x")
+    print(f"Row reads (100k):   dicts {dict_time * 1000:.1f} ms, "
+          f"columnar {columnar_time * 1000:.1f} ms")
+    print("\nColumn dtypes:")
+    for field, column in store.columns.items():
+        print(f"   {field:<16} {str(column.dtype):<8} {column.nbytes / 1024:10.1f} KB")
+
+    return {'dict_bytes': dict_bytes, 'columnar_bytes': columnar_bytes}
+
+
+if __name__ == '__main__':
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 250000)
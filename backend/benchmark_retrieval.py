@@ -0,0 +1,404 @@
+"""
+Retrieval benchmark: index build time, load time, memory, query latency
+and batch throughput on synthetic corpora of configurable size
+
+Usage:
+    python benchmark_retrieval.py [--sizes 10000,100000,1000000] [--index sparse|lsa]
+                                  [--vectorizer tfidf|parallel|hashing]
+                                  [--output benchmark_results.json] [--compare baseline.json]
+
+For every size it writes crop/soil CSVs shaped like the real datasets (about
+4% soil rows), trains the vector database with AdvancedModelTrainer, then
+loads it in a fresh process and times IntelligentQASystem.search and
+answer_question one question at a time (p50/p95/p99) and as one batch.
+Build and measurement each run in their own process so peak RSS belongs to
+that phase alone.
+
+The JSON output records the git commit, so results of two commits can be
+compared with --compare; latencies or memory worse than --tolerance make
+the script exit with status 1. The query memo is disabled while measuring.
+Sizes up to 2,000,000 chunks work but need several GB of RAM and time.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+STATES = ['Andhra Pradesh', 'Assam', 'Bihar', 'Chhattisgarh', 'Gujarat', 'Haryana',
+          'Himachal Pradesh', 'Jharkhand', 'Karnataka', 'Kerala', 'Madhya Pradesh',
+          'Maharashtra', 'Odisha', 'Punjab', 'Rajasthan', 'Tamil Nadu', 'Telangana',
+          'Uttar Pradesh', 'Uttarakhand', 'West Bengal']
+CROPS = ['Rice', 'Wheat', 'Maize', 'Sugarcane', 'Cotton(lint)', 'Arhar/Tur', 'Groundnut',
+         'Jowar', 'Bajra', 'Moong(Green Gram)', 'Urad', 'Potato', 'Onion', 'Soyabean',
+         'Rapeseed &Mustard', 'Gram', 'Ragi', 'Banana', 'Coconut', 'Turmeric',
+         'Jute', 'Barley', 'Sunflower', 'Tobacco', 'Dry chillies']
+# Padded like the season column of crop_production_full.csv
+SEASONS = ['Kharif     ', 'Rabi       ', 'Whole Year ', 'Summer     ', 'Autumn     ', 'Winter     ']
+SOIL_TYPES = ['Alluvial', 'Black', 'Red', 'Laterite', 'Desert', 'Mountain']
+DISTRICTS_PER_STATE = 30
+SOIL_FRACTION = 0.04
+
+QUESTION_TEMPLATES = [
+    "What is {crop} production in {state}?",
+    "{crop} production in {district} {year}",
+    "How much {crop} was grown in {state} during the {season} season?",
+    "Total {crop} production in {state}",
+    "average yield of {crop} in {state} in {year}",
+    "Tell me about soil health in {state}",
+    "pH of {soil} soil in {district}",
+    "nitrogen levels in {state}",
+]
+
+
+def district_names(state):
+    return [f"{state.split()[0].upper()} DISTRICT {i}" for i in range(DISTRICTS_PER_STATE)]
+
+
+def write_synthetic_datasets(n_chunks, data_dir, seed=0):
+    """Crop and soil CSVs with n_chunks rows in total, none dropped by the trainer"""
+    rng = np.random.default_rng(seed)
+    n_soil = int(n_chunks * SOIL_FRACTION)
+    n_crop = n_chunks - n_soil
+    districts = np.array([district_names(state) for state in STATES])
+
+    def places(n):
+        state_ids = rng.integers(0, len(STATES), n)
+        return np.array(STATES)[state_ids], districts[state_ids, rng.integers(0, DISTRICTS_PER_STATE, n)]
+
+    states, district = places(n_crop)
+    crop = pd.DataFrame({
+        'state_name': states,
+        'district_name': district,
+        'crop_year': rng.integers(1997, 2016, n_crop),
+        'season': np.array(SEASONS)[rng.integers(0, len(SEASONS), n_crop)],
+        'crop': np.array(CROPS)[rng.integers(0, len(CROPS), n_crop)],
+        'area_': rng.gamma(2.0, 800.0, n_crop).round(1) + 1,
+        'production_': rng.gamma(2.0, 2000.0, n_crop).round(1),
+    })
+
+    states, district = places(n_soil)
+    soil = pd.DataFrame({
+        'state_name': states,
+        'district_name': district,
+        'subdistrict_name': [f"SUBDISTRICT {i}" for i in rng.integers(0, 200, n_soil)],
+        'soil_type': np.array(SOIL_TYPES)[rng.integers(0, len(SOIL_TYPES), n_soil)],
+        'pH_value': rng.normal(6.5, 0.9, n_soil).clip(3.5, 9.5).round(2),
+        'organic_carbon': rng.gamma(2.0, 0.3, n_soil).round(2) + 0.01,
+        'nitrogen': rng.gamma(5.0, 40.0, n_soil).round(1) + 1,
+        'phosphorus': rng.gamma(3.0, 8.0, n_soil).round(1) + 1,
+        'potassium': rng.gamma(4.0, 60.0, n_soil).round(1) + 1,
+    })
+
+    os.makedirs(data_dir, exist_ok=True)
+    crop.to_csv(os.path.join(data_dir, 'crop_production_full.csv'), index=False)
+    soil.to_csv(os.path.join(data_dir, 'soil_health_complete_dataset.csv'), index=False)
+
+
+def benchmark_questions(n_questions, seed=0):
+    """Reproducible questions over the synthetic states, districts and crops"""
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(n_questions):
+        state = rng.choice(STATES)
+        questions.append(rng.choice(QUESTION_TEMPLATES).format(
+            crop=rng.choice(CROPS), state=state, district=rng.choice(district_names(state)).title(),
+            year=rng.randrange(1997, 2016), season=rng.choice(SEASONS).strip(),
+            soil=rng.choice(SOIL_TYPES).lower()
+        ))
+    return questions
+
+
+def current_rss():
+    """Resident set size of this process in bytes (None where /proc is missing)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def percentiles(latencies_ms):
+    values = np.asarray(latencies_ms)
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50_ms': round(p50, 3), 'p95_ms': round(p95, 3), 'p99_ms': round(p99, 3),
+            'mean_ms': round(values.mean(), 3), 'qps': round(1000 / values.mean(), 1)}
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(path) for name in names)
+
+
+def build(work_dir, n_chunks, vectorizer_mode, index_type, seed):
+    """Generate the corpus and train the vector database inside work_dir"""
+    from retrain_model import AdvancedModelTrainer
+
+    start = time.perf_counter()
+    write_synthetic_datasets(n_chunks, os.path.join(work_dir, 'Data Set'), seed=seed)
+    generate_s = time.perf_counter() - start
+
+    # The trainer reads 'Data Set/' and writes 'vector_database/' relative to the cwd
+    os.chdir(work_dir)
+    trainer = AdvancedModelTrainer(vectorizer_mode=vectorizer_mode, index_type=index_type)
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        trainer.train_model()
+        build_s = time.perf_counter() - start
+
+    db_path = os.path.join(work_dir, 'vector_database')
+    return {
+        'generate_s': round(generate_s, 3),
+        'build_s': round(build_s, 3),
+        'build_stages_s': {name: round(seconds, 3) for name, seconds in trainer.timings.items()},
+        'build_peak_rss_mb': mb(peak_rss()),
+        'index_disk_mb': mb(directory_size(db_path)),
+        'n_features': int(trainer.embeddings.shape[1]),
+    }
+
+
+def measure(db_path, n_questions, top_k, seed):
+    """Load the database and time single and batched queries"""
+    import config
+    from qa_system import IntelligentQASystem
+    from query_memo import QueryMemo
+
+    rss_before = current_rss()
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        qa = IntelligentQASystem(db_path, memo=QueryMemo(max_vectors=0, max_results=0))
+        load_s = time.perf_counter() - start
+    rss_loaded = current_rss()
+
+    questions = benchmark_questions(n_questions, seed=seed)
+    for question in questions[:20]:
+        qa.answer_question(question, top_k=top_k)
+
+    search_ms = []
+    for question in questions:
+        start = time.perf_counter()
+        qa.search(question, top_k=top_k)
+        search_ms.append((time.perf_counter() - start) * 1000)
+
+    answer_ms = []
+    for question in questions:
+        start = time.perf_counter()
+        qa.answer_question(question, top_k=top_k)
+        answer_ms.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    qa.search_batch(questions, top_k=top_k)
+    search_batch_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    qa.answer_questions(questions, top_k=top_k)
+    answer_batch_s = time.perf_counter() - start
+    # Mapped pages the queries touched count from here on
+    rss_queried = current_rss()
+
+    return {
+        'n_chunks': len(qa.chunks),
+        'method': qa.vector_db['method'],
+        'hybrid_retrieval': qa.retriever is not None,
+        'retrieval_candidates': config.RETRIEVAL_CANDIDATES,
+        'load_s': round(load_s, 3),
+        'load_rss_mb': mb(rss_loaded - rss_before) if rss_before is not None else None,
+        'rss_mb': mb(rss_loaded),
+        'rss_after_queries_mb': mb(rss_queried),
+        'peak_rss_mb': mb(peak_rss()),
+        'search': percentiles(search_ms),
+        'answer_question': percentiles(answer_ms),
+        'search_batch_qps': round(len(questions) / search_batch_s, 1),
+        'answer_questions_qps': round(len(questions) / answer_batch_s, 1),
+    }
+
+
+def mb(n_bytes):
+    return round(n_bytes / (1024 * 1024), 1) if n_bytes is not None else None
+
+
+def run_phase(*args):
+    """Run one phase of this script in a fresh interpreter and return its JSON result"""
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), *map(str, args)],
+                            check=True, capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# (path in a result, True when larger values are better)
+COMPARED_METRICS = [
+    (('build', 'build_s'), False),
+    (('build', 'index_disk_mb'), False),
+    (('query', 'load_s'), False),
+    (('query', 'rss_after_queries_mb'), False),
+    (('query', 'search', 'p50_ms'), False),
+    (('query', 'search', 'p95_ms'), False),
+    (('query', 'search', 'p99_ms'), False),
+    (('query', 'answer_question', 'p95_ms'), False),
+    (('query', 'search_batch_qps'), True),
+    (('query', 'answer_questions_qps'), True),
+]
+
+
+def lookup(result, path):
+    for key in path:
+        result = result.get(key) if isinstance(result, dict) else None
+    return result
+
+
+def compare(baseline, report, tolerance):
+    """Print the change of every metric against a baseline run; returns the regressions"""
+    print(f"\n{'='*72}")
+    print(f"COMPARISON with {baseline.get('commit')} (tolerance {tolerance:.0%})")
+    print(f"{'='*72}")
+    if baseline.get('settings') != report['settings']:
+        print(f"⚠️ Settings differ: {baseline.get('settings')} vs {report['settings']}")
+    baseline_runs = {run['size']: run for run in baseline['runs']}
+    regressions = []
+    for run in report['runs']:
+        before = baseline_runs.get(run['size'])
+        if before is None:
+            continue
+        print(f"\n{run['size']:,} chunks")
+        for path, higher_is_better in COMPARED_METRICS:
+            old, new = lookup(before, path), lookup(run, path)
+            if not old or new is None:
+                continue
+            change = new / old - 1
+            worse = -change if higher_is_better else change
+            flag = ''
+            if worse > tolerance:
+                flag = '  ❌ regression'
+                regressions.append((run['size'], '.'.join(path), old, new))
+            elif worse < -tolerance:
+                flag = '  ✅ improvement'
+            print(f"   {'.'.join(path):<32} {old:>10} → {new:>10}  {change:+7.1%}{flag}")
+    return regressions
+
+
+def print_run(run):
+    build_result, query = run['build'], run['query']
+    print(f"\n{run['size']:,} chunks ({query['method']}, {build_result['n_features']:,} features)")
+    print(f"   build {build_result['build_s']:.2f}s, peak RSS {build_result['build_peak_rss_mb']} MB, "
+          f"on disk {build_result['index_disk_mb']} MB")
+    print(f"   load {query['load_s']:.3f}s, RSS {query['rss_mb']} MB (+{query['load_rss_mb']} MB for the database), "
+          f"{query['rss_after_queries_mb']} MB after the queries")
+    for name in ('search', 'answer_question'):
+        stats = query[name]
+        print(f"   {name:<16} p50 {stats['p50_ms']:7.2f} ms  p95 {stats['p95_ms']:7.2f} ms  "
+              f"p99 {stats['p99_ms']:7.2f} ms  ({stats['qps']} q/s)")
+    print(f"   batched: search {query['search_batch_qps']} q/s, answer {query['answer_questions_qps']} q/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark index build, load and query performance")
+    parser.add_argument('--sizes', default='10000,100000',
+                        help="comma-separated corpus sizes in chunks (10k to 2M)")
+    parser.add_argument('--vectorizer', choices=('tfidf', 'parallel', 'hashing'), default='tfidf')
+    parser.add_argument('--index', choices=('sparse', 'lsa'), default='sparse')
+    parser.add_argument('--queries', type=int, default=500, help="questions timed per size")
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--work-dir', default=None, help="where corpora and databases go (default: a temp dir)")
+    parser.add_argument('--keep', action='store_true', help="keep the generated corpora and databases")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', default=None, help="earlier --output file to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="relative slowdown counted as a regression by --compare")
+    # Internal: one phase in a fresh process
+    parser.add_argument('--phase', choices=('build', 'measure'), help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.phase == 'build':
+        print(json.dumps(build(args.work_dir, args.size, args.vectorizer, args.index, args.seed)))
+        return 0
+    if args.phase == 'measure':
+        print(json.dumps(measure(args.work_dir, args.queries, args.top_k, args.seed)))
+        return 0
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    work_root = args.work_dir or tempfile.mkdtemp(prefix='saarthi_bench_')
+    report = {
+        'commit': git_commit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'settings': {'vectorizer': args.vectorizer, 'index': args.index, 'queries': args.queries,
+                     'top_k': args.top_k, 'seed': args.seed},
+        'runs': [],
+    }
+
+    print(f"\n{'='*72}")
+    print(f"RETRIEVAL BENCHMARK ({report['commit']}, {args.vectorizer}/{args.index})")
+    print(f"{'='*72}")
+    try:
+        for size in sizes:
+            work_dir = os.path.join(work_root, f"size_{size}")
+            os.makedirs(work_dir, exist_ok=True)
+            print(f"\n⏳ Building {size:,} chunks...")
+            build_result = run_phase('--phase', 'build', '--work-dir', work_dir, '--size', size,
+                                     '--vectorizer', args.vectorizer, '--index', args.index, '--seed', args.seed)
+            query = run_phase('--phase', 'measure', '--work-dir', os.path.join(work_dir, 'vector_database'),
+                              '--queries', args.queries, '--top-k', args.top_k, '--seed', args.seed)
+            run = {'size': size, 'build': build_result, 'query': query}
+            report['runs'].append(run)
+            print_run(run)
+            if not args.keep:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    finally:
+        if not args.keep and args.work_dir is None:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regressions beyond {args.tolerance:.0%}")
+            return 1
+        print("\n✅ No regressions")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,7 @@ Script to check what data is in the vector database
 
 import pickle
 import os
+from vector_store import is_vector_store, load_vector_store
 
 def check_database():
     """Check what's in the vector database"""
@@ -11,6 +12,9 @@ def check_database():
     # Find the database file
     current_dir = os.path.dirname(os.path.abspath(__file__))
     db_path = os.path.join(current_dir, 'vector_database.pkl')
+    mmap_path = os.path.join(current_dir, 'vector_database')
+    if is_vector_store(mmap_path):
+        db_path = mmap_path
     
     if not os.path.exists(db_path):
         print(f"❌ Database not found at: {db_path}")
@@ -18,8 +22,11 @@ def check_database():
     
     print(f"✅ Loading database from: {db_path}")
     
-    with open(db_path, 'rb') as f:
-        vector_db = pickle.load(f)
+    if is_vector_store(db_path):
+        vector_db = load_vector_store(db_path)
+    else:
+        with open(db_path, 'rb') as f:
+            vector_db = pickle.load(f)
     
     chunks = vector_db['chunks']
     metadata = vector_db['metadata']
@@ -0,0 +1,73 @@
+"""
+Script to check the dense (LSA + IVF) index: recall of the approximate
+search against an exact scan of the same vectors, and query latency
+
+Usage:
+    python check_dense_recall.py [vector_database]   (trained with --index lsa)
+"""
+
+import os
+import sys
+import time
+import random
+import numpy as np
+
+from qa_system import IntelligentQASystem
+from check_search_parity import SAMPLE_QUESTIONS
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+
+def check_dense_recall(n_random=200, top_k=10, vector_db_path='vector_database', min_recall=0.9):
+    qa = IntelligentQASystem(vector_db_path)
+    index = qa.vector_db.get('dense_index')
+    if index is None:
+        print("❌ This vector database has no dense index; train it with --index lsa")
+        return False
+
+    rng = random.Random(42)
+    queries = list(SAMPLE_QUESTIONS)
+    for idx in rng.sample(range(len(qa.chunks)), min(n_random, len(qa.chunks))):
+        words = qa.chunks[idx].split()
+        start = rng.randrange(max(len(words) - 6, 1))
+        queries.append(" ".join(words[start:start + 6]))
+
+    hits = 0
+    ann_time = 0.0
+    exact_time = 0.0
+    for query in queries:
+        query_vector = qa.vectorizer.transform([query])
+
+        start = time.perf_counter()
+        exact_ids, _ = index.exact_search(query_vector, top_k=top_k)
+        exact_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        ann_ids, _ = index.search(query_vector, top_k=top_k)
+        ann_time += time.perf_counter() - start
+
+        hits += len(np.intersect1d(exact_ids, ann_ids))
+
+    recall = hits / (len(queries) * top_k)
+    params = index.params()
+
+    print(f"\n{'='*60}")
+    print("DENSE INDEX RECALL")
+    print(f"{'='*60}")
+    print(f"Chunks: {index.n_chunks:,}, dims: {params['dims']}, lists: {params['n_lists']}, "
+          f"nprobe: {params['nprobe']}, storage: {params['quantization']}")
+    print(f"Queries checked: {len(queries)}")
+    print(f"Recall@{top_k}: {recall:.3f}")
+    print(f"Exact scan: {exact_time / len(queries) * 1000:.2f} ms/query")
+    print(f"IVF search: {ann_time / len(queries) * 1000:.2f} ms/query")
+
+    return recall >= min_recall
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'vector_database'
+    ok = check_dense_recall(vector_db_path=os.path.abspath(path))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,107 @@
+"""
+Check the Gemini deadline, concurrency limit and template fallback
+against the local fake Gemini model (no API key needed)
+
+Usage:
+    python check_gemini_client.py
+"""
+
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_gemini import BlockingFakeGeminiModel, FakeGeminiModel
+from gemini_client import AsyncGeminiClient, GeminiTimeout
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+PROMPT = "User Question: What is rice production in Bihar?"
+
+
+def call(client, timeout):
+    start = time.perf_counter()
+    try:
+        client.generate(PROMPT, timeout=timeout)
+        outcome = 'ok'
+    except GeminiTimeout:
+        outcome = 'timeout'
+    except Exception:
+        outcome = 'error'
+    return outcome, time.perf_counter() - start
+
+
+def main():
+    failures = 0
+
+    def check(name, passed, detail):
+        nonlocal failures
+        failures += not passed
+        print(f"{'✅' if passed else '❌'} {name}: {detail}")
+
+    for mode, fake in (
+        ('async', FakeGeminiModel(latency=0.2)),
+        ('blocking', BlockingFakeGeminiModel(latency=0.2)),
+    ):
+        print(f"\n{mode} model calls:")
+
+        client = AsyncGeminiClient(fake, max_concurrency=2, timeout=1.0)
+        outcome, elapsed = call(client, 1.0)
+        check("fast answer", outcome == 'ok', f"{outcome} in {elapsed:.2f}s")
+
+        fake.latency = 2.0
+        outcome, elapsed = call(client, 0.3)
+        check("deadline", outcome == 'timeout' and elapsed < 0.6, f"{outcome} after {elapsed:.2f}s")
+        time.sleep(2.0)
+
+        fake.latency = 0.3
+        fake.peak_active = 0
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: call(client, 5.0), range(8)))
+        check("concurrency limit", fake.peak_active <= 2,
+              f"peak {fake.peak_active} in flight, {sum(o == 'ok' for o, _ in results)}/8 answered")
+
+        fake.latency = 0.5
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(lambda _: call(client, 0.7), range(6)))
+        timeouts = sum(o == 'timeout' for o, _ in results)
+        check("queue wait counts against the deadline", timeouts >= 2 and max(e for _, e in results) < 1.2,
+              f"{timeouts}/6 timed out, slowest {max(e for _, e in results):.2f}s")
+        print(f"   client stats: {client.status()}")
+
+    print("\nbatch calls:")
+    fake = FakeGeminiModel(latency=0.2)
+    client = AsyncGeminiClient(fake, max_concurrency=4, timeout=1.0)
+    start = time.perf_counter()
+    texts = client.generate_many([PROMPT] * 6, timeout=5.0, max_concurrency=2)
+    elapsed = time.perf_counter() - start
+    check("batch concurrency cap", fake.peak_active <= 2 and all(isinstance(t, str) for t in texts),
+          f"peak {fake.peak_active} in flight, 6 answers in {elapsed:.2f}s")
+
+    texts = client.generate_many([PROMPT] * 6, timeout=0.5, max_concurrency=2)
+    timeouts = sum(isinstance(t, GeminiTimeout) for t in texts)
+    check("batch deadline", 2 <= timeouts < 6, f"{6 - timeouts}/6 answered, {timeouts} timed out")
+
+    # Template fallback through the service layer
+    import gemini_service
+    gemini_service.GEMINI_READY = True
+    gemini_service.model = FakeGeminiModel(latency=2.0)
+    gemini_service.client = AsyncGeminiClient(gemini_service.model, timeout=0.3)
+    retrieved = {
+        'answer': 'Template answer',
+        'confidence': 0.8,
+        'sources': [{'dataset': 'crop_production', 'chunk': 'In Bihar...', 'relevance': '80.00%'}],
+    }
+    start = time.perf_counter()
+    result = gemini_service.generate_smart_response("rice in Bihar?", retrieved)
+    check("template fallback", result['answer'] == 'Template answer' and result.get('fallback_reason') == 'timeout',
+          f"{result.get('fallback_reason')} after {time.perf_counter() - start:.2f}s")
+
+    print(f"\n{'✅ All checks passed' if not failures else f'❌ {failures} checks failed'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
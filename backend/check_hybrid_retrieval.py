@@ -0,0 +1,109 @@
+"""
+Script to compare the single-engine search with the hybrid retrieval
+pipeline: how many of the top-k results match the states/crops/years named
+in the question, and how long each pipeline stage takes
+
+Usage:
+    python check_hybrid_retrieval.py [vector_database]
+"""
+
+import os
+import sys
+import random
+import time
+import numpy as np
+
+from qa_system import IntelligentQASystem
+from query_memo import QueryMemo
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+TEMPLATES = [
+    "What is {crop} production in {state}?",
+    "{crop} yield in {state} {year}",
+    "How much {crop} was grown in {state} in {year}?",
+    "area under {crop} in {state}",
+]
+
+
+def sample_questions(qa, n=200, seed=42):
+    """Questions naming the crop/state/year of random crop chunks"""
+    rng = random.Random(seed)
+    crop_rows = [i for i in range(len(qa.chunks)) if qa.metadata[i]['source'] == 'crop_production']
+    questions = []
+    for idx in rng.sample(crop_rows, min(n, len(crop_rows))):
+        row = qa.metadata[idx]
+        questions.append(rng.choice(TEMPLATES).format(crop=row['crop'], state=row['state'], year=row['year']))
+    return questions
+
+
+def metadata_precision(qa, question, results):
+    """Share of results whose metadata matches every entity in the question"""
+    entities = qa.entity_extractor.extract(question)
+    if not entities or not results:
+        return None
+    hits = 0
+    for result in results:
+        metadata = result['metadata']
+        hits += all(metadata.get(field) in values for field, values in entities.items())
+    return hits / len(results)
+
+
+def run(qa, questions, top_k):
+    precisions = []
+    latencies = []
+    stages = {}
+    skipped = 0
+    for question in questions:
+        timings = {}
+        start = time.perf_counter()
+        results = qa.search(question, top_k=top_k, timings=timings)
+        latencies.append((time.perf_counter() - start) * 1000)
+        precision = metadata_precision(qa, question, results)
+        if precision is not None:
+            precisions.append(precision)
+        for name, ms in timings.get('stages', {}).items():
+            stages.setdefault(name, []).append(ms)
+        skipped += bool(timings.get('skipped'))
+    return np.mean(precisions) if precisions else 0.0, latencies, stages, skipped
+
+
+def check_hybrid_retrieval(vector_db_path='vector_database', n_questions=200, top_k=10):
+    # No query memo, so both runs vectorize and rank every question themselves
+    qa = IntelligentQASystem(vector_db_path, memo=QueryMemo(max_vectors=0, max_results=0))
+    if qa.retriever is None:
+        print("❌ Hybrid retrieval is disabled (HYBRID_RETRIEVAL=0)")
+        return False
+    questions = sample_questions(qa, n_questions)
+
+    retriever = qa.retriever
+    qa.retriever = None
+    single = run(qa, questions, top_k)
+    qa.retriever = retriever
+    hybrid = run(qa, questions, top_k)
+
+    print(f"\n{'='*60}")
+    print("HYBRID RETRIEVAL")
+    print(f"{'='*60}")
+    print(f"Questions: {len(questions)}, top_k: {top_k}, dense stage: {retriever.dense_index is not None}")
+    for name, (precision, latencies, _, _) in (('single engine', single), ('hybrid', hybrid)):
+        p50, p95 = np.percentile(latencies, [50, 95])
+        print(f"{name:<14} metadata precision@{top_k}: {precision:.3f}   "
+              f"latency p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+
+    print(f"\nHybrid stages (budget {retriever.budget_ms:.0f} ms, "
+          f"{hybrid[3]} queries skipped a stage):")
+    for name, values in hybrid[2].items():
+        p50, p95 = np.percentile(values, [50, 95])
+        print(f"   {name:<10} p50 {p50:7.3f} ms   p95 {p95:7.3f} ms")
+
+    return hybrid[0] >= single[0]
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'vector_database'
+    ok = check_hybrid_retrieval(vector_db_path=os.path.abspath(path))
+    sys.exit(0 if ok else 1)
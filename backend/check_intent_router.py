@@ -0,0 +1,116 @@
+"""
+Script to check the intent router on hand-written questions (not the
+training templates): accuracy per intent, questions the previous substring
+greeting check mis-routed, and the time one route takes
+
+Usage:
+    python check_intent_router.py [vector_database]
+"""
+
+import os
+import sys
+import time
+import numpy as np
+
+from qa_system import IntelligentQASystem
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+LABELLED = [
+    ("Hi", 'greeting'),
+    ("hello!", 'greeting'),
+    ("Hey there", 'greeting'),
+    ("Namaste", 'greeting'),
+    ("Good morning!", 'greeting'),
+    ("What's your name?", 'greeting'),
+    ("Who are you?", 'greeting'),
+    ("thanks a lot", 'greeting'),
+    ("Can you introduce yourself?", 'greeting'),
+    ("Which crops does Bihar grow?", 'lookup'),
+    ("rice production in Chhattisgarh", 'lookup'),
+    ("Hi, what is wheat production in Punjab?", 'lookup'),
+    ("soil health in Kerala", 'lookup'),
+    ("What crops are grown in Bihar during Kharif?", 'lookup'),
+    ("Which soil is found in Andhra Pradesh?", 'lookup'),
+    ("tell me about nitrogen in soil", 'lookup'),
+    ("Maize yield 2010", 'lookup'),
+    ("What is the total rice production in Punjab?", 'aggregate'),
+    ("Average soil pH in Kerala", 'aggregate'),
+    ("Which district has the highest wheat production in Punjab?", 'aggregate'),
+    ("largest producer of sugarcane in Uttar Pradesh", 'aggregate'),
+    ("minimum nitrogen in Bihar soil", 'aggregate'),
+    ("Overall maize area in Karnataka in 2012", 'aggregate'),
+    ("Compare wheat production in Punjab and Bihar", 'comparison'),
+    ("Rice vs wheat in West Bengal", 'comparison'),
+    ("Is rice production higher in Bihar or Odisha?", 'comparison'),
+    ("difference between soil pH of Kerala and Tamil Nadu", 'comparison'),
+    ("rice production 2005 versus 2010 in Punjab", 'comparison'),
+    ("How do I renew my passport?", 'out_of_domain'),
+    ("What is the capital of Japan?", 'out_of_domain'),
+    ("Tell me a joke", 'out_of_domain'),
+    ("who won the football match yesterday", 'out_of_domain'),
+    ("How to bake a cake", 'out_of_domain'),
+    ("what is the price of gold today", 'out_of_domain'),
+]
+
+
+def legacy_small_talk(question):
+    """The substring greeting check the router replaces"""
+    q_lower = (question or "").strip().lower()
+    greeting_triggers = [
+        'hi', 'hello', 'hey', 'namaste', 'good morning', 'good evening',
+        'what is your name', "who are you", 'your name', 'introduce yourself'
+    ]
+    return any(t in q_lower for t in greeting_triggers) or q_lower in ['hi', 'hello', 'hey']
+
+
+def check_intent_router(vector_db_path='vector_database', repeats=2000):
+    qa = IntelligentQASystem(vector_db_path)
+
+    per_intent = {}
+    wrong = []
+    legacy_wrong = []
+    for question, expected in LABELLED:
+        route = qa.route(question)
+        hits = per_intent.setdefault(expected, [0, 0])
+        hits[0] += route['intent'] == expected
+        hits[1] += 1
+        if route['intent'] != expected:
+            wrong.append((question, expected, route['intent']))
+        if legacy_small_talk(question) != (expected == 'greeting'):
+            legacy_wrong.append(question)
+
+    latencies = []
+    for _ in range(repeats):
+        for question, _ in LABELLED[:8]:
+            start = time.perf_counter()
+            qa.route(question)
+            latencies.append((time.perf_counter() - start) * 1e6)
+
+    correct = sum(hits for hits, _ in per_intent.values())
+    print(f"\n{'='*60}")
+    print("INTENT ROUTER")
+    print(f"{'='*60}")
+    print(f"Accuracy: {correct}/{len(LABELLED)} ({correct / len(LABELLED):.1%})")
+    for intent, (hits, total) in per_intent.items():
+        print(f"   {intent:<14} {hits}/{total}")
+    for question, expected, got in wrong:
+        print(f"   ❌ {question!r}: expected {expected}, routed {got}")
+
+    print(f"\nSubstring greeting check mis-routed {len(legacy_wrong)} of these questions:")
+    for question in legacy_wrong:
+        print(f"   {question!r} → {qa.route(question)['intent']}")
+
+    p50, p95 = np.percentile(latencies, [50, 95])
+    print(f"\nRoute latency: p50 {p50:.1f} µs, p95 {p95:.1f} µs")
+
+    return correct / len(LABELLED) >= 0.9
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'vector_database'
+    ok = check_intent_router(vector_db_path=os.path.abspath(path))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,209 @@
+"""
+Script to check the ranking engine against a pandas brute force (same
+groups, same order, same values) on random filter combinations, with and
+without rollup tables, and to time "top 10 districts by rice yield in 2012"
+
+The brute force follows the aggregation engine: production counts every
+row with a production value, area every row with an area, yield the rows
+with both. The synthetic records get some missing values, and every
+ranked value is also checked against AggregationEngine.aggregate.
+
+Usage:
+    python check_ranking.py [n_records] [vector_database]
+
+Synthetic metadata (benchmark_metadata.py) of n_records rows is always
+checked; a vector database is checked too when given.
+"""
+
+import os
+import random
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from aggregation import AggregationEngine
+from benchmark_metadata import synthetic_records
+from metadata_index import MetadataIndex
+from metadata_store import ColumnarMetadata
+from ranking import RankingEngine
+from rollups import ROLLUP_FIELDS, CROP_ROLLUP_METRICS, RollupTables
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+
+def with_missing_values(records):
+    """Blank some crop production, area and season values, as in the real data"""
+    for i, record in enumerate(records):
+        if record['source'] == 'crop_production':
+            if i % 37 == 0:
+                record['production'] = None
+            if i % 53 == 0:
+                record['area'] = None
+            if i % 41 == 0:
+                record['season'] = None
+    return records
+
+
+def crop_frame(metadata):
+    """Every crop row as a DataFrame with decoded field values (None when missing)"""
+    frame = pd.DataFrame({
+        'production': metadata.numeric('production'),
+        'area': metadata.numeric('area'),
+    })
+    for field in ROLLUP_FIELDS:
+        column = np.asarray(metadata.columns[field])
+        if field in metadata.categories:
+            labels = np.array(metadata.categories[field] + [None], dtype=object)
+            frame[field] = labels[column]
+        else:
+            frame[field] = column.astype(np.int64)
+    return frame[metadata.source_mask('production')]
+
+
+def brute_force_rank(frame, metric, group_by, filters, n, ascending):
+    for field, values in filters.items():
+        frame = frame[frame[field].isin(values)]
+    frame = frame[frame[group_by].notna()]
+    needed = ['production', 'area'] if metric == 'yield' else [metric]
+    frame = frame.dropna(subset=needed)
+    sums = frame.groupby(group_by, sort=True)[needed].sum()
+    if metric == 'yield':
+        values = (sums['production'] / sums['area']).where(sums['area'] > 0)
+    else:
+        values = sums[metric]
+    values = values.dropna().sort_values(ascending=ascending, kind='stable')
+    return list(values.index[:n]), values.to_numpy()[:n]
+
+
+def aggregation_mismatches(aggregation, result, metric, group_by, filters):
+    """Ranked groups whose value differs from the aggregation engine's total for that group"""
+    wrong = 0
+    for group in result['groups'] if result else []:
+        total = aggregation.aggregate('crop_production', metric, 'sum', dict(filters, **{group_by: [group['value']]}))
+        if total is None or not np.isclose(total['value'], group['metric'], rtol=1e-9) \
+                or total['count'] != group['count']:
+            wrong += 1
+    return wrong
+
+
+def compared_trend_mismatches(engine, index):
+    """Per-value trends must equal the single-value trends; two compared fields fall through"""
+    wrong = 0
+    states, crops = index.values['state'][:2], index.values['crop'][:2]
+    result = engine.trend('production', {'state': states, 'crop': crops[:1]})
+    for item in result['series_by'] if result else []:
+        single = engine.trend('production', {'state': [item['value']], 'crop': crops[:1]})
+        wrong += single is None or single['series'] != item['series']
+    wrong += result is None or result['compared'] != 'state'
+
+    # "rice and wheat production in Punjab and Bihar over the years"
+    filters = {'state': states, 'crop': crops}
+    wrong += engine.trend('production', filters) is not None
+    wrong += engine.answer(f"{crops[0]} and {crops[1]} production in {states[0]} and {states[1]} over the years",
+                           filters, 'comparison') is not None
+    return wrong
+
+
+def random_filters(rng, index):
+    filters = {}
+    for field in rng.sample(ROLLUP_FIELDS, rng.randrange(0, 3)):
+        filters[field] = rng.sample(index.values[field], min(rng.choice((1, 1, 2)), len(index.values[field])))
+    return filters
+
+
+def check_metadata(name, metadata, n_queries=300, seed=7):
+    """Compare ranking with and without rollups against pandas; returns the mismatches"""
+    index = MetadataIndex(metadata)
+    rollups = RollupTables.build(metadata)
+    engines = {'rollups': RankingEngine(metadata, index, rollups), 'rows': RankingEngine(metadata, index)}
+    aggregation = AggregationEngine(metadata, index)
+    frame = crop_frame(metadata)
+
+    rng = random.Random(seed)
+    mismatches = 0
+    via_rollups = 0
+    for _ in range(n_queries):
+        metric = rng.choice(CROP_ROLLUP_METRICS)
+        group_by = rng.choice(ROLLUP_FIELDS)
+        filters = random_filters(rng, index)
+        n = rng.choice((1, 3, 5, 10, 20))
+        ascending = rng.random() < 0.3
+        expected_groups, expected_values = brute_force_rank(frame, metric, group_by, filters, n, ascending)
+
+        for engine_name, engine in engines.items():
+            result = engine.rank(metric, group_by, filters, n=n, ascending=ascending)
+            groups = [g['value'] for g in result['groups']] if result else []
+            values = np.array([g['metric'] for g in result['groups']]) if result else np.empty(0)
+            if (groups != expected_groups or not np.allclose(values, expected_values, rtol=1e-9)
+                    or aggregation_mismatches(aggregation, result, metric, group_by, filters)):
+                mismatches += 1
+                print(f"   ❌ {engine_name}: {metric} by {group_by} {filters} n={n} asc={ascending}")
+            via_rollups += engine_name == 'rollups' and bool(result) and result['table'] is not None
+
+    for engine_name, engine in engines.items():
+        wrong = compared_trend_mismatches(engine, index)
+        if wrong:
+            mismatches += wrong
+            print(f"   ❌ {engine_name}: compared trends")
+
+    print(f"{name}: {len(frame):,} crop rows, {n_queries} random rankings + compared trends x 2 engines, "
+          f"{via_rollups} answered from rollup tables, {mismatches} mismatches")
+    return mismatches, engines['rollups']
+
+
+def time_ranking(engine, repeats=200):
+    """Latency of the rankings no single rollup table covers"""
+    timings = {}
+    cases = {
+        "top 10 districts by rice yield in 2012": ('yield', 'district', {'crop': ['Rice'], 'year': [2012]}),
+        "top 10 districts by wheat production in Rabi": ('production', 'district', {'crop': ['Wheat'], 'season': ['Rabi']}),
+        "top 10 crops by area in 2010 Kharif": ('area', 'crop', {'year': [2010], 'season': ['Kharif']}),
+    }
+    for label, (metric, group_by, filters) in cases.items():
+        latencies = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            engine.rank(metric, group_by, filters, n=10)
+            latencies.append((time.perf_counter() - start) * 1000)
+        timings[label] = np.percentile(latencies, [50, 95])
+
+    start = time.perf_counter()
+    engine.trend('production', {'district': [engine.index.values['district'][0]], 'crop': ['Rice']})
+    trend_ms = (time.perf_counter() - start) * 1000
+    return timings, trend_ms
+
+
+def check_ranking(n_records=250000, vector_db_path=None):
+    print(f"\n{'='*60}")
+    print("RANKING ENGINE")
+    print(f"{'='*60}")
+
+    metadata = ColumnarMetadata.from_records(with_missing_values(synthetic_records(n_records)))
+    mismatches, engine = check_metadata(f"Synthetic ({n_records:,} records)", metadata)
+
+    timings, trend_ms = time_ranking(engine)
+    print("\nLatency (grouped from rows):")
+    for label, (p50, p95) in timings.items():
+        print(f"   {label:<48} p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+    print(f"   {'district x crop trend':<48} {trend_ms:.2f} ms")
+
+    if vector_db_path:
+        from qa_system import IntelligentQASystem
+        qa = IntelligentQASystem(vector_db_path)
+        db_mismatches, _ = check_metadata(os.path.basename(vector_db_path), qa.metadata)
+        mismatches += db_mismatches
+
+    target_p95 = timings["top 10 districts by rice yield in 2012"][1]
+    print(f"\n{'✅' if not mismatches and target_p95 < 10 else '❌'} "
+          f"{mismatches} mismatches, top-10 district yield p95 {target_p95:.2f} ms (target < 10 ms)")
+    return not mismatches and target_p95 < 10
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 250000
+    path = os.path.abspath(sys.argv[2]) if len(sys.argv) > 2 else None
+    sys.exit(0 if check_ranking(n, path) else 1)
@@ -0,0 +1,123 @@
+"""
+Script to check that the inverted-index search returns the same top-k
+results as the original full cosine_similarity + argsort scan
+"""
+
+import os
+import sys
+import time
+import random
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+from qa_system import IntelligentQASystem
+
+SAMPLE_QUESTIONS = [
+    "What is rice production in Andhra Pradesh?",
+    "Tell me about soil health in Kerala",
+    "rice production in Bihar kharif 2010",
+    "Which district has the largest wheat production in Punjab?",
+    "average pH of soil in Tamil Nadu",
+    "total sugarcane production in Uttar Pradesh",
+    "nitrogen and potassium levels in alluvial soil",
+    "hello",
+    "zzzz unknown words",
+]
+
+
+def full_scan(qa, query, top_k):
+    """The original search path: score every chunk and sort all scores"""
+    query_vector = qa.vectorizer.transform([query])
+    similarities = cosine_similarity(query_vector, qa.embeddings).flatten()
+    top_indices = np.argsort(similarities, kind='stable')[::-1][:top_k]
+    return top_indices, similarities[top_indices]
+
+
+def check_search_parity(n_random=200, top_k=10, vector_db_path='vector_database.pkl'):
+    """Compare both search paths on sample and random chunk-derived queries"""
+    qa = IntelligentQASystem(vector_db_path)
+
+    rng = random.Random(42)
+    queries = list(SAMPLE_QUESTIONS)
+    for idx in rng.sample(range(len(qa.chunks)), min(n_random, len(qa.chunks))):
+        words = qa.chunks[idx].split()
+        start = rng.randrange(max(len(words) - 6, 1))
+        queries.append(" ".join(words[start:start + 6]))
+
+    mismatches = 0
+    full_time = 0.0
+    index_time = 0.0
+
+    for query in queries:
+        start = time.perf_counter()
+        expected_ids, expected_scores = full_scan(qa, query, top_k)
+        full_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        query_vector = qa.vectorizer.transform([query])
+        actual_ids, actual_scores = qa.search_index.search(query_vector, top_k=top_k)
+        index_time += time.perf_counter() - start
+
+        # Scores must match exactly; ids must match wherever scores are not tied
+        same_scores = np.allclose(expected_scores, actual_scores, rtol=0, atol=1e-12)
+        untied = np.array([np.sum(expected_scores == s) == 1 for s in expected_scores], dtype=bool)
+        same_ids = np.array_equal(expected_ids[untied], actual_ids[untied])
+
+        if not (same_scores and same_ids):
+            mismatches += 1
+            print(f"❌ Mismatch for query: {query!r}")
+            print(f"   expected: {list(zip(expected_ids, np.round(expected_scores, 6)))}")
+            print(f"   actual:   {list(zip(actual_ids, np.round(actual_scores, 6)))}")
+
+    # Batched search must rank exactly like one search per query
+    start = time.perf_counter()
+    batch = qa.search_index.search_batch(qa.vectorizer.transform(queries), top_k=top_k)
+    batch_time = time.perf_counter() - start
+    batch_mismatches = 0
+    for query, (batch_ids, batch_scores) in zip(queries, batch):
+        actual_ids, actual_scores = qa.search_index.search(qa.vectorizer.transform([query]), top_k=top_k)
+        if not (np.array_equal(batch_ids, actual_ids) and np.allclose(batch_scores, actual_scores, rtol=0, atol=1e-12)):
+            batch_mismatches += 1
+            print(f"❌ Batch mismatch for query: {query!r}")
+
+    # A memoized repeat must return exactly what the first search returned
+    qa.memo.invalidate()
+    memo_mismatches = 0
+    cold_time = 0.0
+    warm_time = 0.0
+    for query in queries:
+        start = time.perf_counter()
+        first = qa.search(query, top_k=top_k)
+        cold_time += time.perf_counter() - start
+        start = time.perf_counter()
+        again = qa.search(f"  {query.upper()}? ", top_k=top_k)
+        warm_time += time.perf_counter() - start
+        if [(r['chunk'], r['similarity']) for r in first] != [(r['chunk'], r['similarity']) for r in again]:
+            memo_mismatches += 1
+            print(f"❌ Memo mismatch for query: {query!r}")
+    memo_info = qa.memo.info()
+    qa.memo.invalidate('another version')
+    memo_cleared = qa.memo.info()['results']['entries'] == 0
+
+    print(f"\n{'='*60}")
+    print("SEARCH PARITY")
+    print(f"{'='*60}")
+    print(f"Queries checked: {len(queries)}")
+    print(f"Mismatches: {mismatches}")
+    print(f"Full scan:      {full_time / len(queries) * 1000:.2f} ms/query")
+    print(f"Inverted index: {index_time / len(queries) * 1000:.2f} ms/query")
+    print(f"Speedup: {full_time / max(index_time, 1e-9):.1f}x")
+    print(f"Batch mismatches: {batch_mismatches}")
+    print(f"Batched search: {batch_time / len(queries) * 1000:.2f} ms/query")
+    print(f"Memo mismatches: {memo_mismatches}, result hit rate {memo_info['results']['hit_rate']:.2f}, "
+          f"cleared on a new version: {memo_cleared}")
+    print(f"First search: {cold_time / len(queries) * 1000:.2f} ms/query, "
+          f"repeat: {warm_time / len(queries) * 1000:.3f} ms/query")
+
+    return mismatches == 0 and batch_mismatches == 0 and memo_mismatches == 0 and memo_cleared
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'vector_database.pkl'
+    ok = check_search_parity(vector_db_path=os.path.abspath(path))
+    sys.exit(0 if ok else 1)
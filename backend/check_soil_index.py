@@ -0,0 +1,154 @@
+"""
+Script to check the soil range index against a pandas scan of every soil
+record (same counts, same per-region counts) on random nutrient ranges and
+regions, and to compare its latency with the scan
+
+Usage:
+    python check_soil_index.py [n_records] [vector_database]
+
+Synthetic metadata (benchmark_metadata.py, half of it soil records) of
+n_records rows is always checked; a vector database is checked too when given.
+"""
+
+import os
+import random
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from aggregation import SOIL_METRICS
+from benchmark_metadata import synthetic_records
+from metadata_index import MetadataIndex
+from metadata_store import ColumnarMetadata
+from soil_index import SoilIndex, default_group
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+OPERATORS = ('lt', 'le', 'gt', 'ge', 'between')
+
+
+def soil_frame(metadata):
+    """Every soil record as a DataFrame with decoded region fields"""
+    present = metadata.source_mask('pH')
+    frame = pd.DataFrame({metric: metadata.numeric(metric) for metric in SOIL_METRICS})
+    for field in ('state', 'district', 'subdistrict', 'soil_type'):
+        column = np.asarray(metadata.columns[field])
+        labels = np.array(metadata.categories[field] + [None], dtype=object)
+        frame[field] = labels[column]
+    return frame[present]
+
+
+def scan(frame, conditions, filters):
+    """The rows a full scan of the soil records keeps"""
+    keep = np.ones(len(frame), dtype=bool)
+    for field, values in filters.items():
+        keep &= frame[field].isin(values).to_numpy()
+    region = frame[keep]
+    for metric, operator, low, high in conditions:
+        values = frame[metric].to_numpy()
+        with np.errstate(invalid='ignore'):
+            keep &= {'lt': values < high, 'le': values <= high, 'gt': values > low,
+                     'ge': values >= low, 'between': (values >= low) & (values <= high)}[operator]
+    return frame[keep], region
+
+
+def random_query(rng, frame, index):
+    conditions = []
+    for metric in rng.sample(list(SOIL_METRICS), rng.choice((1, 1, 2))):
+        low, high = sorted(float(v) for v in frame[metric].dropna().sample(2, random_state=rng.randrange(10**6)))
+        operator = rng.choice(OPERATORS)
+        conditions.append((metric, operator, low, high if operator == 'between' else low))
+        if operator in ('lt', 'le'):
+            conditions[-1] = (metric, operator, high, high)
+    filters = {}
+    field = rng.choice((None, 'state', 'district', 'soil_type'))
+    if field:
+        filters[field] = rng.sample(index.values[field], 1)
+    return conditions, filters
+
+
+def check_metadata(name, metadata, n_queries=300, seed=11):
+    """Compare range counts and per-region counts with a scan; returns (mismatches, soil index)"""
+    index = MetadataIndex(metadata)
+    soil = SoilIndex(metadata, index)
+    frame = soil_frame(metadata)
+
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(n_queries):
+        conditions, filters = random_query(rng, frame, index)
+        expected, region = scan(frame, conditions, filters)
+        result = soil.range_query(conditions, filters)
+
+        group_by = default_group(filters)
+        expected_groups = expected.groupby([expected['district'], expected[group_by]] if group_by == 'subdistrict'
+                                           else expected[group_by]).size()
+        if (result['count'] != len(expected) or result['region_count'] != len(region)
+                or soil.count(conditions, filters) != len(expected)
+                or sorted(matched for _, matched, _ in result['groups']) != sorted(expected_groups.tolist())):
+            mismatches += 1
+            print(f"   ❌ {conditions} {filters}: {result['count']} vs {len(expected)}")
+
+    summary = soil.region_summary({'state': [index.values['state'][0]]})
+    region = frame[frame['state'] == index.values['state'][0]]
+    for metric, stats in summary['stats'].items():
+        if stats['count'] != region[metric].count() or not np.isclose(stats['mean'], region[metric].mean()):
+            mismatches += 1
+            print(f"   ❌ summary {metric}: {stats} vs {region[metric].mean()}")
+
+    print(f"{name}: {len(frame):,} soil records, {n_queries} random range queries, {mismatches} mismatches")
+    return mismatches, soil, frame
+
+
+def time_queries(soil, frame, repeats=50):
+    """Index lookup vs a scan of every soil record for a few range queries"""
+    state = soil.index.values['state'][0]
+    cases = {
+        f"districts in {state} with pH below 5.5": ([('pH', 'lt', 5.5, 5.5)], {'state': [state]}),
+        "nitrogen above 550 and pH below 4.5": ([('nitrogen', 'gt', 550.0, 550.0), ('pH', 'lt', 4.5, 4.5)], {}),
+        "states with potassium between 100 and 120": ([('potassium', 'between', 100.0, 120.0)], {}),
+    }
+    timings = {}
+    for label, (conditions, filters) in cases.items():
+        start = time.perf_counter()
+        for _ in range(repeats):
+            soil.range_query(conditions, filters)
+        indexed = (time.perf_counter() - start) / repeats * 1000
+        start = time.perf_counter()
+        for _ in range(repeats):
+            scan(frame, conditions, filters)
+        scanned = (time.perf_counter() - start) / repeats * 1000
+        timings[label] = (indexed, scanned)
+    return timings
+
+
+def check_soil_index(n_records=250000, vector_db_path=None):
+    print(f"\n{'='*60}")
+    print("SOIL RANGE INDEX")
+    print(f"{'='*60}")
+
+    metadata = ColumnarMetadata.from_records(synthetic_records(n_records, soil_fraction=0.5))
+    mismatches, soil, frame = check_metadata(f"Synthetic ({n_records:,} records)", metadata)
+
+    print("\nLatency (index vs scan of every soil record):")
+    for label, (indexed, scanned) in time_queries(soil, frame).items():
+        print(f"   {label:<48} {indexed:.2f} ms vs {scanned:.2f} ms")
+
+    if vector_db_path:
+        from qa_system import IntelligentQASystem
+        qa = IntelligentQASystem(vector_db_path)
+        db_mismatches, _, _ = check_metadata(os.path.basename(vector_db_path), qa.metadata)
+        mismatches += db_mismatches
+
+    print(f"\n{'✅' if not mismatches else '❌'} {mismatches} mismatches")
+    return not mismatches
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 250000
+    path = os.path.abspath(sys.argv[2]) if len(sys.argv) > 2 else None
+    sys.exit(0 if check_soil_index(n, path) else 1)
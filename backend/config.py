@@ -3,3 +3,38 @@ import os
 
 # Read Gemini API key from environment (set in Render dashboard)
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+
+# Seconds to wait for a Gemini answer before falling back to the template answer
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "8"))
+
+# Most Gemini calls in flight at once per worker; extra requests wait (within their deadline)
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+
+# /query/batch: Gemini calls one batch may have in flight (leaves slots for interactive
+# queries) and the seconds the whole batch may wait for Gemini answers
+GEMINI_BATCH_CONCURRENCY = int(os.getenv("GEMINI_BATCH_CONCURRENCY", "2"))
+GEMINI_BATCH_TIMEOUT = float(os.getenv("GEMINI_BATCH_TIMEOUT", "60"))
+
+# Estimated tokens the retrieved sources may take in a Gemini prompt; sources are
+# added by relevance until the next one would not fit
+GEMINI_CONTEXT_TOKENS = int(os.getenv("GEMINI_CONTEXT_TOKENS", "600"))
+
+# Local fake Gemini for testing (no API key needed): GEMINI_FAKE=1
+GEMINI_FAKE = os.getenv("GEMINI_FAKE", "").lower() in ("1", "true", "yes")
+GEMINI_FAKE_LATENCY = float(os.getenv("GEMINI_FAKE_LATENCY", "1.0"))
+GEMINI_FAKE_ERROR_RATE = float(os.getenv("GEMINI_FAKE_ERROR_RATE", "0"))
+GEMINI_FAKE_JITTER = float(os.getenv("GEMINI_FAKE_JITTER", "0"))
+
+# Retrieval pipeline: sparse (+ dense) candidates fused with reciprocal-rank
+# fusion, then re-ranked on metadata matches. HYBRID_RETRIEVAL=0 searches
+# with the database's single engine only.
+HYBRID_RETRIEVAL = os.getenv("HYBRID_RETRIEVAL", "1").lower() in ("1", "true", "yes")
+RETRIEVAL_CANDIDATES = int(os.getenv("RETRIEVAL_CANDIDATES", "200"))
+# Stages after the sparse one are skipped once a query has used this many milliseconds
+RETRIEVAL_BUDGET_MS = float(os.getenv("RETRIEVAL_BUDGET_MS", "50"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# In-process memo of query vectors and ranked chunk ids per normalized question
+# (entries kept of each; 0 disables that part)
+QUERY_MEMO_VECTORS = int(os.getenv("QUERY_MEMO_VECTORS", "4096"))
+QUERY_MEMO_RESULTS = int(os.getenv("QUERY_MEMO_RESULTS", "4096"))
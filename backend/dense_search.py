@@ -0,0 +1,330 @@
+"""
+Dense Retrieval with an IVF Index
+LSA (TruncatedSVD) projection of the TF-IDF vectors, searched through an
+inverted-file (IVF) approximate nearest neighbour index
+
+Paraphrases that share few exact terms with a chunk ("paddy output" vs
+"rice production") still land close in the projected space. Only the
+chunks in the few clusters nearest to the query are scored, so search
+stays sub-linear in the number of chunks.
+
+Arrays stored next to the sparse ones in a vector database directory:
+    dense_features.npy     feature ids that occur in the corpus
+    dense_projection.npy   (len(dense_features) x dims) float32 SVD components
+    dense_vectors.npy      (n_chunks x dims) unit-length chunk vectors, float32 or int8
+    dense_scales.npy       per-chunk dequantization scale (int8 only)
+    ivf_centroids.npy      (n_lists x dims) float32 cluster centroids
+    ivf_ptr.npy            start of every list in ivf_ids (n_lists + 1)
+    ivf_ids.npy            chunk ids grouped by list
+
+Every chunk is stored in its `spill` nearest lists (only the id is
+repeated), which keeps recall high when its neighbours straddle a list
+boundary.
+"""
+
+import math
+import os
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+
+from sparse_search import EMPTY_IDS, EMPTY_SCORES, select_top_k
+
+DENSE_METHOD = 'lsa-ivf'
+QUANTIZATIONS = ('float32', 'int8')
+
+# Rows projected per step while building, bounds the temporary dense matrices
+BUILD_BATCH = 65536
+
+# When the probed lists hold more than this share of the chunks, one pass
+# over all vectors is cheaper than gathering the probed rows
+FULL_SCAN_FRACTION = 0.25
+
+
+def _unit_rows(vectors):
+    """Scale rows to unit length (zero rows stay zero)"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _feature_rows(features, n_features):
+    """Feature id -> projection row (-1 for features that never occur)"""
+    rows = np.full(n_features, -1, dtype=np.int64)
+    rows[features] = np.arange(len(features))
+    return rows
+
+
+def compact_columns(matrix, feature_rows, n_used):
+    """TF-IDF rows re-indexed onto the projection rows, dropping unseen features"""
+    matrix = sparse.csr_matrix(matrix, dtype=np.float32)
+    rows = feature_rows[matrix.indices]
+    keep = rows >= 0
+    indptr = np.concatenate([[0], np.cumsum(keep)])[matrix.indptr]
+    return sparse.csr_matrix((matrix.data[keep], rows[keep], indptr), shape=(matrix.shape[0], n_used))
+
+
+def quantize_int8(vectors):
+    """Symmetric per-row int8 quantization; returns (codes, scales)"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class DenseSearchIndex:
+    # Chunk ids that must never be returned (e.g. rows replaced by a newer segment)
+    deleted_ids = EMPTY_IDS
+
+    def __init__(self, features, projection, n_features, vectors, centroids, list_ptr, list_ids,
+                 scales=None, nprobe=32, spill=2):
+        """
+        Args:
+            features: sorted TF-IDF feature ids with a projection row
+            projection: (len(features) x dims) projection of TF-IDF vectors
+            n_features: size of the TF-IDF feature space
+            vectors: (n_chunks x dims) unit-length chunk vectors, float32 or int8
+            centroids: (n_lists x dims) IVF cluster centroids
+            list_ptr, list_ids: chunk ids of every cluster, CSR style
+            scales: per-chunk scales when vectors are int8
+            nprobe: clusters scored per query
+            spill: lists every chunk was assigned to
+        """
+        self.features = features
+        self.projection = projection
+        self.n_features = n_features
+        self.feature_rows = _feature_rows(features, n_features)
+        self.vectors = vectors
+        self.scales = scales
+        self.centroids = centroids
+        self.list_ptr = list_ptr
+        self.list_ids = list_ids
+        self.nprobe = nprobe
+        self.spill = spill
+        self.n_chunks, self.dims = vectors.shape
+        self.n_lists = len(centroids)
+        # Rows of delta segments, outside the IVF lists and always scored
+        self.tail_start = self.n_chunks
+        self.tail = np.zeros((0, self.dims), dtype=np.float32)
+
+    @classmethod
+    def build(cls, embeddings, dims=256, n_lists=None, nprobe=32, spill=2, quantization='float32', seed=42):
+        """Fit the LSA projection and the IVF lists on a TF-IDF matrix
+
+        Args:
+            dims: dimensions kept by the SVD
+            n_lists: IVF clusters (default about sqrt(n_chunks))
+            spill: nearest lists every chunk is stored in
+            quantization: 'float32' or 'int8' storage of the chunk vectors
+        """
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        embeddings = sparse.csr_matrix(embeddings, dtype=np.float32)
+        n_chunks, n_features = embeddings.shape
+
+        # Only features that occur get a projection row; with hashed features
+        # this keeps the SVD and the stored projection small
+        features = np.unique(embeddings.indices).astype(np.int64)
+        feature_rows = _feature_rows(features, n_features)
+        dims = max(1, min(dims, len(features) - 1, n_chunks - 1))
+
+        print(f"   Fitting LSA projection ({dims} dims)...")
+        svd = TruncatedSVD(n_components=dims, algorithm='randomized', random_state=seed)
+        svd.fit(compact_columns(embeddings, feature_rows, len(features)))
+        projection = np.ascontiguousarray(svd.components_.T, dtype=np.float32)
+
+        vectors = np.empty((n_chunks, dims), dtype=np.float32)
+        for start in range(0, n_chunks, BUILD_BATCH):
+            part = compact_columns(embeddings[start:start + BUILD_BATCH], feature_rows, len(features))
+            vectors[start:start + BUILD_BATCH] = _unit_rows(np.asarray(part @ projection, dtype=np.float32))
+
+        n_lists = n_lists or max(1, int(round(math.sqrt(n_chunks))))
+        n_lists = min(n_lists, n_chunks)
+        print(f"   Clustering into {n_lists} IVF lists...")
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, batch_size=4096, n_init=3, random_state=seed)
+        kmeans.fit(vectors)
+        centroids = _unit_rows(kmeans.cluster_centers_.astype(np.float32))
+
+        # Lists by highest cosine, matching how queries pick the clusters to probe
+        spill = max(1, min(spill, n_lists))
+        assignment = np.empty((n_chunks, spill), dtype=np.int64)
+        for start in range(0, n_chunks, BUILD_BATCH):
+            similarities = vectors[start:start + BUILD_BATCH] @ centroids.T
+            nearest = np.argpartition(-similarities, spill - 1, axis=1)[:, :spill] if spill < n_lists \
+                else np.broadcast_to(np.arange(n_lists), similarities.shape)
+            assignment[start:start + BUILD_BATCH] = nearest
+        lists = assignment.ravel()
+        order = np.argsort(lists, kind='stable')
+        list_ids = np.repeat(np.arange(n_chunks, dtype=np.int64), spill)[order]
+        list_ptr = np.searchsorted(lists[order], np.arange(n_lists + 1)).astype(np.int64)
+
+        scales = None
+        if quantization == 'int8':
+            vectors, scales = quantize_int8(vectors)
+        return cls(features, projection, n_features, vectors, centroids, list_ptr, list_ids,
+                   scales=scales, nprobe=nprobe, spill=spill)
+
+    def rebuild(self, embeddings):
+        """New index with the same settings over another TF-IDF matrix (e.g. after compaction)"""
+        return DenseSearchIndex.build(embeddings, dims=self.dims, nprobe=self.nprobe, spill=self.spill,
+                                      quantization=self.quantization)
+
+    @property
+    def quantization(self):
+        return 'int8' if self.scales is not None else 'float32'
+
+    def params(self):
+        """Manifest entry describing the stored arrays"""
+        return {
+            'dims': int(self.dims),
+            'n_features': int(self.n_features),
+            'n_lists': int(self.n_lists),
+            'nprobe': int(self.nprobe),
+            'spill': int(self.spill),
+            'quantization': self.quantization,
+        }
+
+    def arrays(self):
+        """File name -> array, as written into the vector database directory"""
+        arrays = {
+            'dense_features.npy': self.features,
+            'dense_projection.npy': self.projection,
+            'dense_vectors.npy': self.vectors,
+            'ivf_centroids.npy': self.centroids,
+            'ivf_ptr.npy': self.list_ptr,
+            'ivf_ids.npy': self.list_ids,
+        }
+        if self.scales is not None:
+            arrays['dense_scales.npy'] = self.scales
+        return arrays
+
+    @classmethod
+    def load(cls, path, params, mmap_mode='r'):
+        """Open the arrays written by arrays() (memory-mapped by default)"""
+        def get(name):
+            # Plain ndarray view of the mapping: same shared pages, cheaper slicing than np.memmap
+            return np.asarray(np.load(os.path.join(path, name), mmap_mode=mmap_mode))
+
+        scales = get('dense_scales.npy') if params.get('quantization') == 'int8' else None
+        return cls(get('dense_features.npy'), get('dense_projection.npy'), params['n_features'],
+                   get('dense_vectors.npy'), np.load(os.path.join(path, 'ivf_centroids.npy')),
+                   get('ivf_ptr.npy'), get('ivf_ids.npy'), scales=scales,
+                   nprobe=params.get('nprobe', 32), spill=params.get('spill', 1))
+
+    def with_segments(self, embeddings, deleted_ids=EMPTY_IDS):
+        """Copy of the index that also searches delta segment rows
+
+        Args:
+            embeddings: TF-IDF rows of the segments, global ids from n_chunks on
+            deleted_ids: sorted global ids that must not be returned
+        """
+        index = DenseSearchIndex(self.features, self.projection, self.n_features, self.vectors,
+                                 self.centroids, self.list_ptr, self.list_ids, scales=self.scales,
+                                 nprobe=self.nprobe, spill=self.spill)
+        if embeddings is not None and embeddings.shape[0]:
+            index.tail = self.project(embeddings)
+        index.n_chunks = self.n_chunks + len(index.tail)
+        index.deleted_ids = np.asarray(deleted_ids, dtype=np.int64)
+        return index
+
+    def project(self, query_vectors):
+        """Unit-length dense vectors for TF-IDF rows"""
+        compact = compact_columns(query_vectors, self.feature_rows, len(self.features))
+        return _unit_rows(np.asarray(compact @ self.projection, dtype=np.float32))
+
+    def _score_ids(self, query, ids):
+        """Cosine scores of one projected query against chunk ids"""
+        scores = np.empty(len(ids), dtype=np.float64)
+        base = ids < self.tail_start
+        base_ids = ids[base]
+        vectors = self.vectors[base_ids]
+        if self.scales is not None:
+            scores[base] = (vectors.astype(np.float32) @ query) * self.scales[base_ids]
+        else:
+            scores[base] = vectors @ query
+        if not base.all():
+            scores[~base] = self.tail[ids[~base] - self.tail_start] @ query
+        return scores
+
+    def _probe(self, centroid_scores, top_k):
+        """Chunk ids in the nearest clusters; probes more than nprobe until top_k live ids are found"""
+        order = np.argsort(-centroid_scores, kind='stable')
+        sizes = np.diff(self.list_ptr)[order]
+        needed = (top_k + len(self.deleted_ids)) * self.spill
+        enough = np.searchsorted(np.cumsum(sizes), needed) + 1
+        probed = order[:max(self.nprobe, enough)]
+        ids = [self.list_ids[self.list_ptr[i]:self.list_ptr[i + 1]] for i in probed]
+        if len(self.tail):
+            ids.append(np.arange(self.tail_start, self.n_chunks, dtype=np.int64))
+        if not ids:
+            return EMPTY_IDS
+        ids = np.concatenate(ids).astype(np.int64)
+        if self.spill > 1:
+            # A chunk spilled into several probed lists is scored once
+            ids.sort()
+            ids = ids[np.concatenate([[True], ids[1:] != ids[:-1]])]
+        return ids
+
+    def _search_projected(self, query, centroid_scores, top_k, candidates=None):
+        if candidates is not None:
+            # Entity candidates are scored exactly and rank first
+            ids = np.asarray(candidates, dtype=np.int64)
+            if len(self.deleted_ids):
+                ids = ids[~np.isin(ids, self.deleted_ids)]
+            top_ids, top_scores = select_top_k(ids, self._score_ids(query, ids), top_k)
+            if len(top_ids) == top_k:
+                return top_ids, top_scores
+            rest_ids, rest_scores = self._search_projected(query, centroid_scores, top_k)
+            fresh = ~np.isin(rest_ids, top_ids)
+            top_ids = np.concatenate([top_ids, rest_ids[fresh]])[:top_k]
+            top_scores = np.concatenate([top_scores, rest_scores[fresh]])[:top_k]
+            return top_ids, top_scores
+
+        ids = self._probe(centroid_scores, top_k)
+        if len(ids) > self.n_chunks * FULL_SCAN_FRACTION:
+            return self._scan_all(query, top_k)
+        if len(self.deleted_ids):
+            ids = ids[~np.isin(ids, self.deleted_ids)]
+        return select_top_k(ids, self._score_ids(query, ids), top_k)
+
+    def search(self, query_vector, top_k=5, candidates=None):
+        """Return (chunk ids, scores) of the top_k chunks for a TF-IDF query vector
+
+        Args:
+            candidates: optional sorted chunk ids to prefer; when fewer than
+                top_k of them exist the rest comes from the IVF search
+        """
+        top_k = min(top_k, self.n_chunks - len(self.deleted_ids))
+        if top_k <= 0:
+            return EMPTY_IDS, EMPTY_SCORES
+        query = self.project(query_vector)[0]
+        return self._search_projected(query, self.centroids @ query, top_k, candidates)
+
+    def search_batch(self, query_vectors, top_k=5, candidates=None):
+        """search() for every row of a query matrix, projecting all rows at once"""
+        n_queries = query_vectors.shape[0]
+        top_k = min(top_k, self.n_chunks - len(self.deleted_ids))
+        if top_k <= 0 or n_queries == 0:
+            return [(EMPTY_IDS, EMPTY_SCORES) for _ in range(n_queries)]
+
+        queries = self.project(query_vectors)
+        centroid_scores = queries @ self.centroids.T
+        return [
+            self._search_projected(queries[i], centroid_scores[i], top_k,
+                                   None if candidates is None else candidates[i])
+            for i in range(n_queries)
+        ]
+
+    def exact_search(self, query_vector, top_k=5):
+        """Brute-force dense search over every chunk, for recall checks"""
+        return self._scan_all(self.project(query_vector)[0], top_k)
+
+    def _scan_all(self, query, top_k):
+        scores = self.vectors @ query if self.scales is None else (self.vectors @ query) * self.scales
+        scores = np.concatenate([scores, self.tail @ query]).astype(np.float64)
+        ids = np.arange(self.n_chunks, dtype=np.int64)
+        if len(self.deleted_ids):
+            live = ~np.isin(ids, self.deleted_ids)
+            ids, scores = ids[live], scores[live]
+        return select_top_k(ids, scores, top_k)
@@ -0,0 +1,111 @@
+"""
+Fake Gemini Model
+Local stand-in for genai.GenerativeModel that answers after an injected
+latency and fails at a configurable rate, for testing timeouts, fallbacks
+and load without calling the real API
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+
+class FakeGeminiError(Exception):
+    pass
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeGeminiModel:
+    def __init__(self, latency=1.0, jitter=0.0, error_rate=0.0, seed=None, token_latency=0.02):
+        """
+        Args:
+            latency: seconds every call takes (until the first chunk when streaming)
+            jitter: extra random latency, uniform in [0, jitter]
+            error_rate: fraction of calls that raise FakeGeminiError
+            token_latency: seconds between streamed chunks
+        """
+        self.latency = latency
+        self.token_latency = token_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.active = 0
+        self.peak_active = 0
+
+    def _start(self):
+        """Pick this call's latency and outcome and count it as in flight"""
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            latency = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.error_rate
+        return latency, fail
+
+    def _finish(self, prompt, fail):
+        with self._lock:
+            self.active -= 1
+        if fail:
+            raise FakeGeminiError("Injected Gemini failure")
+        return FakeResponse(self.answer(prompt))
+
+    @staticmethod
+    def answer(prompt):
+        """Deterministic answer text echoing the question in the prompt"""
+        for line in prompt.splitlines():
+            for label in ('User Question:', 'User:'):
+                if line.startswith(label):
+                    return f"(fake Gemini) Answer to: {line[len(label):].strip()}"
+        return "(fake Gemini) Hello! I'm SaarthiAI."
+
+    @staticmethod
+    def _chunks(text):
+        """Split an answer into word-sized stream chunks"""
+        words = text.split(' ')
+        return [word + ' ' for word in words[:-1]] + words[-1:]
+
+    def generate_content(self, prompt, stream=False):
+        latency, fail = self._start()
+        time.sleep(latency)
+        response = self._finish(prompt, fail)
+        if not stream:
+            return response
+        return self._stream(response.text)
+
+    def _stream(self, text):
+        for i, chunk in enumerate(self._chunks(text)):
+            if i:
+                time.sleep(self.token_latency)
+            yield FakeResponse(chunk)
+
+    async def generate_content_async(self, prompt, stream=False):
+        latency, fail = self._start()
+        try:
+            await asyncio.sleep(latency)
+        except asyncio.CancelledError:
+            with self._lock:
+                self.active -= 1
+            raise
+        response = self._finish(prompt, fail)
+        if not stream:
+            return response
+        return self._stream_async(response.text)
+
+    async def _stream_async(self, text):
+        for i, chunk in enumerate(self._chunks(text)):
+            if i:
+                await asyncio.sleep(self.token_latency)
+            yield FakeResponse(chunk)
+
+
+class BlockingFakeGeminiModel(FakeGeminiModel):
+    """Fake model without an async API, like older google-generativeai releases"""
+
+    generate_content_async = None
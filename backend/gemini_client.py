@@ -0,0 +1,235 @@
+"""
+Async Gemini Client
+Runs Gemini calls on one asyncio event loop in a background thread, with a
+per-call deadline and a bound on concurrent calls
+
+Flask handlers call generate() synchronously; it waits at most the deadline
+and raises GeminiTimeout instead of holding the worker for the whole LLM
+round trip, so callers can fall back to the template answer.
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import queue
+import threading
+
+
+class GeminiTimeout(Exception):
+    """Gemini did not answer (or no call slot was free) before the deadline"""
+
+
+class AsyncGeminiClient:
+    def __init__(self, model, max_concurrency=4, timeout=8.0):
+        """
+        Args:
+            model: genai.GenerativeModel or a stand-in with generate_content
+                (and optionally generate_content_async)
+            max_concurrency: most calls in flight at once
+            timeout: default deadline in seconds for one call, including
+                the wait for a free slot
+        """
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+        self._semaphore = None
+        self.stats = {'calls': 0, 'completed': 0, 'timeouts': 0, 'rejected': 0, 'errors': 0}
+
+    def _ensure_loop(self):
+        """Start the event loop thread on first use (and again after a fork)"""
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name='gemini-loop', daemon=True)
+                thread.start()
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                self._loop = loop
+                self._pid = os.getpid()
+            return self._loop
+
+    async def generate_async(self, prompt, timeout=None):
+        """Response text for prompt; raises GeminiTimeout after timeout seconds"""
+        loop = asyncio.get_running_loop()
+        timeout = self.timeout if timeout is None else timeout
+        deadline = loop.time() + timeout
+        self.stats['calls'] += 1
+
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.stats['rejected'] += 1
+            raise GeminiTimeout(f"No free Gemini slot within {timeout:.1f}s") from None
+
+        release = True
+        try:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            generate_async = getattr(self.model, 'generate_content_async', None)
+            if generate_async is not None:
+                response = await asyncio.wait_for(generate_async(prompt), remaining)
+            else:
+                # A blocking call cannot be cancelled; its slot frees when the thread finishes
+                future = loop.run_in_executor(None, self.model.generate_content, prompt)
+                release = False
+                future.add_done_callback(lambda _: self._semaphore.release())
+                response = await asyncio.wait_for(asyncio.shield(future), remaining)
+            text = response.text
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            raise GeminiTimeout(f"Gemini did not answer within {timeout:.1f}s") from None
+        except Exception:
+            self.stats['errors'] += 1
+            raise
+        finally:
+            if release:
+                self._semaphore.release()
+
+        self.stats['completed'] += 1
+        return text
+
+    def generate(self, prompt, timeout=None):
+        """Blocking wrapper around generate_async for request handlers"""
+        timeout = self.timeout if timeout is None else timeout
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self.generate_async(prompt, timeout), loop)
+        try:
+            # Small grace period: the coroutine enforces the deadline itself
+            return future.result(timeout + 1.0)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise GeminiTimeout(f"Gemini did not answer within {timeout:.1f}s") from None
+
+    def generate_many(self, prompts, timeout=None, max_concurrency=None):
+        """Texts for several prompts, generated concurrently
+
+        Failed calls come back as their exception (e.g. GeminiTimeout) in
+        place of the text. timeout bounds the whole batch.
+
+        Args:
+            max_concurrency: most calls of this batch in flight at once, on
+                top of the client-wide limit
+        """
+        timeout = self.timeout if timeout is None else timeout
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(
+            self._generate_many(prompts, timeout, max_concurrency), loop
+        )
+        try:
+            return future.result(timeout + 1.0)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            return [GeminiTimeout(f"Gemini did not answer within {timeout:.1f}s")] * len(prompts)
+
+    async def _generate_many(self, prompts, timeout, max_concurrency):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        limit = asyncio.Semaphore(max_concurrency or len(prompts) or 1)
+
+        async def generate_one(prompt):
+            async with limit:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.stats['rejected'] += 1
+                    raise GeminiTimeout(f"Gemini batch ran out of time ({timeout:.1f}s)")
+                return await self.generate_async(prompt, remaining)
+
+        return await asyncio.gather(*(generate_one(prompt) for prompt in prompts), return_exceptions=True)
+
+    def stream(self, prompt, timeout=None):
+        """Yield response text chunks as Gemini produces them
+
+        Raises GeminiTimeout when no chunk arrives within timeout seconds;
+        for the first chunk that includes the wait for a free slot.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        chunks = queue.Queue()
+        stop = threading.Event()
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(self._stream_async(prompt, timeout, chunks, stop), loop)
+        try:
+            while True:
+                try:
+                    kind, value = chunks.get(timeout=timeout + 1.0)
+                except queue.Empty:
+                    raise GeminiTimeout(f"Gemini stream stalled for {timeout:.1f}s") from None
+                if kind == 'chunk':
+                    yield value
+                elif kind == 'error':
+                    raise value
+                else:
+                    return
+        finally:
+            # Stop producing if the caller stopped reading (e.g. the client disconnected)
+            stop.set()
+            future.cancel()
+
+    async def _stream_async(self, prompt, timeout, out, stop=None):
+        """Push ('chunk', text) items to out, then ('done', None) or ('error', exception)
+
+        Args:
+            stop: optional threading.Event set when the reader gives up; a
+                blocking stream checks it between chunks
+        """
+        loop = asyncio.get_running_loop()
+        self.stats['calls'] += 1
+
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.stats['rejected'] += 1
+            out.put(('error', GeminiTimeout(f"No free Gemini slot within {timeout:.1f}s")))
+            return
+
+        release = True
+        try:
+            generate_async = getattr(self.model, 'generate_content_async', None)
+            if generate_async is not None:
+                response = await asyncio.wait_for(generate_async(prompt, stream=True), timeout)
+                chunks = response.__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        break
+                    out.put(('chunk', chunk_text(chunk)))
+            else:
+                # Blocking iterator in a worker thread; the reader enforces the deadline.
+                # The thread cannot be cancelled, so its slot frees when it finishes
+                future = loop.run_in_executor(None, self._stream_blocking, prompt, out, stop)
+                release = False
+                future.add_done_callback(lambda _: self._semaphore.release())
+                await asyncio.shield(future)
+            self.stats['completed'] += 1
+            out.put(('done', None))
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            out.put(('error', GeminiTimeout(f"Gemini stream stalled for {timeout:.1f}s")))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats['errors'] += 1
+            out.put(('error', e))
+        finally:
+            if release:
+                self._semaphore.release()
+
+    def _stream_blocking(self, prompt, out, stop=None):
+        for chunk in self.model.generate_content(prompt, stream=True):
+            if stop is not None and stop.is_set():
+                break
+            out.put(('chunk', chunk_text(chunk)))
+
+    def status(self):
+        return dict(self.stats, max_concurrency=self.max_concurrency, timeout=self.timeout)
+
+
+def chunk_text(chunk):
+    """Text of one streamed response chunk ('' for chunks without text parts)"""
+    try:
+        return chunk.text or ''
+    except ValueError:
+        return ''
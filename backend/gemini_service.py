@@ -3,23 +3,98 @@ Gemini AI Service for Enhanced Answer Generation
 Uses Google's Gemini API to generate natural, conversational responses
 """
 
+import threading
+import config
+from gemini_client import AsyncGeminiClient, GeminiTimeout
+from prompt_context import build_context, estimate_tokens
+
 try:
-    import google.generativeai as genai
-    import config
-    
-    # Configure Gemini
-    genai.configure(api_key=config.GEMINI_API_KEY)
-    
-    # Initialize the model (using stable 2.5-flash model)
-    model = genai.GenerativeModel('gemini-2.5-flash')
+    if config.GEMINI_FAKE:
+        # Local stand-in with injected latency, for testing deadlines and load
+        from fake_gemini import FakeGeminiModel
+        model = FakeGeminiModel(latency=config.GEMINI_FAKE_LATENCY, jitter=config.GEMINI_FAKE_JITTER,
+                                error_rate=config.GEMINI_FAKE_ERROR_RATE)
+        print(f"Fake Gemini model initialized ({config.GEMINI_FAKE_LATENCY}s latency)")
+    else:
+        import google.generativeai as genai
+        
+        # Configure Gemini
+        genai.configure(api_key=config.GEMINI_API_KEY)
+        
+        # Initialize the model (using stable 2.5-flash model)
+        model = genai.GenerativeModel('gemini-2.5-flash')
+        print("Gemini model 'gemini-2.5-flash' initialized successfully")
     GEMINI_READY = True
-    print("Gemini model 'gemini-2.5-flash' initialized successfully")
 except Exception as e:
     print(f"Warning: Gemini not available: {e}")
     GEMINI_READY = False
     model = None
 
-def generate_smart_response(user_question, retrieved_data):
+# Calls go through one event loop with a deadline and a concurrency limit
+client = AsyncGeminiClient(model, max_concurrency=config.GEMINI_MAX_CONCURRENCY,
+                           timeout=config.GEMINI_TIMEOUT) if GEMINI_READY else None
+
+# Sizes of the smart prompts built so far, against the previous layout
+# (top 3 sources with their chunk text and metadata repr)
+prompt_stats = {'prompts': 0, 'tokens': 0, 'legacy_tokens': 0, 'sources_used': 0,
+                'over_budget': 0, 'duplicates': 0}
+_prompt_stats_lock = threading.Lock()
+
+def legacy_context_tokens(retrieved_data):
+    """Estimated tokens of the retrieved data in the previous prompt layout"""
+    text = ""
+    if retrieved_data.get('aggregation'):
+        text += f"\nComputed from the full dataset: {retrieved_data['aggregation']['answer']}\n"
+    for i, source in enumerate(retrieved_data['sources'][:3], 1):
+        text += f"\nSource {i}:\nDataset: {source['dataset']}\nInformation: {source['chunk']}\n"
+        if 'details' in source:
+            text += f"Details: {source['details']}\n"
+        text += f"Relevance: {source['relevance']}\n"
+    return estimate_tokens(text)
+
+def build_smart_prompt(user_question, retrieved_data, token_budget=None):
+    """Gemini prompt grounding the answer in the retrieved sources
+
+    Args:
+        token_budget: estimated tokens for the sources (default config.GEMINI_CONTEXT_TOKENS)
+    """
+    token_budget = config.GEMINI_CONTEXT_TOKENS if token_budget is None else token_budget
+    data, info = build_context(retrieved_data, token_budget)
+    with _prompt_stats_lock:
+        prompt_stats['prompts'] += 1
+        prompt_stats['tokens'] += info['tokens']
+        prompt_stats['legacy_tokens'] += legacy_context_tokens(retrieved_data)
+        prompt_stats['sources_used'] += info['sources_used']
+        prompt_stats['over_budget'] += info['over_budget']
+        prompt_stats['duplicates'] += info['duplicates']
+
+    # Prepare context for Gemini
+    context = f"""You are an expert agriculture assistant helping users with questions about Indian agriculture, crop production, and soil health.
+
+User Question: {user_question}
+
+Retrieved Data from Knowledge Base (one record per table row; values in a table's heading apply to all its rows):
+{data}
+"""
+    
+    # Create the prompt
+    prompt = f"""{context}
+
+Based on the retrieved information above, provide a helpful, clear, and conversational answer to the user's question. 
+
+Guidelines:
+1. Answer naturally and conversationally
+2. Use the specific data provided
+3. Include relevant numbers and statistics
+4. If multiple sources provide data, synthesize them intelligently
+5. Be concise but informative
+6. If the data is limited, mention it but provide what you can
+
+Your Response:"""
+    return prompt
+
+
+def generate_smart_response(user_question, retrieved_data, timeout=None):
     """
     Generate a natural, conversational response using Gemini AI
     based on the retrieved data from the Q&A system
@@ -27,6 +102,8 @@ def generate_smart_response(user_question, retrieved_data):
     Args:
         user_question: The user's original question
         retrieved_data: Dictionary containing retrieved chunks and sources
+        timeout: seconds to wait for Gemini (default config.GEMINI_TIMEOUT);
+            after that the template answer in retrieved_data is returned
     
     Returns:
         Enhanced natural language response
@@ -44,43 +121,11 @@ def generate_smart_response(user_question, retrieved_data):
             'sources': []
         }
     
-    # Prepare context for Gemini
-    context = f"""You are an expert agriculture assistant helping users with questions about Indian agriculture, crop production, and soil health.
-
-User Question: {user_question}
-
-Retrieved Data from Knowledge Base:
-"""
-    
-    # Add retrieved chunks
-    for i, source in enumerate(retrieved_data['sources'][:3], 1):
-        context += f"\nSource {i}:\n"
-        context += f"Dataset: {source['dataset']}\n"
-        context += f"Information: {source['chunk']}\n"
-        if 'details' in source:
-            context += f"Details: {source['details']}\n"
-        context += f"Relevance: {source['relevance']}\n"
-    
-    # Create the prompt
-    prompt = f"""{context}
-
-Based on the retrieved information above, provide a helpful, clear, and conversational answer to the user's question. 
-
-Guidelines:
-1. Answer naturally and conversationally
-2. Use the specific data provided
-3. Include relevant numbers and statistics
-4. If multiple sources provide data, synthesize them intelligently
-5. Be concise but informative
-6. If the data is limited, mention it but provide what you can
-
-Your Response:"""
+    prompt = build_smart_prompt(user_question, retrieved_data)
 
     try:
-        # Generate response using Gemini
-        response = model.generate_content(prompt)
-        
-        enhanced_answer = response.text.strip()
+        # Generate response using Gemini, within the deadline
+        enhanced_answer = client.generate(prompt, timeout=timeout).strip()
         
         return {
             'answer': enhanced_answer,
@@ -90,47 +135,117 @@ Your Response:"""
         }
         
     except Exception as e:
-        print(f"Gemini API Error: {str(e)}")
+        timed_out = isinstance(e, GeminiTimeout)
+        print(f"Gemini {'timeout' if timed_out else 'API Error'}: {str(e)}")
         # Fallback to original response
         return {
             'answer': retrieved_data.get('answer', "Sorry, I encountered an error generating the response."),
             'confidence': retrieved_data.get('confidence', 0),
             'sources': retrieved_data.get('sources', []),
             'ai_enhanced': False,
-            'fallback': True
+            'fallback': True,
+            'fallback_reason': 'timeout' if timed_out else 'error'
         }
 
+def generate_batch_responses(items, timeout=None, max_concurrency=None):
+    """Gemini answers for several questions at once (used by /query/batch)
+
+    Args:
+        items: list of (user_question, retrieved_data) pairs; retrieved_data
+            None asks for an open response (greetings, out-of-domain)
+        timeout: seconds the whole batch may take (default config.GEMINI_BATCH_TIMEOUT)
+        max_concurrency: most calls of this batch in flight (default
+            config.GEMINI_BATCH_CONCURRENCY)
+
+    Returns:
+        One result per item, shaped like generate_smart_response /
+        generate_open_response, including their fallbacks
+    """
+    if not GEMINI_READY or model is None:
+        raise Exception("Gemini not available")
+    timeout = config.GEMINI_BATCH_TIMEOUT if timeout is None else timeout
+    max_concurrency = max_concurrency or config.GEMINI_BATCH_CONCURRENCY
+
+    results = [None] * len(items)
+    prompts = []
+    positions = []
+    for i, (user_question, retrieved_data) in enumerate(items):
+        if retrieved_data is None:
+            prompts.append(build_open_prompt(user_question))
+        elif retrieved_data.get('sources'):
+            prompts.append(build_smart_prompt(user_question, retrieved_data))
+        else:
+            # Same "nothing found" answer as generate_smart_response, without a call
+            results[i] = generate_smart_response(user_question, retrieved_data)
+            continue
+        positions.append(i)
+
+    texts = client.generate_many(prompts, timeout=timeout, max_concurrency=max_concurrency) if prompts else []
+    for i, text in zip(positions, texts):
+        retrieved_data = items[i][1]
+        if isinstance(text, Exception):
+            fallback = {
+                'ai_enhanced': False,
+                'fallback': True,
+                'fallback_reason': 'timeout' if isinstance(text, GeminiTimeout) else 'error'
+            }
+            if retrieved_data is None:
+                results[i] = dict(fallback, answer="Hi! I'm SaarthiAI, your agriculture assistant. How can I help you today?",
+                                  confidence=0, sources=[])
+            else:
+                results[i] = dict(fallback, answer=retrieved_data.get('answer', "Sorry, I encountered an error generating the response."),
+                                  confidence=retrieved_data.get('confidence', 0), sources=retrieved_data.get('sources', []))
+        elif retrieved_data is None:
+            results[i] = {
+                'answer': (text or "Hello! I'm SaarthiAI. How can I help you today?").strip(),
+                'confidence': 0.5,
+                'sources': [],
+                'ai_enhanced': True
+            }
+        else:
+            results[i] = {
+                'answer': text.strip(),
+                'confidence': retrieved_data.get('confidence', 0),
+                'sources': retrieved_data.get('sources', []),
+                'ai_enhanced': True
+            }
+    return results
+
+def prompt_summary():
+    """Average smart prompt size now and in the previous layout, for /stats"""
+    with _prompt_stats_lock:
+        stats = dict(prompt_stats)
+    prompts = stats['prompts']
+    if prompts:
+        stats['avg_tokens'] = round(stats['tokens'] / prompts, 1)
+        stats['avg_legacy_tokens'] = round(stats['legacy_tokens'] / prompts, 1)
+        stats['avg_sources_used'] = round(stats['sources_used'] / prompts, 2)
+    stats['token_budget'] = config.GEMINI_CONTEXT_TOKENS
+    return stats
+
 def check_gemini_connection():
     """Check if Gemini API is working"""
     try:
         if not GEMINI_READY or model is None:
             return False, "Gemini not initialized"
-        test_response = model.generate_content("Say 'Hello' if you're working.")
-        return True, test_response.text
+        return True, client.generate("Say 'Hello' if you're working.")
     except Exception as e:
         return False, str(e)
 
 
-def generate_open_response(user_question):
-    """Generate a freeform conversational response as SaarthiAI.
+def build_open_prompt(user_question):
+    """Gemini prompt for greetings and questions outside the knowledge base"""
+    system_preamble = (
+        "You are SaarthiAI, a friendly Indian agriculture assistant. "
+        "Introduce yourself as SaarthiAI when appropriate. "
+        "You can handle casual greetings and general questions. "
+        "For health or lifestyle questions like 'which crop is best for health', "
+        "provide balanced, non-medical general advice (e.g., whole grains, millets, pulses), "
+        "and include a short disclaimer that recommendations can vary by individual needs. "
+        "Keep responses concise and helpful."
+    )
 
-    Used for greetings, small talk, or questions outside the knowledge base.
-    """
-    try:
-        if not GEMINI_READY or model is None:
-            raise Exception("Gemini not available")
-
-        system_preamble = (
-            "You are SaarthiAI, a friendly Indian agriculture assistant. "
-            "Introduce yourself as SaarthiAI when appropriate. "
-            "You can handle casual greetings and general questions. "
-            "For health or lifestyle questions like 'which crop is best for health', "
-            "provide balanced, non-medical general advice (e.g., whole grains, millets, pulses), "
-            "and include a short disclaimer that recommendations can vary by individual needs. "
-            "Keep responses concise and helpful."
-        )
-
-        prompt = f"""{system_preamble}
+    prompt = f"""{system_preamble}
 
 User: {user_question}
 
@@ -141,9 +256,23 @@ Instructions:
 - Do not invent dataset citations.
 
 Assistant:"""
+    return prompt
+
+
+def generate_open_response(user_question, timeout=None):
+    """Generate a freeform conversational response as SaarthiAI.
+
+    Used for greetings, small talk, or questions outside the knowledge base.
+    Falls back to a static introduction if Gemini misses the deadline.
+    """
+    try:
+        if not GEMINI_READY or model is None:
+            raise Exception("Gemini not available")
 
-        response = model.generate_content(prompt)
-        answer = (response.text or "Hello! I'm SaarthiAI. How can I help you today?").strip()
+        prompt = build_open_prompt(user_question)
+
+        text = client.generate(prompt, timeout=timeout)
+        answer = (text or "Hello! I'm SaarthiAI. How can I help you today?").strip()
 
         return {
             'answer': answer,
@@ -159,5 +288,24 @@ Assistant:"""
             'sources': [],
             'ai_enhanced': False,
             'fallback': True,
+            'fallback_reason': 'timeout' if isinstance(e, GeminiTimeout) else 'error',
             'error': str(e)
-        }
\ No newline at end of file
+        }
+
+
+def stream_smart_response(user_question, retrieved_data, timeout=None):
+    """Yield Gemini answer chunks for a knowledge base question as they arrive
+
+    Raises GeminiTimeout (or the API error) so the caller can fall back to
+    the template answer.
+    """
+    if not GEMINI_READY or model is None:
+        raise Exception("Gemini not available")
+    yield from client.stream(build_smart_prompt(user_question, retrieved_data), timeout=timeout)
+
+
+def stream_open_response(user_question, timeout=None):
+    """Yield Gemini answer chunks for greetings and out-of-domain questions"""
+    if not GEMINI_READY or model is None:
+        raise Exception("Gemini not available")
+    yield from client.stream(build_open_prompt(user_question), timeout=timeout)
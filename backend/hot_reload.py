@@ -0,0 +1,222 @@
+"""
+Hot Reload of the Q&A System
+Loads a retrained vector database in the background and swaps it in
+without restarting the server
+
+Every request leases the instance that is current when it starts and keeps
+using it until it finishes, so a swap never changes the index under a
+running request. After a swap the old instance is dropped once its
+in-flight requests have drained.
+"""
+
+import os
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from incremental_index import segment_paths
+from vector_store import MANIFEST
+
+# Canned queries run against a freshly loaded index before it takes traffic
+WARMUP_QUERIES = (
+    "What is rice production in Andhra Pradesh?",
+    "Tell me about soil health in Kerala",
+    "Total wheat production in Punjab",
+    "Which district has the highest sugarcane yield?",
+)
+
+
+def database_fingerprint(path):
+    """Value that changes whenever the vector database at path is rewritten
+
+    Returns None while the database is missing (e.g. mid-swap).
+    """
+    try:
+        if os.path.isdir(path):
+            # save_vector_store renames whole directories, so the manifest's inode changes
+            parts = [path] + segment_paths(path)
+            stats = [os.stat(os.path.join(part, MANIFEST)) for part in parts]
+            return tuple((part, st.st_ino, st.st_mtime_ns) for part, st in zip(parts, stats))
+        st = os.stat(path)
+        return ((path, st.st_ino, st.st_mtime_ns, st.st_size),)
+    except OSError:
+        return None
+
+
+class Lease:
+    """One request's hold on a Q&A system generation"""
+
+    def __init__(self, manager, generation, qa):
+        self.manager = manager
+        self.generation = generation
+        self.qa = qa
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.manager._release(self.generation)
+
+    def __enter__(self):
+        return self.qa
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class QASystemManager:
+    def __init__(self, loader, warmup_queries=WARMUP_QUERIES, drain_timeout=120, on_swap=None):
+        """
+        Args:
+            loader: callable returning a new IntelligentQASystem
+            warmup_queries: questions answered before a new instance is swapped in
+            drain_timeout: seconds to wait for requests on the old instance
+            on_swap: optional callable run with the new instance right after a swap
+        """
+        self.loader = loader
+        self.on_swap = on_swap
+        self.warmup_queries = warmup_queries
+        self.drain_timeout = drain_timeout
+
+        self._cond = threading.Condition()
+        self._qa = None
+        self._generation = 0
+        self._in_flight = {}
+        self._reload_thread = None
+        self._watch_thread = None
+        self._fingerprint = None
+
+        self.loaded_at = None
+        self.last_reload_seconds = None
+        self.last_error = None
+
+    def load(self):
+        """Load the first instance synchronously (no-op once loaded)"""
+        with self._cond:
+            if self._qa is None:
+                qa = self.loader()
+                self._fingerprint = database_fingerprint(qa.db_path)
+                self._install(qa)
+            return self._qa
+
+    def _install(self, qa):
+        self._generation += 1
+        self._qa = qa
+        self._in_flight[self._generation] = 0
+        self.loaded_at = datetime.now().isoformat()
+
+    def acquire(self):
+        """Lease the current instance; release it when the request is done"""
+        if self._qa is None:
+            self.load()
+        with self._cond:
+            generation = self._generation
+            self._in_flight[generation] += 1
+            return Lease(self, generation, self._qa)
+
+    def _release(self, generation):
+        with self._cond:
+            self._in_flight[generation] -= 1
+            if generation != self._generation and self._in_flight[generation] == 0:
+                del self._in_flight[generation]
+            self._cond.notify_all()
+
+    @property
+    def reloading(self):
+        thread = self._reload_thread
+        return thread is not None and thread.is_alive()
+
+    def reload(self, wait=False):
+        """Load a new instance in a background thread and swap it in
+
+        Returns False if a reload is already running.
+        """
+        with self._cond:
+            if self.reloading:
+                return False
+            self._reload_thread = threading.Thread(target=self._reload, name='qa-reload', daemon=True)
+            self._reload_thread.start()
+        if wait:
+            self._reload_thread.join()
+        return True
+
+    def _reload(self):
+        start = time.perf_counter()
+        try:
+            print("🔄 Loading new vector database in the background...")
+            qa = self.loader()
+            fingerprint = database_fingerprint(qa.db_path)
+            self.warm_up(qa)
+        except Exception as e:
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"❌ Reload failed, keeping the current index: {e}")
+            traceback.print_exc()
+            return
+
+        with self._cond:
+            old_generation = self._generation
+            self._install(qa)
+            self._fingerprint = fingerprint
+            self.last_error = None
+            self.last_reload_seconds = time.perf_counter() - start
+        print(f"✅ Swapped in vector database generation {self._generation} "
+              f"({self.last_reload_seconds:.2f}s)")
+        if self.on_swap is not None:
+            self.on_swap(qa)
+
+        self._drain(old_generation)
+
+    def _drain(self, generation):
+        """Wait for the requests still using an old generation to finish"""
+        deadline = time.monotonic() + self.drain_timeout
+        with self._cond:
+            while self._in_flight.get(generation, 0) > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"⚠️ {self._in_flight[generation]} requests still on generation {generation} "
+                          f"after {self.drain_timeout}s")
+                    return
+                self._cond.wait(remaining)
+            self._in_flight.pop(generation, None)
+        print(f"   Generation {generation} drained")
+
+    def warm_up(self, qa):
+        """Answer the canned queries so caches and mapped pages are hot"""
+        start = time.perf_counter()
+        for question in self.warmup_queries:
+            qa.answer_question(question)
+        print(f"   Warm-up: {len(self.warmup_queries)} queries in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def watch(self, interval):
+        """Poll the vector database files and reload when they change"""
+        if self._watch_thread is not None or interval <= 0:
+            return
+        self._watch_thread = threading.Thread(target=self._watch, args=(interval,),
+                                              name='qa-watch', daemon=True)
+        self._watch_thread.start()
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            qa = self._qa
+            if qa is None or self.reloading:
+                continue
+            fingerprint = database_fingerprint(qa.db_path)
+            if fingerprint is not None and fingerprint != self._fingerprint:
+                print("📂 Vector database changed on disk")
+                # Each change is tried once; a failed load waits for the next change or /admin/reload
+                self._fingerprint = fingerprint
+                self.reload()
+
+    def status(self):
+        with self._cond:
+            return {
+                'generation': self._generation,
+                'loaded_at': self.loaded_at,
+                'reloading': self.reloading,
+                'in_flight': dict(self._in_flight),
+                'last_reload_seconds': self.last_reload_seconds,
+                'last_error': self.last_error,
+                'watching': self._watch_thread is not None,
+            }
@@ -0,0 +1,159 @@
+"""
+Hybrid Retrieval Pipeline
+Multi-stage search: a few hundred candidates from the sparse (and, when the
+database has one, the dense) index, fused with reciprocal-rank fusion, then
+re-ranked so chunks matching the states/crops/years named in the question
+come first
+
+Every stage is timed. Stages after the sparse one are skipped once the
+query has used up its latency budget, so a slow dense probe or a large
+re-rank can never push a query far past the budget.
+"""
+
+import time
+import numpy as np
+
+from sparse_search import EMPTY_IDS, select_top_k
+
+
+class HybridRetriever:
+    def __init__(self, sparse_index, dense_index=None, metadata_index=None,
+                 n_candidates=200, rrf_k=60, budget_ms=50.0):
+        """
+        Args:
+            sparse_index: SparseSearchIndex (or SegmentedSearchIndex)
+            dense_index: optional DenseSearchIndex searched alongside
+            metadata_index: MetadataIndex used by the re-ranker
+            n_candidates: chunks each candidate stage retrieves
+            rrf_k: reciprocal-rank fusion constant, score = 1 / (rrf_k + rank)
+            budget_ms: milliseconds after which optional stages are skipped
+        """
+        self.sparse_index = sparse_index
+        self.dense_index = dense_index
+        self.metadata_index = metadata_index
+        self.n_candidates = n_candidates
+        self.rrf_k = rrf_k
+        self.budget_ms = budget_ms
+        # One matched entity field is worth as much as a first place in one ranking
+        self.metadata_boost = 1.0 / (rrf_k + 1)
+
+    def search(self, query_vector, top_k=5, entities=None, candidates=None, timings=None, started=None):
+        """Return (chunk ids, similarities) of the top_k chunks
+
+        similarity is the best cosine a chunk got from any candidate stage,
+        so thresholds tuned on TF-IDF scores keep working.
+
+        Args:
+            entities: field -> values named in the question, for the re-ranker
+            candidates: optional sorted chunk ids to prefer (see SparseSearchIndex.search)
+            timings: optional dict that receives per-stage milliseconds and
+                the list of stages skipped for the budget
+            started: time.perf_counter() when the query arrived, if work such
+                as vectorizing already counts against the budget
+        """
+        start = time.perf_counter() if started is None else started
+        stages = {}
+        skipped = []
+
+        def elapsed_ms():
+            return (time.perf_counter() - start) * 1000
+
+        def timed(name, func, *args):
+            stage_start = time.perf_counter()
+            result = func(*args)
+            stages[name] = round((time.perf_counter() - stage_start) * 1000, 3)
+            return result
+
+        n_candidates = max(self.n_candidates, top_k)
+        rankings = [timed('sparse', self.sparse_index.search, query_vector, n_candidates, candidates)]
+
+        if self.dense_index is not None:
+            if elapsed_ms() < self.budget_ms:
+                rankings.append(timed('dense', self.dense_index.search, query_vector, n_candidates, candidates))
+            else:
+                skipped.append('dense')
+
+        ids, fused, similarities = timed('fusion', self.fuse, rankings)
+
+        if entities and self.metadata_index is not None:
+            if elapsed_ms() < self.budget_ms:
+                fused = timed('rerank', self.rerank, ids, fused, entities)
+            else:
+                skipped.append('rerank')
+
+        top_ids, top_similarities = timed('select', self.select, ids, fused, similarities,
+                                          rankings[0][0], top_k)
+
+        if timings is not None:
+            stages['total'] = round(elapsed_ms(), 3)
+            timings.update({'stages': stages, 'skipped': skipped, 'budget_ms': self.budget_ms})
+        return top_ids, top_similarities
+
+    def search_batch(self, query_vectors, top_k=5, entities=None, candidates=None):
+        """search() for every row of a query matrix; candidate stages run batched
+
+        Batches are offline work, so the latency budget does not apply.
+        """
+        n_queries = query_vectors.shape[0]
+        n_candidates = max(self.n_candidates, top_k)
+        sparse_rankings = self.sparse_index.search_batch(query_vectors, n_candidates, candidates)
+        dense_rankings = [None] * n_queries
+        if self.dense_index is not None:
+            dense_rankings = self.dense_index.search_batch(query_vectors, n_candidates, candidates)
+
+        results = []
+        for i in range(n_queries):
+            rankings = [sparse_rankings[i]] + ([dense_rankings[i]] if dense_rankings[i] is not None else [])
+            ids, fused, similarities = self.fuse(rankings)
+            if entities and entities[i] and self.metadata_index is not None:
+                fused = self.rerank(ids, fused, entities[i])
+            results.append(self.select(ids, fused, similarities, sparse_rankings[i][0], top_k))
+        return results
+
+    def fuse(self, rankings):
+        """Reciprocal-rank fusion of (ids, scores) rankings
+
+        Only chunks with a positive score take part; the zero-score padding
+        of the sparse search is used by select() if too few remain.
+
+        Returns:
+            (unique ids, fused scores, best cosine of each id)
+        """
+        all_ids = []
+        contributions = []
+        scores = []
+        for ranked_ids, ranked_scores in rankings:
+            keep = ranked_scores > 0
+            ranked_ids = ranked_ids[keep]
+            all_ids.append(ranked_ids)
+            contributions.append(1.0 / (self.rrf_k + 1 + np.arange(len(ranked_ids))))
+            scores.append(ranked_scores[keep])
+        if not all_ids:
+            return EMPTY_IDS, np.empty(0), np.empty(0)
+
+        ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        fused = np.bincount(inverse, weights=np.concatenate(contributions), minlength=len(ids))
+        similarities = np.zeros(len(ids))
+        np.maximum.at(similarities, inverse, np.concatenate(scores))
+        return ids, fused, similarities
+
+    def rerank(self, ids, fused, entities):
+        """Boost chunks whose metadata matches the entities named in the question"""
+        boost = np.zeros(len(ids))
+        for field, values in entities.items():
+            if values:
+                boost += self.metadata_index.contains(field, values, ids)
+        return fused + self.metadata_boost * boost
+
+    @staticmethod
+    def select(ids, fused, similarities, sparse_ids, top_k):
+        """Final top_k by fused score, filled up with the sparse zero-score padding"""
+        top_ids, _ = select_top_k(ids, fused, top_k)
+        positions = np.searchsorted(ids, top_ids)
+        top_similarities = similarities[positions]
+
+        if len(top_ids) < top_k:
+            padding = sparse_ids[~np.isin(sparse_ids, top_ids)][:top_k - len(top_ids)]
+            top_ids = np.concatenate([top_ids, padding])
+            top_similarities = np.concatenate([top_similarities, np.zeros(len(padding))])
+        return top_ids, top_similarities
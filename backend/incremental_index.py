@@ -0,0 +1,363 @@
+"""
+Incremental Index Updates
+Appends new or changed CSV rows to an existing vector database as delta
+segments, without refitting the vectorizer
+
+Layout of a vector database with segments:
+    vector_database/               base database (see vector_store.py)
+    vector_database/segments/0001  delta segment, same format as the base,
+                                   plus tombstones.npy
+    vector_database/segments/0002  ...
+
+Chunk ids are global: the base rows come first, then every segment in
+order. tombstones.npy lists the global ids a segment replaces or removes.
+Compaction merges the live rows into a new base, refreshes the IDF weights
+and drops the segments.
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, TfidfTransformer
+
+from metadata_store import ColumnarMetadata
+from parallel_vectorizer import ANALYZER_PARAMS, HashingTfidfVectorizer
+from rollups import RollupTables
+from sparse_search import EMPTY_IDS, EMPTY_SCORES, SparseSearchIndex
+from vector_store import is_vector_store, load_vector_store, save_vector_store
+
+SEGMENTS_DIR = 'segments'
+TOMBSTONES = 'tombstones.npy'
+
+DEFAULT_CROP_CSV = os.path.join('Data Set', 'crop_production_full.csv')
+DEFAULT_SOIL_CSV = os.path.join('Data Set', 'soil_health_complete_dataset.csv')
+
+
+class ConcatChunks:
+    """Read-only list of chunk strings spread over several chunk stores"""
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+        np.cumsum([len(part) for part in parts], out=self.offsets[1:])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, idx):
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("chunk index out of range")
+        part = int(np.searchsorted(self.offsets, idx, side='right')) - 1
+        return self.parts[part][idx - self.offsets[part]]
+
+    def __iter__(self):
+        for part in self.parts:
+            yield from part
+
+
+class SegmentedSearchIndex(SparseSearchIndex):
+    """SparseSearchIndex over a base index plus delta segments
+
+    Every segment keeps its own postings; ids are shifted into the global
+    id space and deleted ids are dropped before top-k selection.
+    """
+
+    def __init__(self, indexes, deleted_ids=EMPTY_IDS):
+        self.indexes = indexes
+        self.offsets = np.zeros(len(indexes) + 1, dtype=np.int64)
+        np.cumsum([index.n_chunks for index in indexes], out=self.offsets[1:])
+        self.n_chunks = int(self.offsets[-1])
+        self.n_features = indexes[0].n_features
+        self.deleted_ids = np.asarray(deleted_ids, dtype=np.int64)
+        self.live = np.ones(self.n_chunks, dtype=bool)
+        self.live[self.deleted_ids] = False
+
+    def _merge(self, results):
+        ids = np.concatenate([part_ids for part_ids, _ in results])
+        scores = np.concatenate([part_scores for _, part_scores in results])
+        keep = self.live[ids]
+        return ids[keep], scores[keep]
+
+    def _score_postings(self, query, mask=None):
+        results = []
+        for index, start, end in zip(self.indexes, self.offsets[:-1], self.offsets[1:]):
+            part_mask = None if mask is None else mask[start:end]
+            ids, scores = index._score_postings(query, part_mask)
+            results.append((ids + start, scores))
+        return self._merge(results) if results else (EMPTY_IDS, EMPTY_SCORES)
+
+    def _score_candidates(self, query, candidates):
+        bounds = np.searchsorted(candidates, self.offsets)
+        results = []
+        for i, index in enumerate(self.indexes):
+            part = candidates[bounds[i]:bounds[i + 1]]
+            if len(part):
+                ids, scores = index._score_candidates(query, part - self.offsets[i])
+                results.append((ids + self.offsets[i], scores))
+        return self._merge(results) if results else (EMPTY_IDS, EMPTY_SCORES)
+
+    def score_matrix(self, queries):
+        return sparse.hstack([index.score_matrix(queries) for index in self.indexes], format='csr')
+
+
+def segment_paths(path):
+    """Delta segment directories of a vector database, oldest first"""
+    root = os.path.join(path, SEGMENTS_DIR)
+    if not os.path.isdir(root):
+        return []
+    names = sorted(name for name in os.listdir(root) if name.isdigit())
+    return [os.path.join(root, name) for name in names if is_vector_store(os.path.join(root, name))]
+
+
+def load_collection(path, mmap_mode='r'):
+    """Open a vector database together with its delta segments
+
+    Without segments this is exactly load_vector_store. Otherwise the
+    returned dict spans base + segments and has two extra keys: 'deleted'
+    (sorted global ids of replaced rows) and 'segments' (segment count).
+    """
+    base = load_vector_store(path, mmap_mode=mmap_mode)
+    paths = segment_paths(path)
+    if not paths:
+        return base
+
+    parts = [base]
+    deleted = []
+    for segment_path in paths:
+        segment = load_vector_store(segment_path, mmap_mode=mmap_mode)
+        if segment['n_features'] != base['n_features']:
+            raise ValueError(f"Segment {segment_path} does not match the base feature space")
+        parts.append(segment)
+        deleted.append(np.load(os.path.join(segment_path, TOMBSTONES)))
+    deleted = np.unique(np.concatenate(deleted)).astype(np.int64)
+
+    vector_db = dict(base)
+    vector_db.update({
+        'chunks': ConcatChunks([part['chunks'] for part in parts]),
+        'metadata': ColumnarMetadata.concat([part['metadata'] for part in parts]),
+        'embeddings': sparse.vstack([part['embeddings'] for part in parts], format='csr'),
+        'search_index': SegmentedSearchIndex([part['search_index'] for part in parts], deleted),
+        'n_chunks': sum(part['n_chunks'] for part in parts),
+        'updated_date': parts[-1]['trained_date'],
+        'deleted': deleted,
+        'segments': len(paths),
+    })
+    if base.get('dense_index') is not None:
+        # Segment rows are projected at load time and scored exactly until compaction
+        segment_rows = sparse.vstack([part['embeddings'] for part in parts[1:]], format='csr')
+        vector_db['dense_index'] = base['dense_index'].with_segments(segment_rows, deleted)
+    if base.get('rollups') is not None:
+        # Sums change with every segment; they are cheap to recompute from the metadata
+        vector_db['rollups'] = RollupTables.build(vector_db['metadata'], exclude=deleted)
+    return vector_db
+
+
+def _row_keys(metadata):
+    """(source, record_id) of each row, the identity of a CSV row"""
+    sources = metadata.categories['source']
+    codes = np.asarray(metadata.columns['source'])
+    record_ids = np.asarray(metadata.columns['record_id'])
+    return [(sources[code], int(record_id)) for code, record_id in zip(codes.tolist(), record_ids.tolist())]
+
+
+def _take_columns(columns, positions):
+    return {field: [values[i] for i in positions] for field, values in columns.items()}
+
+
+def ingest(db_path='vector_database', crop_csv=DEFAULT_CROP_CSV, soil_csv=DEFAULT_SOIL_CSV,
+           remove_missing=True):
+    """Add the new and changed rows of the CSVs as a delta segment
+
+    Rows are matched on (source, record_id), where record_id is the row's
+    position in its CSV, like the trainer assigns it. A row whose chunk text
+    differs from the stored one is replaced, rows that are not in the
+    database yet are appended.
+
+    Args:
+        crop_csv, soil_csv: refreshed CSVs; None skips that source
+        remove_missing: also delete rows of a given source that no longer
+            appear in its CSV
+
+    Returns:
+        Path of the new segment, or None if nothing changed
+    """
+    from retrain_model import AdvancedModelTrainer
+
+    print(f"\n📂 Opening vector database: {db_path}")
+    vector_db = load_collection(db_path)
+    metadata = vector_db['metadata']
+    chunks = vector_db['chunks']
+    deleted = set(vector_db.get('deleted', EMPTY_IDS).tolist())
+
+    live = {}
+    for row_id, key in enumerate(_row_keys(metadata)):
+        if row_id not in deleted:
+            live[key] = row_id
+    print(f"   Live chunks: {len(live):,}")
+
+    trainer = AdvancedModelTrainer()
+    column_sets = []
+    new_chunks = []
+    tombstones = []
+    for source, csv_path, build in (
+        ('crop_production', crop_csv, trainer.create_crop_chunks),
+        ('soil_health', soil_csv, trainer.create_soil_chunks),
+    ):
+        if csv_path is None:
+            continue
+        print(f"\n📊 Reading {csv_path}")
+        source_chunks, columns = build(pd.read_csv(csv_path))
+
+        positions = []
+        seen = set()
+        for i, (text, record_id) in enumerate(zip(source_chunks, columns['record_id'])):
+            key = (source, int(record_id))
+            seen.add(key)
+            row_id = live.get(key)
+            if row_id is None:
+                positions.append(i)
+            elif chunks[row_id] != text:
+                positions.append(i)
+                tombstones.append(row_id)
+
+        removed = []
+        if remove_missing:
+            removed = [row_id for key, row_id in live.items() if key[0] == source and key not in seen]
+            tombstones.extend(removed)
+
+        print(f"   New or changed rows: {len(positions):,}, removed rows: {len(removed):,}")
+        new_chunks.extend(source_chunks[i] for i in positions)
+        column_sets.append(_take_columns(columns, positions))
+
+    if not new_chunks and not tombstones:
+        print("\n✅ Vector database is already up to date")
+        return None
+
+    if new_chunks:
+        segment_metadata = ColumnarMetadata.from_column_sets(column_sets)
+    else:
+        # Deletions only: an empty segment that just carries tombstones
+        segment_metadata = ColumnarMetadata.from_columns({'source': []}, {})
+
+    vectorizer = vector_db['vectorizer']
+    segment = {
+        'chunks': new_chunks,
+        'metadata': segment_metadata,
+        'embeddings': vectorizer.transform(new_chunks) if new_chunks
+        else sparse.csr_matrix((0, vector_db['n_features'])),
+        'vectorizer': vectorizer,
+        'method': vector_db['method'],
+        'trained_date': datetime.now().isoformat(),
+        'version': vector_db.get('version'),
+    }
+
+    number = len(segment_paths(db_path)) + 1
+    segment_path = os.path.join(db_path, SEGMENTS_DIR, f'{number:04d}')
+    os.makedirs(os.path.dirname(segment_path), exist_ok=True)
+    save_vector_store(segment, segment_path,
+                      extra_arrays={TOMBSTONES: np.array(sorted(tombstones), dtype=np.int64)})
+
+    print(f"\n✅ Wrote segment {segment_path}")
+    print(f"   Added chunks: {len(new_chunks):,}")
+    print(f"   Deleted chunks: {len(tombstones):,}")
+    return segment_path
+
+
+def refresh_idf(vectorizer, chunks):
+    """Recompute IDF over chunks with the vectorizer's existing features
+
+    Returns the TF-IDF matrix of chunks under the new weights. The
+    vocabulary is kept, so terms that only occur in new rows still need a
+    full retrain; hashed features that were pruned stay pruned.
+    """
+    if isinstance(vectorizer, HashingTfidfVectorizer):
+        n_docs = len(chunks)
+        counts = sparse.csr_matrix(vectorizer.counts(chunks))
+        df = np.bincount(counts.indices, minlength=vectorizer.n_features)
+        smooth = int(vectorizer.smooth_idf)
+        idf = np.log((n_docs + smooth) / (df + smooth)) + 1
+        idf[vectorizer.idf_ == 0] = 0.0
+        vectorizer.idf_ = idf
+        return vectorizer.weight(counts)
+
+    params = vectorizer.get_params()
+    counter = CountVectorizer(**{k: params[k] for k in ANALYZER_PARAMS},
+                              vocabulary=vectorizer.vocabulary_, dtype=np.int64)
+    counts = counter.transform(chunks)
+    # Same weighting TfidfVectorizer applies on top of its counts
+    transformer = TfidfTransformer(norm=vectorizer.norm, use_idf=vectorizer.use_idf,
+                                   smooth_idf=vectorizer.smooth_idf, sublinear_tf=vectorizer.sublinear_tf)
+    transformer.fit(counts)
+    if vectorizer.use_idf:
+        vectorizer.idf_ = transformer.idf_
+    return transformer.transform(counts).astype(vectorizer.dtype)
+
+
+def compact(db_path='vector_database'):
+    """Merge the base and every segment into a new base with fresh IDF weights"""
+    print(f"\n📂 Opening vector database: {db_path}")
+    vector_db = load_collection(db_path)
+    segments = vector_db.get('segments', 0)
+    deleted = vector_db.get('deleted', EMPTY_IDS)
+
+    live = np.setdiff1d(np.arange(vector_db['n_chunks']), deleted)
+    print(f"   Segments: {segments}, live chunks: {len(live):,}, deleted chunks: {len(deleted):,}")
+
+    chunks = [vector_db['chunks'][i] for i in live]
+    metadata = vector_db['metadata'].take(live)
+    vectorizer = vector_db['vectorizer']
+
+    print("\n🔧 Refreshing IDF weights...")
+    embeddings = refresh_idf(vectorizer, chunks)
+
+    merged = {
+        'chunks': chunks,
+        'metadata': metadata,
+        'embeddings': embeddings,
+        'vectorizer': vectorizer,
+        'method': vector_db['method'],
+        'trained_date': datetime.now().isoformat(),
+        'version': vector_db.get('version'),
+    }
+    if vector_db.get('dense_index') is not None:
+        print("\n🧭 Rebuilding the dense index...")
+        merged['dense_index'] = vector_db['dense_index'].rebuild(embeddings)
+    merged['rollups'] = RollupTables.build(metadata)
+    # Replaces the whole directory, segments included
+    save_vector_store(merged, db_path)
+
+    print(f"\n✅ Compacted {segments} segments into {db_path}/")
+    print(f"   Chunks: {len(chunks):,}")
+    return db_path
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Incremental updates of the agricultural vector database")
+    parser.add_argument('command', choices=('ingest', 'compact'))
+    parser.add_argument('--db', default='vector_database', help="vector database directory")
+    parser.add_argument('--crop', default=DEFAULT_CROP_CSV, help="crop production CSV ('' to skip)")
+    parser.add_argument('--soil', default=DEFAULT_SOIL_CSV, help="soil health CSV ('' to skip)")
+    parser.add_argument('--keep-missing', action='store_true',
+                        help="do not delete rows that are missing from the CSVs")
+    args = parser.parse_args()
+
+    if not is_vector_store(args.db):
+        print(f"❌ No vector database at {args.db}; run retrain_model.py first")
+        sys.exit(1)
+
+    if args.command == 'ingest':
+        ingest(args.db, args.crop or None, args.soil or None, remove_missing=not args.keep_missing)
+    else:
+        compact(args.db)
+
+
+if __name__ == '__main__':
+    main()
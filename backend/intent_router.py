@@ -0,0 +1,330 @@
+"""
+Compiled Intent Router
+Decides once per request what kind of question was asked - greeting,
+lookup, aggregate, comparison or out-of-domain - and extracts its entities
+
+Questions are tokenized once; a precompiled phrase table maps token runs to
+trigger groups (greeting words, aggregate operations, comparison words,
+agriculture vocabulary) and the entity extractor finds known states, crops,
+years, ... in the same tokens. A small linear classifier over those sparse
+features picks the intent. Its weights are trained offline on templated
+questions (python intent_router.py) and shipped in intent_weights.json, so
+routing is a dictionary walk and a few additions per request.
+"""
+
+import json
+import math
+import os
+import random
+from datetime import datetime
+
+from aggregation import OPERATIONS, CROP_METRICS, SOIL_METRICS
+from metadata_index import EntityExtractor, normalize_tokens
+
+INTENTS = ('greeting', 'lookup', 'aggregate', 'comparison', 'out_of_domain')
+
+# Intents that never need the knowledge base
+OPEN_INTENTS = ('greeting', 'out_of_domain')
+
+WEIGHTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'intent_weights.json')
+
+# Trigger phrases per feature group, matched as whole token runs
+TRIGGERS = {
+    'greeting': ('hi', 'hii', 'hello', 'hey', 'hola', 'namaste', 'namaskar', 'greetings',
+                 'good morning', 'good afternoon', 'good evening', 'good night',
+                 'thanks', 'thank you', 'bye', 'goodbye', 'how are you'),
+    'identity': ('your name', 'who are you', 'introduce yourself', 'about yourself',
+                 'what can you do', 'who made you', 'saarthi', 'saarthiai'),
+    'comparison': ('compare', 'compared', 'comparing', 'comparison', 'vs', 'versus',
+                   'difference', 'differ', 'between', 'higher than', 'lower than',
+                   'more than', 'less than', 'better than', 'or'),
+    'crop_metric': tuple(word for words in CROP_METRICS.values() for word in words),
+    'soil_metric': tuple(word for words in SOIL_METRICS.values() for word in words)
+                   + ('soil', 'nutrient', 'nutrients', 'fertility', 'npk'),
+    'domain': ('crop', 'crops', 'agriculture', 'agricultural', 'farming', 'farm', 'farmer',
+               'farmers', 'harvest', 'season', 'seasons', 'cultivation', 'grown', 'grow',
+               'sown', 'state', 'states', 'district', 'districts', 'kharif', 'rabi',
+               'irrigation', 'fertilizer', 'fertiliser', 'rainfall', 'tons', 'tonnes'),
+    'group': ('each', 'per', 'every', 'by', 'which', 'rank', 'ranking', 'top'),
+    'question': ('what', 'how', 'where', 'when', 'who', 'why', 'tell', 'show', 'list',
+                 'give', 'is', 'are', 'can', 'explain'),
+}
+TRIGGERS.update({f'op_{name}': words for name, words in OPERATIONS.items()})
+
+# Words that may accompany a greeting without making it a question
+FILLER = ('there', 'sir', 'madam', 'friend', 'bot', 'assistant', 'again', 'so', 'much',
+          'very', 'a', 'lot', 'please', 'ok', 'okay', 'you', 'ji', 'dear', 'all', 'team')
+
+# Entity values used to generate the training questions; only which fields
+# are present reaches the classifier, so the real database is not needed
+TRAINING_VALUES = {
+    'state': ['Punjab', 'Bihar', 'Kerala', 'Andhra Pradesh', 'Uttar Pradesh', 'Chhattisgarh',
+              'Tamil Nadu', 'Maharashtra', 'West Bengal', 'Odisha', 'Gujarat', 'Karnataka'],
+    'district': ['Ludhiana', 'Patna', 'Guntur', 'Nashik', 'Thrissur', 'Raipur', 'Madurai', 'Cuttack'],
+    'crop': ['Rice', 'Wheat', 'Maize', 'Cotton(lint)', 'Sugarcane', 'Arhar/Tur', 'Groundnut',
+             'Jowar', 'Bajra', 'Potato'],
+    'season': ['Kharif', 'Rabi', 'Whole Year', 'Summer'],
+    'year': list(range(2000, 2016)),
+    'soil_type': ['Alluvial', 'Black', 'Red', 'Laterite'],
+}
+
+
+def length_bucket(n_tokens):
+    if n_tokens <= 1:
+        return 'len:1'
+    if n_tokens <= 3:
+        return 'len:2-3'
+    if n_tokens <= 8:
+        return 'len:4-8'
+    return 'len:9+'
+
+
+class IntentRouter:
+    def __init__(self, entity_extractor, weights=None, weights_path=WEIGHTS_PATH):
+        """
+        Args:
+            entity_extractor: EntityExtractor over the served database
+            weights: trained classifier (as written by train()); loaded
+                from weights_path when not given
+        """
+        self.entity_extractor = entity_extractor
+        if weights is None:
+            with open(weights_path) as f:
+                weights = json.load(f)
+        self.intents = list(weights['intents'])
+        self.bias = list(weights['bias'])
+        self.weights = {feature: list(row) for feature, row in weights['weights'].items()}
+
+        # Token-run -> trigger group table, longest phrase matched first
+        self.phrases = {}
+        for group, words in TRIGGERS.items():
+            for word in words:
+                self.phrases.setdefault(normalize_tokens(word), group)
+        self.max_len = max(len(phrase) for phrase in self.phrases)
+        self.filler = frozenset(FILLER)
+
+    def _match(self, tokens):
+        """Trigger groups found in tokens, and whether only greetings and filler were said"""
+        groups = set()
+        chatter = bool(tokens)
+        i = 0
+        while i < len(tokens):
+            for length in range(min(self.max_len, len(tokens) - i), 0, -1):
+                group = self.phrases.get(tokens[i:i + length])
+                if group is not None:
+                    groups.add(group)
+                    if group not in ('greeting', 'identity', 'question'):
+                        chatter = False
+                    i += length
+                    break
+            else:
+                if tokens[i] not in self.filler:
+                    chatter = False
+                i += 1
+        return groups, chatter
+
+    def features(self, tokens, entities):
+        """Active feature names of a tokenized question"""
+        groups, chatter = self._match(tokens)
+        active = [f'trigger:{group}' for group in groups]
+        for field, values in entities.items():
+            active.append(f'entity:{field}')
+            if len(values) > 1:
+                active.append('entity:several')
+        if len(entities) > 1:
+            active.append('entity:fields')
+        if chatter:
+            active.append('chatter')
+        active.append(length_bucket(len(tokens)))
+        return active, groups
+
+    def route(self, question):
+        """Intent of a question with its entities
+
+        Returns:
+            dict with intent, entities (field -> values), operation (the
+            aggregate keyword group: sum/mean/max/min or None) and
+            confidence (softmax probability of the intent)
+        """
+        tokens = normalize_tokens(question or '')
+        entities = self.entity_extractor.extract_tokens(tokens)
+        active, groups = self.features(tokens, entities)
+
+        scores = list(self.bias)
+        for feature in active:
+            row = self.weights.get(feature)
+            if row is not None:
+                for i, weight in enumerate(row):
+                    scores[i] += weight
+
+        # A question naming a state, crop or year is always answered from the data
+        allowed = [i for i, intent in enumerate(self.intents)
+                   if not (entities and intent in OPEN_INTENTS)]
+        best = max(allowed, key=scores.__getitem__)
+        top = max(scores)
+        confidence = math.exp(scores[best] - top) / sum(math.exp(s - top) for s in scores)
+
+        operation = next((name for name in OPERATIONS if f'op_{name}' in groups), None)
+        return {
+            'intent': self.intents[best],
+            'entities': entities,
+            'operation': operation,
+            'confidence': round(confidence, 3),
+        }
+
+
+# Templated training questions per intent; {slots} are filled at random
+TEMPLATES = {
+    'greeting': [
+        'hi', 'hello', 'hey', 'hey there', 'hii', 'namaste', 'namaskar', 'good morning',
+        'good evening', 'good afternoon', 'hello saarthi', 'hi saarthiai', 'hello there friend',
+        'what is your name', 'who are you', 'introduce yourself', 'what can you do',
+        'tell me about yourself', 'how are you', 'hi how are you', 'thanks', 'thank you',
+        'thank you so much', 'ok thanks', 'bye', 'goodbye', 'hello, who are you?',
+        'hey, what is your name?', 'namaste ji', 'good morning saarthi', 'who made you',
+        'hi! what can you do?', 'hello again', 'greetings',
+    ],
+    'lookup': [
+        'what is {crop} production in {state}', 'tell me about soil health in {state}',
+        '{crop} in {district} {year}', 'show {crop} data for {state}', 'soil ph in {district}',
+        'what crops are grown in {state}', 'which soil type is found in {district}',
+        'nitrogen levels in {state} soil', '{crop} {season} {year} {state}',
+        'what is the soil type in {district}', 'tell me about soil health',
+        'what is organic carbon in soil', 'crop production data', '{crop} production',
+        'how much {crop} was produced in {state} in {year}', 'area under {crop} in {district}',
+        'hi, what is {crop} production in {state}?', 'hello, tell me about {state} soil',
+        'what is the potassium content of soil in {state}', '{state} {crop}',
+        'what was the {crop} yield in {district} during {season} {year}', '{state}',
+        'give me {season} crops of {district}', 'list crops in {state}',
+        'what is the soil ph', 'tell me about {crop}', 'phosphorus in {soil_type} soil',
+        'where is {crop} grown', 'which crops are grown in kharif season',
+        'rice production in india', 'how is the soil fertility in {state}',
+        'show me {soil_type} soil data', 'data for {district} district',
+        'what nutrients are in the soil of {district}', '{crop} cultivation in {state} {year}',
+        'which districts grow {crop}', 'irrigation and fertilizer use for {crop}',
+        'which crops does {state} grow', 'which crops are grown in {district} in {year}',
+        'which soil is found in {state}',
+    ],
+    'aggregate': [
+        '{op} {metric} of {crop} in {state}', 'what is the {op} {metric} in {state}',
+        'which district has the {op} {crop} {metric} in {state}', '{op} {crop} production in {year}',
+        'which state produces the most {crop}', 'average soil ph in {state}',
+        'total area under {crop} in {state} in {year}', '{op} {soil_metric} in {state}',
+        'what is the {op} {crop} yield in {district}', 'which year had the {op} {crop} production',
+        '{op} production of {crop} by state', '{op} {metric} per district in {state}',
+        'sum of {crop} production in {state}', 'what is the overall {crop} output of {state}',
+        'mean {soil_metric} of soil in {district}', 'which crop has the {op} area in {state}',
+        'hello, what is the total {crop} production in {state}?',
+        '{op} {crop} {metric} {season} {year}', 'which season has the {op} {crop} production in {state}',
+        'top districts by {crop} production in {state}', '{op} {metric} of {crop}',
+    ],
+    'comparison': [
+        'compare {crop} production in {state} and {state2}', '{state} vs {state2} {crop} production',
+        'difference between {crop} yield in {state} and {state2}',
+        'is {crop} production higher in {state} or {state2}', 'compare soil ph of {state} and {state2}',
+        '{crop} vs {crop2} in {state}', 'how does {state} compare to {state2} for {crop}',
+        'compare {crop} production in {year} and {year2}', '{district} versus {district2} {soil_metric}',
+        'which is better for {crop}, {state} or {state2}', 'compare {crop} and {crop2} area in {district}',
+        'difference in {soil_metric} between {district} and {district2}',
+        '{crop} production {year} vs {year2} in {state}', 'does {state} grow more {crop} than {state2}',
+        'compare {season} and {season2} {crop} production', 'compare the soil of {state} and {state2}',
+    ],
+    'out_of_domain': [
+        'what is the capital of france', 'how do i renew my passport', 'tell me a joke',
+        'who won the cricket world cup', 'write a poem about the sea', 'what is the weather today',
+        'how to cook biryani', 'explain quantum computing', 'what is the stock price of tesla',
+        'who is the prime minister', 'what time is it', 'recommend a good movie',
+        'how do i lose weight', 'what is machine learning', 'translate hello to french',
+        'what is 2 plus 2', 'how to learn python', 'who invented the telephone',
+        'what is the meaning of life', 'book a train ticket', 'how far is the moon',
+        'best phone under 20000', 'how to fix my laptop', 'tell me about the history of rome',
+        'what should i eat for dinner', 'why is the sky blue', 'can you help me with my homework',
+        'what is bitcoin', 'play some music', 'how does gravity work',
+    ],
+}
+OP_WORDS = [word for words in OPERATIONS.values() for word in words]
+METRIC_WORDS = ['production', 'area', 'yield', 'output']
+SOIL_METRIC_WORDS = ['ph', 'organic carbon', 'nitrogen', 'phosphorus', 'potassium']
+
+
+def training_examples(n_per_template=12, seed=0):
+    """(question, intent) pairs generated from TEMPLATES"""
+    rng = random.Random(seed)
+    examples = []
+
+    def pick(field):
+        return str(rng.choice(TRAINING_VALUES[field]))
+
+    for intent, templates in TEMPLATES.items():
+        for template in templates:
+            repeats = n_per_template if '{' in template else 2
+            for _ in range(repeats):
+                slots = {field: pick(field) for field in ('state', 'district', 'crop', 'season',
+                                                          'year', 'soil_type')}
+                slots.update({f'{field}2': pick(field) for field in ('state', 'district', 'crop',
+                                                                     'season', 'year')})
+                slots.update(op=rng.choice(OP_WORDS), metric=rng.choice(METRIC_WORDS),
+                             soil_metric=rng.choice(SOIL_METRIC_WORDS), soil=pick('soil_type'))
+                question = template.format(**slots)
+                if rng.random() < 0.3:
+                    question = question.capitalize() + rng.choice(['?', '', '.'])
+                examples.append((question, intent))
+    return examples
+
+
+def train(path=WEIGHTS_PATH, seed=0):
+    """Fit the intent classifier on the templated questions and save its weights"""
+    from sklearn.feature_extraction import DictVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import train_test_split
+
+    extractor = EntityExtractor(TRAINING_VALUES)
+    empty = {'intents': list(INTENTS), 'bias': [0.0] * len(INTENTS), 'weights': {}}
+    router = IntentRouter(extractor, weights=empty)
+
+    examples = training_examples(seed=seed)
+    rows = []
+    labels = []
+    for question, intent in examples:
+        tokens = normalize_tokens(question)
+        active, _ = router.features(tokens, extractor.extract_tokens(tokens))
+        rows.append({feature: 1 for feature in active})
+        labels.append(intent)
+
+    vectorizer = DictVectorizer()
+    X = vectorizer.fit_transform(rows)
+    X_train, X_test, y_train, y_test = train_test_split(X, labels, test_size=0.2,
+                                                        random_state=seed, stratify=labels)
+    classifier = LogisticRegression(C=4.0, max_iter=2000)
+    classifier.fit(X_train, y_train)
+    held_out = classifier.score(X_test, y_test)
+
+    # Refit on everything for the shipped weights
+    classifier.fit(X, labels)
+    order = [list(classifier.classes_).index(intent) for intent in INTENTS]
+    weights = {
+        'intents': list(INTENTS),
+        'bias': [round(float(classifier.intercept_[i]), 4) for i in order],
+        'weights': {
+            feature: [round(float(classifier.coef_[i, column]), 4) for i in order]
+            for feature, column in sorted(vectorizer.vocabulary_.items())
+        },
+        'trained_date': datetime.now().isoformat(timespec='seconds'),
+        'examples': len(examples),
+        'held_out_accuracy': round(held_out, 4),
+    }
+    with open(path, 'w') as f:
+        # One line per feature keeps retrained weights readable in a diff
+        rows = ',\n'.join(f'  {json.dumps(feature)}: {json.dumps(row)}'
+                          for feature, row in weights['weights'].items())
+        header = json.dumps({key: value for key, value in weights.items() if key != 'weights'},
+                            indent=1)[:-2]
+        f.write(f'{header},\n "weights": {{\n{rows}\n }}\n}}\n')
+
+    print(f"✅ Trained intent router on {len(examples)} questions "
+          f"(held-out accuracy {held_out:.1%}), saved to {path}")
+    return weights
+
+
+if __name__ == "__main__":
+    train()
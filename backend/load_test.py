@@ -0,0 +1,353 @@
+"""
+Load test for the /query endpoint with the fake Gemini backend
+
+Usage:
+    python load_test.py [--server flask|gunicorn] [--workers 2] [--worker-class sync|gthread|gevent]
+                        [--threads 4] [--concurrency 1,8,32] [--duration 30]
+                        [--gemini-latency 1.0] [--gemini-error-rate 0.05]
+                        [--cache memory|sqlite|off] [--output load_test.json]
+    python load_test.py --url http://localhost:5000 ...   (drive a server that is already running)
+
+Starts app.py (the Flask dev server, or gunicorn as on Render) with
+GEMINI_FAKE=1, so every Gemini call is answered by FakeGeminiModel after the
+configured latency and fails at the configured rate. It waits for /health,
+then runs closed-loop clients at each concurrency level for --duration
+seconds. Each client posts a mix of greetings, domain questions and
+questions the knowledge base cannot answer.
+
+Questions are drawn from a fixed pool with a skewed popularity, as real
+traffic repeats popular questions, so the response cache settings matter
+like they would in production.
+
+Reports throughput, error and fallback rates, cache hits and latency
+percentiles overall and per question kind, and writes them as JSON.
+"""
+
+import argparse
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+# Fix Windows console encoding
+if sys.platform == 'win32':
+    import io
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
+GREETINGS = ["hi", "hello", "Hey there!", "namaste", "good morning", "who are you?",
+             "what is your name", "hello, introduce yourself"]
+STATES = ['Andhra Pradesh', 'Bihar', 'Karnataka', 'Kerala', 'Maharashtra', 'Punjab',
+          'Tamil Nadu', 'Uttar Pradesh', 'West Bengal', 'Odisha']
+CROPS = ['Rice', 'Wheat', 'Maize', 'Sugarcane', 'Cotton', 'Groundnut', 'Jowar', 'Bajra']
+DOMAIN_TEMPLATES = [
+    "What is {crop} production in {state}?",
+    "Total {crop} production in {state}",
+    "average yield of {crop} in {state} in {year}",
+    "Which district has the largest {crop} production in {state}?",
+    "Tell me about soil health in {state}",
+    "average pH of soil in {state}",
+    "{crop} grown in {state} during the kharif season of {year}",
+]
+MISSES = ["How do I renew my passport?", "best smartphone under 20000", "zzzz qqq xyzzy",
+          "What is the capital of France?", "write a poem about the sea",
+          "stock price of a tea company", "translate hello into Spanish"]
+KINDS = ('greeting', 'domain', 'miss')
+
+
+def question_pool(size, seed=0):
+    """Domain questions from the templates; a fixed pool so questions repeat"""
+    rng = random.Random(seed)
+    return [rng.choice(DOMAIN_TEMPLATES).format(crop=rng.choice(CROPS), state=rng.choice(STATES),
+                                                year=rng.randrange(1998, 2015))
+            for _ in range(size)]
+
+
+class QuestionMix:
+    def __init__(self, weights, pool_size=200, skew=1.1, seed=0):
+        """
+        Args:
+            weights: shares of greetings, domain questions and misses
+            pool_size: distinct domain questions
+            skew: Zipf exponent of the question popularity (0 = uniform)
+        """
+        self.weights = weights
+        self.pools = {
+            'greeting': GREETINGS,
+            'domain': question_pool(pool_size, seed),
+            'miss': MISSES,
+        }
+        self.popularity = {}
+        for kind, pool in self.pools.items():
+            ranks = np.arange(1, len(pool) + 1, dtype=np.float64)
+            self.popularity[kind] = np.cumsum(ranks ** -skew / np.sum(ranks ** -skew))
+
+    def draw(self, rng):
+        kind = rng.choices(KINDS, weights=self.weights)[0]
+        index = int(np.searchsorted(self.popularity[kind], rng.random()))
+        pool = self.pools[kind]
+        return kind, pool[min(index, len(pool) - 1)]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(args, port):
+    """Start app.py with the fake Gemini; returns the process"""
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ,
+               PORT=str(port),
+               GEMINI_FAKE='1',
+               GEMINI_FAKE_LATENCY=str(args.gemini_latency),
+               GEMINI_FAKE_JITTER=str(args.gemini_jitter),
+               GEMINI_FAKE_ERROR_RATE=str(args.gemini_error_rate),
+               RESPONSE_CACHE=args.cache,
+               RESPONSE_CACHE_PATH=os.path.join(backend_dir, f'load_test_cache_{port}.sqlite3'),
+               PYTHONUNBUFFERED='1')
+    if args.vector_db:
+        env['VECTOR_DB_PATH'] = os.path.abspath(args.vector_db)
+    for item in args.env:
+        key, _, value = item.partition('=')
+        env[key] = value
+
+    if args.server == 'gunicorn':
+        command = [sys.executable, '-m', 'gunicorn', 'app:app', '--bind', f'127.0.0.1:{port}',
+                   '--workers', str(args.workers), '--worker-class', args.worker_class,
+                   '--timeout', '120']
+        if args.worker_class == 'gthread':
+            command += ['--threads', str(args.threads)]
+        elif args.worker_class in ('gevent', 'eventlet'):
+            command += ['--worker-connections', str(args.threads)]
+    else:
+        # Flask's development server, one thread per request
+        command = [sys.executable, 'app.py']
+
+    log = open(args.server_log, 'w', encoding='utf-8') if args.server_log else subprocess.DEVNULL
+    return subprocess.Popen(command, cwd=backend_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_healthy(base_url, process=None, timeout=300):
+    """Poll /health, which also loads the Q&A system in the worker that answers it"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=30) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} not healthy after {timeout}s")
+
+
+def stop_server(process):
+    if process is None or process.poll() is not None:
+        return
+    process.send_signal(signal.SIGINT if sys.platform == 'win32' else signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def post_question(base_url, question, use_gemini, timeout):
+    """One /query request; returns (status, response dict or None, X-Cache header)"""
+    body = json.dumps({'question': question, 'use_gemini': use_gemini}).encode('utf-8')
+    request = urllib.request.Request(f"{base_url}/query", data=body,
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read()), response.headers.get('X-Cache')
+    except urllib.error.HTTPError as e:
+        return e.code, None, None
+
+
+def run_level(base_url, mix, concurrency, duration, use_gemini, timeout, seed):
+    """Closed-loop clients for duration seconds; returns one record per request"""
+    records = []
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(client_id):
+        rng = random.Random(seed * 1000 + client_id)
+        local = []
+        while time.monotonic() < stop_at:
+            kind, question = mix.draw(rng)
+            start = time.perf_counter()
+            try:
+                status, response, cache = post_question(base_url, question, use_gemini, timeout)
+            except Exception as e:
+                status, response, cache = f"error: {type(e).__name__}", None, None
+            local.append({
+                'kind': kind,
+                'latency_ms': (time.perf_counter() - start) * 1000,
+                'ok': status == 200,
+                'status': status,
+                'fallback': bool(response and response.get('fallback')),
+                'ai_enhanced': bool(response and response.get('ai_enhanced')),
+                'cache_hit': cache == 'HIT',
+            })
+        with lock:
+            records.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return records, time.perf_counter() - started
+
+
+def latency_summary(latencies):
+    if not latencies:
+        return None
+    values = np.asarray(latencies)
+    p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99])
+    return {'p50_ms': round(p50, 1), 'p90_ms': round(p90, 1), 'p95_ms': round(p95, 1),
+            'p99_ms': round(p99, 1), 'max_ms': round(values.max(), 1), 'mean_ms': round(values.mean(), 1)}
+
+
+def summarize(records, elapsed, concurrency):
+    n = len(records)
+    ok = [r for r in records if r['ok']]
+    statuses = {}
+    for record in records:
+        if not record['ok']:
+            statuses[str(record['status'])] = statuses.get(str(record['status']), 0) + 1
+    return {
+        'concurrency': concurrency,
+        'requests': n,
+        'elapsed_s': round(elapsed, 2),
+        'throughput_rps': round(n / elapsed, 2) if elapsed else 0.0,
+        'error_rate': round(1 - len(ok) / n, 4) if n else 0.0,
+        'errors': statuses,
+        'fallback_rate': round(sum(r['fallback'] for r in ok) / len(ok), 4) if ok else 0.0,
+        'ai_enhanced_rate': round(sum(r['ai_enhanced'] for r in ok) / len(ok), 4) if ok else 0.0,
+        'cache_hit_rate': round(sum(r['cache_hit'] for r in ok) / len(ok), 4) if ok else 0.0,
+        'latency': latency_summary([r['latency_ms'] for r in ok]),
+        'by_kind': {
+            kind: dict(requests=sum(r['kind'] == kind for r in records),
+                       latency=latency_summary([r['latency_ms'] for r in ok if r['kind'] == kind]))
+            for kind in KINDS
+        },
+    }
+
+
+def fetch_json(url, timeout=10):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return json.loads(response.read())
+    except Exception:
+        return None
+
+
+def print_level(summary):
+    latency = summary['latency'] or {}
+    print(f"\n👥 Concurrency {summary['concurrency']}: {summary['requests']} requests in {summary['elapsed_s']}s")
+    print(f"   throughput {summary['throughput_rps']} req/s, errors {summary['error_rate']:.1%}, "
+          f"Gemini fallbacks {summary['fallback_rate']:.1%}, cache hits {summary['cache_hit_rate']:.1%}")
+    if latency:
+        print(f"   latency p50 {latency['p50_ms']} ms, p95 {latency['p95_ms']} ms, "
+              f"p99 {latency['p99_ms']} ms, max {latency['max_ms']} ms")
+    for kind, stats in summary['by_kind'].items():
+        if stats['latency']:
+            print(f"   {kind:<9} {stats['requests']:>6} requests, p50 {stats['latency']['p50_ms']} ms, "
+                  f"p95 {stats['latency']['p95_ms']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /query with a fake Gemini backend")
+    parser.add_argument('--url', default=None, help="test a running server instead of starting one")
+    parser.add_argument('--server', choices=('flask', 'gunicorn'), default='flask')
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument('--worker-class', default='sync', help="gunicorn worker class: sync, gthread, gevent")
+    parser.add_argument('--threads', type=int, default=4,
+                        help="threads per gthread worker (connections per gevent worker)")
+    parser.add_argument('--concurrency', default='1,4,16', help="comma-separated client counts")
+    parser.add_argument('--duration', type=float, default=30, help="seconds per concurrency level")
+    parser.add_argument('--mix', default='0.1,0.75,0.15', help="shares of greetings, domain questions, misses")
+    parser.add_argument('--pool', type=int, default=200, help="distinct domain questions")
+    parser.add_argument('--skew', type=float, default=1.1, help="Zipf exponent of question popularity")
+    parser.add_argument('--no-gemini', action='store_true', help="send use_gemini=false")
+    parser.add_argument('--gemini-latency', type=float, default=1.0, help="seconds per fake Gemini call")
+    parser.add_argument('--gemini-jitter', type=float, default=0.5, help="extra random latency, up to this")
+    parser.add_argument('--gemini-error-rate', type=float, default=0.02)
+    parser.add_argument('--cache', choices=('memory', 'sqlite', 'off'), default='memory',
+                        help="RESPONSE_CACHE backend of the started server")
+    parser.add_argument('--vector-db', default=None, help="vector database the started server loads")
+    parser.add_argument('--env', action='append', default=[], help="extra KEY=VALUE for the server")
+    parser.add_argument('--server-log', default=None, help="file for the server's output")
+    parser.add_argument('--timeout', type=float, default=60, help="client timeout per request")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='load_test.json')
+    args = parser.parse_args()
+
+    weights = [float(w) for w in args.mix.split(',')]
+    if len(weights) != len(KINDS):
+        parser.error("--mix needs three shares: greetings, domain questions, misses")
+    levels = [int(c) for c in args.concurrency.split(',') if c]
+    mix = QuestionMix(weights, pool_size=args.pool, skew=args.skew, seed=args.seed)
+
+    process = None
+    base_url = args.url.rstrip('/') if args.url else None
+    if base_url is None:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        process = start_server(args, port)
+    setup = 'external server' if args.url else (
+        f"{args.server}" + (f", {args.workers} × {args.worker_class}" if args.server == 'gunicorn' else ''))
+
+    print(f"\n{'='*72}")
+    print(f"LOAD TEST /query ({setup}, cache {args.cache}, fake Gemini "
+          f"{args.gemini_latency}s +{args.gemini_jitter}s, {args.gemini_error_rate:.0%} errors)")
+    print(f"{'='*72}")
+    report = {
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'server_log')},
+        'levels': [],
+    }
+    try:
+        start = time.perf_counter()
+        wait_until_healthy(base_url, process)
+        print(f"✅ Server ready in {time.perf_counter() - start:.1f}s")
+
+        for concurrency in levels:
+            records, elapsed = run_level(base_url, mix, concurrency, args.duration,
+                                         not args.no_gemini, args.timeout, args.seed)
+            summary = summarize(records, elapsed, concurrency)
+            report['levels'].append(summary)
+            print_level(summary)
+
+        # Counters of whichever worker answers these
+        report['server_stats'] = fetch_json(f"{base_url}/stats")
+    finally:
+        stop_server(process)
+        if process is not None and args.cache == 'sqlite':
+            for suffix in ('', '-wal', '-shm'):
+                path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                    f'load_test_cache_{port}.sqlite3{suffix}')
+                if os.path.exists(path):
+                    os.remove(path)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n💾 Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
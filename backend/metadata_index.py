@@ -0,0 +1,184 @@
+"""
+Metadata Group Index and Entity Extraction
+Pre-built value -> row id postings for the categorical metadata fields, and
+an extractor that finds known states, districts, crops, seasons and years
+in a question
+"""
+
+import re
+import numpy as np
+
+INDEXED_FIELDS = ('source', 'state', 'district', 'crop', 'season', 'year', 'soil_type', 'subdistrict')
+
+# When one phrase names values of several fields, the first field wins
+ENTITY_FIELDS = ('state', 'crop', 'season', 'soil_type', 'district', 'year')
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize_tokens(text):
+    """Lower-cased word tokens, the unit entity phrases are matched on"""
+    return tuple(TOKEN_RE.findall(str(text).lower()))
+
+
+class MetadataIndex:
+    def __init__(self, metadata, fields=INDEXED_FIELDS, exclude=None):
+        """Group the rows of a ColumnarMetadata store by every indexed field
+
+        Args:
+            exclude: optional row ids left out of every group (e.g. deleted rows)
+        """
+        self.metadata = metadata
+        self.n_rows = len(metadata)
+        self.values = {}
+        self._lookup = {}
+        self._order = {}
+        self._offsets = {}
+
+        for field in fields:
+            if field not in metadata.columns:
+                continue
+
+            present = metadata.source_mask(field)
+            if exclude is not None and len(exclude):
+                present[exclude] = False
+            rows = np.flatnonzero(present)
+            column = np.asarray(metadata.columns[field])[rows]
+
+            if field in metadata.categories:
+                labels = list(metadata.categories[field])
+                valid = column >= 0
+                rows, codes = rows[valid], column[valid].astype(np.int64)
+            else:
+                unique, codes = np.unique(column, return_inverse=True)
+                labels = [int(v) for v in unique]
+
+            # Stable sort keeps row ids ascending inside every group
+            order = np.argsort(codes, kind='stable')
+            offsets = np.zeros(len(labels) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(codes, minlength=len(labels)), out=offsets[1:])
+
+            self.values[field] = labels
+            self._lookup[field] = {label: i for i, label in enumerate(labels)}
+            self._order[field] = rows[order]
+            self._offsets[field] = offsets
+
+    def rows(self, field, value):
+        """Sorted row ids whose field equals value"""
+        group = self._lookup.get(field, {}).get(value)
+        if group is None:
+            return np.empty(0, dtype=np.int64)
+        offsets = self._offsets[field]
+        return self._order[field][offsets[group]:offsets[group + 1]]
+
+    def count(self, field, value):
+        group = self._lookup.get(field, {}).get(value)
+        if group is None:
+            return 0
+        offsets = self._offsets[field]
+        return int(offsets[group + 1] - offsets[group])
+
+    def contains(self, field, values, ids):
+        """Boolean mask over ids: True where the row's field is one of values"""
+        ids = np.asarray(ids, dtype=np.int64)
+        mask = np.zeros(len(ids), dtype=bool)
+        for value in values:
+            rows = self.rows(field, value)
+            if len(rows):
+                positions = np.minimum(np.searchsorted(rows, ids), len(rows) - 1)
+                mask |= rows[positions] == ids
+        return mask
+
+    def select(self, filters):
+        """Sorted row ids matching every field filter
+
+        Args:
+            filters: field -> list of accepted values (OR within a field,
+                AND across fields)
+
+        Returns:
+            Sorted array of row ids, or None when there are no filters
+        """
+        selections = []
+        for field, values in filters.items():
+            if not values:
+                continue
+            groups = [self.rows(field, value) for value in values]
+            if len(groups) == 1:
+                selections.append(groups[0])
+            else:
+                selections.append(np.unique(np.concatenate(groups)))
+
+        if not selections:
+            return None
+
+        # Intersect from the smallest posting list up; every list is sorted, so
+        # membership is a binary search of the survivors rather than a merge sort
+        selections.sort(key=len)
+        result = selections[0]
+        for rows in selections[1:]:
+            if len(result) == 0:
+                break
+            positions = np.minimum(np.searchsorted(rows, result), len(rows) - 1)
+            result = result[rows[positions] == result]
+        return result
+
+
+class EntityExtractor:
+    def __init__(self, values_by_field, fields=ENTITY_FIELDS):
+        """Build a phrase table from the known values of each field"""
+        self.fields = [f for f in fields if f in values_by_field]
+        priority = {field: i for i, field in enumerate(self.fields)}
+        self.phrases = {}
+
+        for field in self.fields:
+            for value in values_by_field[field]:
+                for alias in self._aliases(value):
+                    matches = self.phrases.setdefault(alias, {})
+                    matches.setdefault(field, [])
+                    if value not in matches[field]:
+                        matches[field].append(value)
+
+        # Keep only the highest-priority field for each phrase
+        for alias, matches in self.phrases.items():
+            best = min(matches, key=priority.get)
+            self.phrases[alias] = (best, matches[best])
+
+        self.max_len = max((len(p) for p in self.phrases), default=0)
+
+    @staticmethod
+    def _aliases(value):
+        """Token phrases that name a value, e.g. 'Arhar/Tur' -> arhar tur, arhar, tur"""
+        if isinstance(value, (int, np.integer)):
+            return {(str(int(value)),)}
+        text = str(value)
+        aliases = {normalize_tokens(text)}
+        aliases.update(normalize_tokens(part) for part in text.split('/'))
+        if '(' in text:
+            aliases.add(normalize_tokens(text.split('(')[0]))
+        return {alias for alias in aliases if alias}
+
+    def extract(self, text):
+        """Return field -> list of values mentioned in text
+
+        Matching is greedy longest-phrase-first on word boundaries, so
+        'hi' never matches inside 'Chhattisgarh'.
+        """
+        return self.extract_tokens(normalize_tokens(text))
+
+    def extract_tokens(self, tokens):
+        """extract() for text already split by normalize_tokens"""
+        entities = {}
+        i = 0
+        while i < len(tokens):
+            for length in range(min(self.max_len, len(tokens) - i), 0, -1):
+                match = self.phrases.get(tokens[i:i + length])
+                if match:
+                    field, values = match
+                    found = entities.setdefault(field, [])
+                    found.extend(v for v in values if v not in found)
+                    i += length
+                    break
+            else:
+                i += 1
+        return entities
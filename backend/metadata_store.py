@@ -0,0 +1,323 @@
+"""
+Columnar Metadata Store
+Keeps chunk metadata as one NumPy array per field instead of one dict per chunk
+
+String fields (source, state, district, crop, season, soil_type, ...) are
+dictionary-encoded into small integer codes, numeric fields are stored as
+int32 / float32 columns whenever that is lossless. Rows are exposed through
+MetadataRow, a lazy read-only view that behaves like the old metadata dict.
+"""
+
+from collections.abc import Mapping
+import numpy as np
+
+MAX_DECIMALS = 6
+
+
+def _code_dtype(n_values):
+    """Smallest signed integer dtype that can hold the codes plus -1 for missing"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_values < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _int_dtype(values):
+    """int32 when every value fits, otherwise int64"""
+    if len(values) == 0:
+        return np.int32
+    info = np.iinfo(np.int32)
+    if info.min <= min(values) and max(values) <= info.max:
+        return np.int32
+    return np.int64
+
+
+def _narrow_floats(column):
+    """Return (column, decimals), using float32 when it round-trips exactly
+
+    The source CSVs carry a fixed number of decimals, so a float32 value
+    rounded back to that many decimals reproduces the original float64.
+    """
+    finite = column[np.isfinite(column)]
+    for decimals in range(MAX_DECIMALS + 1):
+        if np.array_equal(np.round(finite, decimals), finite):
+            narrow = finite.astype(np.float32).astype(np.float64)
+            if np.array_equal(np.round(narrow, decimals), finite):
+                return column.astype(np.float32), decimals
+            break
+    return column, None
+
+
+class MetadataRow(Mapping):
+    """Read-only dict-like view of one chunk's metadata"""
+
+    __slots__ = ('_store', '_idx')
+
+    def __init__(self, store, idx):
+        self._store = store
+        self._idx = idx
+
+    def __getitem__(self, field):
+        if field not in self._store.field_set(self._idx):
+            raise KeyError(field)
+        return self._store.value(field, self._idx)
+
+    def __iter__(self):
+        return iter(self._store.fields(self._idx))
+
+    def __len__(self):
+        return len(self._store.fields(self._idx))
+
+    def __contains__(self, field):
+        return field in self._store.field_set(self._idx)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ColumnarMetadata:
+    def __init__(self, columns, categories, schemas, decimals=None):
+        """
+        Args:
+            columns: field name -> NumPy array with one entry per chunk
+            categories: field name -> list of values for dictionary-encoded fields
+            schemas: source name -> ordered list of fields present for that source
+            decimals: field name -> decimals to round float32 columns back to
+        """
+        self.columns = columns
+        self.categories = categories
+        self.schemas = schemas
+        self.decimals = decimals or {}
+        self._source_codes = columns['source']
+        self._schema_by_code = [schemas[value] for value in categories['source']]
+        self._field_sets = [frozenset(fields) for fields in self._schema_by_code]
+        self._decoders = {field: self._decoder(field) for field in columns}
+        self._numeric = {}
+
+    @classmethod
+    def from_records(cls, records):
+        """Build the store from the list-of-dicts metadata format"""
+        schemas = {}
+        for record in records:
+            schemas.setdefault(record['source'], list(record.keys()))
+
+        fields = []
+        for keys in schemas.values():
+            fields.extend(k for k in keys if k not in fields)
+
+        columns = {}
+        for field in fields:
+            # Fields missing from a record's schema are stored as None and never read back
+            columns[field] = [record.get(field) for record in records]
+
+        return cls.from_columns(columns, schemas)
+
+    @classmethod
+    def from_column_sets(cls, column_sets):
+        """Build the store from per-source column dicts, concatenated in order
+
+        Each dict maps field -> equal-length list of values and holds the rows
+        of one source, e.g. the output of create_crop_chunks.
+        """
+        column_sets = [columns for columns in column_sets if len(columns['source'])]
+        schemas = {}
+        fields = []
+        for columns in column_sets:
+            schemas.setdefault(columns['source'][0], list(columns))
+            fields.extend(f for f in columns if f not in fields)
+
+        merged = {}
+        for field in fields:
+            values = []
+            for columns in column_sets:
+                column = columns.get(field)
+                if column is None:
+                    values.extend([None] * len(columns['source']))
+                else:
+                    values.extend(column.tolist() if isinstance(column, np.ndarray) else column)
+            merged[field] = values
+
+        return cls.from_columns(merged, schemas)
+
+    @classmethod
+    def from_columns(cls, columns, schemas):
+        """Build the store from field name -> list/array of Python values"""
+        encoded = {}
+        categories = {}
+        decimals = {}
+
+        for field, values in columns.items():
+            if isinstance(values, np.ndarray) and values.dtype.kind in 'iuf':
+                values = values.tolist()
+            present = [v for v in values if v is not None]
+
+            if all(isinstance(v, str) for v in present):
+                vocab = sorted(set(present))
+                lookup = {v: i for i, v in enumerate(vocab)}
+                encoded[field] = np.array([lookup.get(v, -1) for v in values],
+                                          dtype=_code_dtype(len(vocab)))
+                categories[field] = vocab
+            elif all(isinstance(v, (int, np.integer)) and not isinstance(v, bool) for v in present):
+                encoded[field] = np.array([0 if v is None else v for v in values],
+                                          dtype=_int_dtype(present))
+            else:
+                column = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+                encoded[field], places = _narrow_floats(column)
+                if places is not None:
+                    decimals[field] = places
+
+        return cls(encoded, categories, schemas, decimals)
+
+    @classmethod
+    def concat(cls, stores):
+        """Stack several stores row-wise, merging their category vocabularies"""
+        if len(stores) == 1:
+            return stores[0]
+
+        schemas = {}
+        fields = []
+        for store in stores:
+            for source, keys in store.schemas.items():
+                schemas.setdefault(source, keys)
+            fields.extend(f for f in store.columns if f not in fields)
+
+        columns = {}
+        categories = {}
+        decimals = {}
+        for field in fields:
+            # A column with no values at all (e.g. every nutrient missing) says nothing about its type
+            holders = [store for store in stores if field in store.columns
+                       and store.categories.get(field, True)]
+            if not holders:
+                holders = [store for store in stores if field in store.columns]
+
+            if any(field in store.categories for store in holders):
+                vocab = sorted(set().union(*(store.categories.get(field, []) for store in holders)))
+                lookup = {value: i for i, value in enumerate(vocab)}
+                dtype = _code_dtype(len(vocab))
+                parts = []
+                for store in stores:
+                    if store not in holders:
+                        parts.append(np.full(len(store), -1, dtype=dtype))
+                        continue
+                    # Trailing -1 so missing codes (-1) stay missing after remapping
+                    remap = np.array([lookup[v] for v in store.categories[field]] + [-1], dtype=dtype)
+                    parts.append(remap[np.asarray(store.columns[field])])
+                columns[field] = np.concatenate(parts)
+                categories[field] = vocab
+                continue
+
+            kinds = {np.asarray(store.columns[field]).dtype.kind for store in holders}
+            if kinds <= set('iu'):
+                parts = [np.asarray(store.columns[field], dtype=np.int64) if store in holders
+                         else np.zeros(len(store), dtype=np.int64) for store in stores]
+                merged = np.concatenate(parts)
+                columns[field] = merged.astype(_int_dtype([merged.min(), merged.max()] if len(merged) else []))
+                continue
+
+            places = {store.decimals.get(field) for store in holders}
+            if len(places) == 1 and None not in places:
+                parts = [np.asarray(store.columns[field], dtype=np.float32) if store in holders
+                         else np.full(len(store), np.nan, dtype=np.float32) for store in stores]
+                decimals[field] = places.pop()
+            else:
+                parts = [store.numeric(field) if store in holders
+                         else np.full(len(store), np.nan) for store in stores]
+            columns[field] = np.concatenate(parts)
+
+        return cls(columns, categories, schemas, decimals)
+
+    def take(self, rows):
+        """New store holding only the given rows, with unused category values dropped"""
+        rows = np.asarray(rows, dtype=np.int64)
+        columns = {}
+        categories = {}
+        for field, column in self.columns.items():
+            column = np.asarray(column)[rows]
+            if field in self.categories:
+                used = np.unique(column[column >= 0])
+                remap = np.full(len(self.categories[field]) + 1, -1, dtype=np.int64)
+                remap[used] = np.arange(len(used))
+                column = remap[column].astype(_code_dtype(len(used)))
+                categories[field] = [self.categories[field][code] for code in used]
+            columns[field] = column
+        return self.__class__(columns, categories, self.schemas, self.decimals)
+
+    def __reduce__(self):
+        # Decoders are closures; pickle only the columns and rebuild them
+        return (self.__class__, (self.columns, self.categories, self.schemas, self.decimals))
+
+    @property
+    def nbytes(self):
+        """Bytes held by the NumPy columns"""
+        return sum(column.nbytes for column in self.columns.values())
+
+    def __len__(self):
+        return len(self._source_codes)
+
+    def __getitem__(self, idx):
+        """Lazy dict-like view of one chunk's metadata"""
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("metadata index out of range")
+        return MetadataRow(self, idx)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield MetadataRow(self, idx)
+
+    def fields(self, idx):
+        """Ordered field names present for the chunk at idx"""
+        return self._schema_by_code[self._source_codes[idx]]
+
+    def field_set(self, idx):
+        return self._field_sets[self._source_codes[idx]]
+
+    def value(self, field, idx):
+        """Python value of a single field, decoded like the original dicts"""
+        return self._decoders[field](idx)
+
+    def _decoder(self, field):
+        """Build a fast idx -> Python value function for one column"""
+        column = self.columns[field]
+
+        if field in self.categories:
+            values = self.categories[field]
+            return lambda idx: values[column[idx]] if column[idx] >= 0 else None
+
+        if column.dtype.kind in 'iu':
+            return lambda idx: int(column[idx])
+
+        if field in self.decimals:
+            # Same arithmetic as np.round: rint(x * 10**d) / 10**d
+            scale = 10.0 ** self.decimals[field]
+
+            def decode(idx):
+                raw = float(column[idx])
+                return None if raw != raw else round(raw * scale) / scale
+            return decode
+
+        def decode(idx):
+            raw = float(column[idx])
+            return None if raw != raw else raw
+        return decode
+
+    def numeric(self, field):
+        """Whole column as float64 with the original values (NaN for None)"""
+        if field not in self._numeric:
+            column = np.asarray(self.columns[field], dtype=np.float64)
+            if field in self.decimals:
+                column = np.round(column, self.decimals[field])
+            self._numeric[field] = column
+        return self._numeric[field]
+
+    def source_mask(self, field):
+        """Boolean mask of the rows whose source schema contains field"""
+        codes = [code for code, fields in enumerate(self._field_sets) if field in fields]
+        return np.isin(self._source_codes, codes)
+
+    def to_records(self):
+        """Materialize the old list-of-dicts representation"""
+        return [dict(row) for row in self]
@@ -0,0 +1,229 @@
+"""
+Latency Metrics
+Per-stage latency histograms and event counters for the API, rendered in the
+Prometheus text exposition format for /metrics
+
+Metrics are kept per process, so with several gunicorn workers every
+scrape sees the worker that served it; add the instance/pid label on the
+scraping side or run one worker per scrape target. When disabled, timer()
+returns a shared no-op object and observe()/inc() return at once.
+"""
+
+import bisect
+import os
+import threading
+import time
+
+# Upper bounds of the histogram buckets in seconds, 0.1 ms to 60 s
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as a Prometheus histogram"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        # One count per bucket, the last one for values above every bound (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate interpolated inside the bucket holding the q-th observation
+
+        Same estimate as PromQL's histogram_quantile(); values beyond the last
+        bucket are reported as its bound.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / n
+            cumulative += n
+        return self.buckets[-1]
+
+
+class Timer:
+    """Context manager observing the seconds spent in its block"""
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Metrics:
+    def __init__(self, enabled=True, namespace='saarthi'):
+        """
+        Args:
+            enabled: False turns every call into a no-op
+            namespace: prefix of every exported metric name
+        """
+        self.enabled = enabled
+        self.namespace = namespace
+        self.started = time.time()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def describe(self, name, help_text):
+        """HELP line for a metric"""
+        self._help[name] = help_text
+
+    def observe(self, name, seconds, **labels):
+        """Record one duration in the histogram name{labels}"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_ms(self, name, milliseconds, **labels):
+        self.observe(name, milliseconds / 1000.0, **labels)
+
+    def inc(self, name, amount=1, **labels):
+        """Add amount to the counter name{labels}"""
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def timer(self, name, **labels):
+        """with metrics.timer('stage_duration_seconds', stage='gemini'): ..."""
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self, name, labels)
+
+    def summary(self):
+        """p50/p95/p99 in milliseconds and counts per histogram, plus the counters"""
+        with self._lock:
+            histograms = {}
+            for (name, labels), h in sorted(self._histograms.items()):
+                histograms.setdefault(name, {})[label_text(labels)] = dict(
+                    count=h.count,
+                    mean_ms=round(h.sum / h.count * 1000, 3) if h.count else None,
+                    **{f"p{int(q * 100)}_ms": round(h.quantile(q) * 1000, 3) if h.count else None
+                       for q in QUANTILES}
+                )
+            counters = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                counters.setdefault(name, {})[label_text(labels)] = value
+        return {'enabled': self.enabled, 'histograms': histograms, 'counters': counters}
+
+    def render(self, gauges=()):
+        """Text exposition format (version 0.0.4)
+
+        Args:
+            gauges: extra (name, value, labels dict) samples read at scrape time,
+                e.g. cache sizes
+        """
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            histograms = [(key, list(h.counts), h.sum, h.count,
+                           [h.quantile(q) for q in QUANTILES]) for key, h in histograms]
+
+        seen = set()
+        for (name, labels), counts, total, count, quantiles in histograms:
+            self._header(lines, seen, name, 'histogram')
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ('+Inf',), counts):
+                cumulative += n
+                le = bound if bound == '+Inf' else format_value(bound)
+                lines.append(f"{self._series(name + '_bucket', labels + (('le', le),))} {cumulative}")
+            lines.append(f"{self._series(name + '_sum', labels)} {format_value(total)}")
+            lines.append(f"{self._series(name + '_count', labels)} {count}")
+        # Quantile estimates as gauges, for dashboards without histogram_quantile()
+        for (name, labels), _, _, count, quantiles in histograms:
+            if not count:
+                continue
+            self._header(lines, seen, name + '_quantile', 'gauge')
+            for q, value in zip(QUANTILES, quantiles):
+                lines.append(f"{self._series(name + '_quantile', labels + (('quantile', str(q)),))} "
+                             f"{format_value(value)}")
+        for (name, labels), value in counters:
+            self._header(lines, seen, name, 'counter')
+            lines.append(f"{self._series(name, labels)} {format_value(value)}")
+        # Samples of one metric must be adjacent
+        for name, value, labels in sorted(gauges, key=lambda gauge: gauge[0]):
+            if value is None:
+                continue
+            self._header(lines, seen, name, 'gauge')
+            lines.append(f"{self._series(name, tuple(sorted(labels.items())))} {format_value(value)}")
+        self._header(lines, seen, 'process_start_time_seconds', 'gauge')
+        lines.append(f"{self.namespace}_process_start_time_seconds {format_value(self.started)}")
+        return '\n'.join(lines) + '\n'
+
+    def _header(self, lines, seen, name, kind):
+        if name in seen:
+            return
+        seen.add(name)
+        if name in self._help:
+            lines.append(f"# HELP {self.namespace}_{name} {self._help[name]}")
+        lines.append(f"# TYPE {self.namespace}_{name} {kind}")
+
+    def _series(self, name, labels):
+        if not labels:
+            return f"{self.namespace}_{name}"
+        pairs = ','.join(f'{key}="{escape_label(value)}"' for key, value in labels)
+        return f"{self.namespace}_{name}{{{pairs}}}"
+
+
+def format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def label_text(labels):
+    """'stage=vectorize' style key for summary(); 'all' without labels"""
+    return ','.join(f"{key}={value}" for key, value in labels) or 'all'
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def create_metrics():
+    """Metrics configured from the METRICS environment variable ('0' disables)"""
+    enabled = os.environ.get('METRICS', '1').lower() not in ('0', 'off', 'false', 'no')
+    return Metrics(enabled=enabled)
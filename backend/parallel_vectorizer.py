@@ -0,0 +1,227 @@
+"""
+Parallel TF-IDF Fitting
+Fits the chunk vectorizer across a process pool over corpus shards
+
+Two modes:
+- fit_tfidf_parallel: each worker counts n-grams of one shard, the parent
+  merges document/term frequencies and applies the same min_df / max_df /
+  max_features pruning as TfidfVectorizer, then workers transform their
+  shards with the final vocabulary.
+- fit_hashing_tfidf: a stateless HashingVectorizer plus IDF, so no
+  vocabulary is ever held in memory.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from numbers import Integral
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+# Analyzer settings shared by every vectorizer variant
+ANALYZER_PARAMS = ('lowercase', 'strip_accents', 'analyzer', 'token_pattern', 'ngram_range')
+
+DEFAULT_HASH_FEATURES = 2 ** 20
+
+
+class HashingTfidfVectorizer:
+    """TF-IDF on top of a stateless HashingVectorizer
+
+    Features whose document frequency falls outside [min_df, max_df] get
+    an IDF of zero, which drops them from every vector.
+    """
+
+    def __init__(self, n_features=DEFAULT_HASH_FEATURES, ngram_range=(1, 3), lowercase=True,
+                 strip_accents='unicode', analyzer='word', token_pattern=r'\b\w+\b',
+                 sublinear_tf=True, smooth_idf=True, norm='l2', idf=None):
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.lowercase = lowercase
+        self.strip_accents = strip_accents
+        self.analyzer = analyzer
+        self.token_pattern = token_pattern
+        self.sublinear_tf = sublinear_tf
+        self.smooth_idf = smooth_idf
+        self.norm = norm
+        self.idf_ = idf
+        self._build()
+
+    def _build(self):
+        self.hasher = HashingVectorizer(
+            n_features=self.n_features, ngram_range=self.ngram_range, lowercase=self.lowercase,
+            strip_accents=self.strip_accents, analyzer=self.analyzer,
+            token_pattern=self.token_pattern, alternate_sign=False, norm=None
+        )
+
+    def get_params(self):
+        return {
+            'n_features': self.n_features, 'ngram_range': list(self.ngram_range),
+            'lowercase': self.lowercase, 'strip_accents': self.strip_accents,
+            'analyzer': self.analyzer, 'token_pattern': self.token_pattern,
+            'sublinear_tf': self.sublinear_tf, 'smooth_idf': self.smooth_idf, 'norm': self.norm,
+        }
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('hasher', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build()
+
+    def counts(self, documents):
+        """Raw term counts in hashed feature space"""
+        return self.hasher.transform(documents)
+
+    def weight(self, counts):
+        """Apply TF scaling, IDF and normalization to hashed counts"""
+        X = sparse.csr_matrix(counts, dtype=np.float64, copy=True)
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1
+        X = sparse.csr_matrix(X @ sparse.diags(self.idf_))
+        X.eliminate_zeros()
+        if self.norm:
+            X = normalize(X, norm=self.norm, copy=False)
+        return X
+
+    def transform(self, documents):
+        """TF-IDF vectors for documents, same weighting as TfidfVectorizer"""
+        return self.weight(self.counts(documents))
+
+
+def _shards(chunks, n_shards):
+    """Split chunks into at most n_shards non-empty contiguous lists"""
+    bounds = np.linspace(0, len(chunks), n_shards + 1).astype(int)
+    shards = [chunks[bounds[i]:bounds[i + 1]] for i in range(n_shards)]
+    return [shard for shard in shards if len(shard)]
+
+
+def _count_shard(args):
+    """Worker: (terms, document frequencies, term frequencies) of one shard"""
+    params, shard = args
+    counter = CountVectorizer(**{k: params[k] for k in ANALYZER_PARAMS}, dtype=np.int64)
+    X = counter.fit_transform(shard)
+    terms = counter.get_feature_names_out()
+    df = np.bincount(X.indices, minlength=X.shape[1])
+    tf = np.asarray(X.sum(axis=0)).ravel()
+    return terms, df, tf
+
+
+def _transform_shard(args):
+    """Worker: transform one shard with an already fitted vectorizer"""
+    vectorizer, shard = args
+    return vectorizer.transform(shard)
+
+
+def _hash_shard(args):
+    """Worker: hashed counts and per-feature document frequencies of one shard"""
+    vectorizer, shard = args
+    X = sparse.csr_matrix(vectorizer.counts(shard))
+    df = np.bincount(X.indices, minlength=vectorizer.n_features)
+    return X, df
+
+
+def _run(worker, tasks, n_jobs):
+    if n_jobs == 1:
+        return [worker(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        return list(pool.map(worker, tasks))
+
+
+def _doc_count_limits(min_df, max_df, n_docs):
+    """min/max document counts the way CountVectorizer interprets min_df/max_df"""
+    max_doc_count = max_df if isinstance(max_df, Integral) else max_df * n_docs
+    min_doc_count = min_df if isinstance(min_df, Integral) else min_df * n_docs
+    return min_doc_count, max_doc_count
+
+
+def fit_tfidf_parallel(chunks, params, n_jobs=None, n_shards=None):
+    """Fit a TfidfVectorizer over shards of chunks in a process pool
+
+    Args:
+        chunks: list of chunk texts
+        params: TfidfVectorizer constructor params
+        n_jobs: worker processes (default: CPU count)
+        n_shards: corpus shards (default: 2 per worker)
+
+    Returns:
+        (vectorizer, embeddings) equivalent to TfidfVectorizer(**params).fit_transform(chunks),
+        except that max_features ties are broken alphabetically
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    n_shards = n_shards or max(n_jobs * 2, 1)
+    shards = _shards(chunks, n_shards)
+    n_shards = len(shards)
+
+    print(f"   Counting n-grams over {n_shards} shards with {n_jobs} workers...")
+    counts = _run(_count_shard, [(params, shard) for shard in shards], n_jobs)
+
+    # Merge per-shard frequencies; only the (term, df, tf) table is kept, not the count matrix
+    table = pd.concat(
+        [pd.DataFrame({'term': terms, 'df': df, 'tf': tf}) for terms, df, tf in counts],
+        ignore_index=True
+    ).groupby('term', sort=True).sum()
+    del counts
+
+    min_doc_count, max_doc_count = _doc_count_limits(params['min_df'], params['max_df'], len(chunks))
+    table = table[(table['df'] >= min_doc_count) & (table['df'] <= max_doc_count)]
+
+    if params.get('max_features') is not None and len(table) > params['max_features']:
+        table = table.reset_index().sort_values(['tf', 'term'], ascending=[False, True], kind='stable')
+        table = table.head(params['max_features']).set_index('term').sort_index()
+
+    vocabulary = {term: i for i, term in enumerate(table.index)}
+    df = table['df'].to_numpy(dtype=np.int64)
+    n_docs = len(chunks)
+    if params.get('smooth_idf', True):
+        df = df + 1
+        n_docs += 1
+    idf = np.log(n_docs / df) + 1
+
+    vectorizer = TfidfVectorizer(**params)
+    vectorizer.vocabulary_ = vocabulary
+    vectorizer.idf_ = idf
+
+    print(f"   Transforming {n_shards} shards...")
+    parts = _run(_transform_shard, [(vectorizer, shard) for shard in shards], n_jobs)
+    return vectorizer, sparse.vstack(parts, format='csr')
+
+
+def fit_hashing_tfidf(chunks, params, n_features=DEFAULT_HASH_FEATURES, n_jobs=None, n_shards=None):
+    """Fit a HashingTfidfVectorizer over shards of chunks in a process pool
+
+    Only per-feature document frequencies are merged, so memory does not
+    grow with the n-gram vocabulary.
+    """
+    n_jobs = n_jobs or os.cpu_count() or 1
+    n_shards = n_shards or max(n_jobs * 2, 1)
+    shards = _shards(chunks, n_shards)
+    n_shards = len(shards)
+
+    vectorizer = HashingTfidfVectorizer(
+        n_features=n_features, **{k: params[k] for k in ANALYZER_PARAMS},
+        sublinear_tf=params.get('sublinear_tf', False), smooth_idf=params.get('smooth_idf', True),
+        norm=params.get('norm', 'l2')
+    )
+
+    print(f"   Hashing n-grams into {n_features:,} features over {n_shards} shards with {n_jobs} workers...")
+    results = _run(_hash_shard, [(vectorizer, shard) for shard in shards], n_jobs)
+    df = np.sum([shard_df for _, shard_df in results], axis=0)
+
+    n_docs = len(chunks)
+    min_doc_count, max_doc_count = _doc_count_limits(params['min_df'], params['max_df'], n_docs)
+    smooth = int(vectorizer.smooth_idf)
+    idf = np.log((n_docs + smooth) / (df + smooth)) + 1
+    idf[(df < min_doc_count) | (df > max_doc_count)] = 0.0
+    vectorizer.idf_ = idf
+
+    # Weight the already hashed counts instead of re-tokenizing
+    X = vectorizer.weight(sparse.vstack([counts for counts, _ in results], format='csr'))
+
+    print(f"   Active hashed features: {int(np.count_nonzero(idf)):,}")
+    return vectorizer, X
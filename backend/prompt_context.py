@@ -0,0 +1,141 @@
+"""
+Prompt Context Builder
+Renders the retrieved sources for a Gemini prompt as compact tables within a
+token budget
+
+Every chunk is generated from its metadata, so the metadata alone carries
+the facts: sources are grouped per dataset into one table each; values
+shared by every row of a table (e.g. the state and crop the question names)
+are stated once above it; repeated records are dropped. Sources are added
+in relevance order for as long as the estimated token count fits the
+budget.
+"""
+
+import math
+
+# Rendered names of the metadata fields, in column order
+FIELD_LABELS = {
+    'state': 'state',
+    'district': 'district',
+    'subdistrict': 'subdistrict',
+    'year': 'year',
+    'season': 'season',
+    'crop': 'crop',
+    'area': 'area (ha)',
+    'production': 'production (t)',
+    'soil_type': 'soil type',
+    'pH': 'pH',
+    'organic_carbon': 'organic carbon (%)',
+    'nitrogen': 'N (kg/ha)',
+    'phosphorus': 'P (kg/ha)',
+    'potassium': 'K (kg/ha)',
+}
+DATASET_TITLES = {
+    'crop_production': 'Crop production records',
+    'soil_health': 'Soil health records',
+}
+# Bookkeeping fields that carry no facts for the answer
+SKIPPED_FIELDS = ('source', 'record_id')
+
+
+def estimate_tokens(text):
+    """Rough Gemini token count: about 4 characters per token for English text"""
+    return math.ceil(len(text) / 4)
+
+
+def format_value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return '-'
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip('0').rstrip('.')
+    return str(value)
+
+
+def record_key(source):
+    """Identity of the facts in a source, for dropping repeated records"""
+    details = source.get('details')
+    if not details:
+        return ('chunk', source.get('chunk'))
+    return tuple((field, details[field]) for field in sorted(details) if field not in SKIPPED_FIELDS)
+
+
+def render_table(dataset, sources):
+    """One dataset's sources as a header of shared values and a pipe-separated table"""
+    rows = [source.get('details') or {} for source in sources]
+    fields = [field for field in FIELD_LABELS if any(field in row for row in rows)]
+    fields += sorted({field for row in rows for field in row} - set(fields) - set(SKIPPED_FIELDS))
+
+    shared = [field for field in fields
+              if len(rows) > 1 and len({format_value(row.get(field)) for row in rows}) == 1]
+    columns = [field for field in fields if field not in shared]
+
+    title = DATASET_TITLES.get(dataset, dataset)
+    lines = []
+    if shared:
+        common = ', '.join(f"{FIELD_LABELS.get(field, field)} {format_value(rows[0].get(field))}"
+                           for field in shared)
+        lines.append(f"{title} (all rows: {common}):")
+    else:
+        lines.append(f"{title}:")
+    lines.append(' | '.join([FIELD_LABELS.get(field, field) for field in columns] + ['relevance']))
+    for source, row in zip(sources, rows):
+        if not row:
+            # No metadata: fall back to the chunk text
+            lines.append(f"{source.get('chunk', '')} | {source.get('relevance', '')}")
+            continue
+        lines.append(' | '.join([format_value(row.get(field)) for field in columns]
+                                + [str(source.get('relevance', ''))]))
+    return '\n'.join(lines)
+
+
+def render_sources(sources):
+    by_dataset = {}
+    for source in sources:
+        by_dataset.setdefault(source.get('dataset'), []).append(source)
+    return '\n\n'.join(render_table(dataset, group) for dataset, group in by_dataset.items())
+
+
+def build_context(retrieved_data, token_budget=600):
+    """Retrieved-data section of a Gemini prompt
+
+    Args:
+        retrieved_data: answer_question result (sources, optional aggregation)
+        token_budget: estimated tokens the section may use; the most
+            relevant source is always included
+
+    Returns:
+        (text, info) where info counts the tokens and the sources used,
+        left out for the budget and dropped as repeats
+    """
+    parts = []
+    if retrieved_data.get('aggregation'):
+        # Statistics computed over the full dataset take precedence over single records
+        parts.append(f"Computed from the full dataset: {retrieved_data['aggregation']['answer']}")
+        if retrieved_data['aggregation'].get('facts'):
+            parts[-1] += '\n' + '\n'.join(retrieved_data['aggregation']['facts'])
+
+    seen = set()
+    unique = []
+    for source in retrieved_data.get('sources', []):
+        key = record_key(source)
+        if key not in seen:
+            seen.add(key)
+            unique.append(source)
+
+    chosen = []
+    text = '\n\n'.join(parts)
+    for source in unique:
+        candidate = '\n\n'.join(parts + [render_sources(chosen + [source])])
+        if chosen and estimate_tokens(candidate) > token_budget:
+            break
+        chosen.append(source)
+        text = candidate
+
+    info = {
+        'tokens': estimate_tokens(text),
+        'sources': len(retrieved_data.get('sources', [])),
+        'sources_used': len(chosen),
+        'duplicates': len(retrieved_data.get('sources', [])) - len(unique),
+        'over_budget': len(unique) - len(chosen),
+    }
+    return text, info
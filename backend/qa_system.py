@@ -4,20 +4,44 @@ Retrieves relevant information from multiple data sources and combines them
 """
 
 import pickle
+import time
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import pandas as pd
 import os
+import config
+from sparse_search import SparseSearchIndex
+from dense_search import DENSE_METHOD
+from hybrid_search import HybridRetriever
+from query_memo import QueryMemo
+from vector_store import is_vector_store
+from incremental_index import load_collection
+from metadata_store import ColumnarMetadata
+from metadata_index import MetadataIndex, EntityExtractor
+from aggregation import AggregationEngine
+from ranking import RankingEngine
+from rollups import RollupTables
+from soil_index import SoilIndex
+from intent_router import IntentRouter, OPEN_INTENTS
 
 class IntelligentQASystem:
-    def __init__(self, vector_db_path='vector_database.pkl'):
-        """Initialize the Q&A system"""
+    def __init__(self, vector_db_path='vector_database.pkl', memo=None):
+        """Initialize the Q&A system
+        
+        Args:
+            memo: QueryMemo to use, e.g. one shared by reloaded instances;
+                a private one sized from config by default
+        """
         # Get the directory where this file is located
         current_dir = os.path.dirname(os.path.abspath(__file__))
         
         # Try to find vector database in current directory first
         full_path = os.path.join(current_dir, vector_db_path)
         
+        # Prefer the memory-mapped format (e.g. vector_database/) when it exists
+        mmap_path = os.path.splitext(full_path)[0]
+        if not is_vector_store(full_path) and is_vector_store(mmap_path):
+            full_path = mmap_path
+        
         if not os.path.exists(full_path):
             # Try Model directory in parent
             parent_dir = os.path.dirname(os.path.dirname(current_dir))
@@ -29,52 +53,243 @@ class IntelligentQASystem:
                 raise FileNotFoundError(f"Vector database not found at {full_path}")
         
         print(f"Loading vector database from {full_path}...")
-        with open(full_path, 'rb') as f:
-            self.vector_db = pickle.load(f)
+        self.db_path = full_path
+        if is_vector_store(full_path):
+            # Memory-mapped arrays are shared between worker processes;
+            # delta segments from incremental ingests are searched too
+            self.vector_db = load_collection(full_path)
+        else:
+            with open(full_path, 'rb') as f:
+                self.vector_db = pickle.load(f)
         
         self.embeddings = self.vector_db['embeddings']
         self.chunks = self.vector_db['chunks']
+        if isinstance(self.vector_db['metadata'], list):
+            # Legacy pickles hold one dict per chunk; keep columns instead
+            self.vector_db['metadata'] = ColumnarMetadata.from_records(self.vector_db['metadata'])
         self.metadata = self.vector_db['metadata']
         self.vectorizer = self.vector_db['vectorizer']
         
+        # Identifies the loaded data, e.g. for caches shared between workers
+        self.db_version = '|'.join(str(self.vector_db.get(key)) for key in
+                                   ('version', 'trained_date', 'updated_date', 'segments'))
+        
+        # Inverted index so a query only scores chunks that share its terms
+        self.sparse_index = self.vector_db.get('search_index') or SparseSearchIndex(self.embeddings)
+        
+        # The database's method picks the retrieval engine
+        if self.vector_db['method'] == DENSE_METHOD:
+            self.search_index = self.vector_db['dense_index']
+        else:
+            self.search_index = self.sparse_index
+        
+        # Group indexes over the metadata for full-dataset aggregates
+        self.metadata_index = MetadataIndex(self.metadata, exclude=self.vector_db.get('deleted'))
+        self.entity_extractor = EntityExtractor(self.metadata_index.values)
+        self.aggregation = AggregationEngine(self.metadata, self.metadata_index)
+        # Per-group crop sums for rankings and trends (built here for databases trained without them)
+        self.rollups = self.vector_db.get('rollups')
+        if self.rollups is None:
+            self.rollups = RollupTables.build(self.metadata, exclude=self.vector_db.get('deleted'))
+        self.ranking = RankingEngine(self.metadata, self.metadata_index, self.rollups)
+        # Value-sorted soil nutrients for range questions and region summaries
+        self.soil_index = SoilIndex(self.metadata, self.metadata_index)
+        # Greeting / lookup / aggregate / comparison / out-of-domain, once per question
+        self.router = IntentRouter(self.entity_extractor)
+        
+        # Sparse (+ dense) candidates, fused and re-ranked on metadata matches
+        self.retriever = None
+        if config.HYBRID_RETRIEVAL:
+            self.retriever = HybridRetriever(
+                self.sparse_index, self.vector_db.get('dense_index'), self.metadata_index,
+                n_candidates=config.RETRIEVAL_CANDIDATES, rrf_k=config.RRF_K,
+                budget_ms=config.RETRIEVAL_BUDGET_MS
+            )
+        
+        # Repeated questions skip vectorizing and scoring (entries are per db_version)
+        self.memo = memo if memo is not None else QueryMemo(config.QUERY_MEMO_VECTORS,
+                                                            config.QUERY_MEMO_RESULTS)
+        
         print(f"Loaded {len(self.chunks)} knowledge chunks")
         print(f"Method: {self.vector_db['method']}")
     
-    def search(self, query, top_k=5):
-        """Search for relevant chunks based on query"""
+    @property
+    def retrieval_mode(self):
+        """Pipeline that ranks search results: 'hybrid', 'dense' or 'sparse'"""
+        if self.retriever is not None:
+            return 'hybrid'
+        return 'dense' if self.search_index is not self.sparse_index else 'sparse'
+    
+    def search(self, query, top_k=5, entities=None, timings=None):
+        """Search for relevant chunks based on query
+        
+        Args:
+            timings: optional dict that receives the milliseconds spent in
+                every retrieval stage
+        """
+        if entities is None:
+            entities = self.entity_extractor.extract(query)
+        
+        # A repeated question reuses its ranking from the same pipeline, unless that was cut
+        # short by the budget
+        text = self.memo.normalize(query)
+        mode = self.retrieval_mode
+        started = time.perf_counter()
+        memoized = self.memo.get_results(self.db_version, mode, text, top_k, entities)
+        if memoized is not None:
+            top_indices, top_scores = memoized
+            if timings is not None:
+                timings['stages'] = {'memo': round((time.perf_counter() - started) * 1000, 3)}
+                timings['memo'] = 'results'
+            return self._results(top_indices, top_scores)
+        
         # Vectorize the query
-        query_vector = self.vectorizer.transform([query])
+        query_vector = self.memo.get_vector(self.db_version, text)
+        if query_vector is None:
+            query_vector = self.vectorizer.transform([text])
+            self.memo.set_vector(self.db_version, text, query_vector)
+        elif timings is not None:
+            timings['memo'] = 'vector'
+        vectorize_ms = (time.perf_counter() - started) * 1000
+        
+        # Narrow the candidates to chunks matching the states/crops/years named in the query
+        candidates = self._entity_candidates(query, entities)
         
-        # Compute similarity scores
-        similarities = cosine_similarity(query_vector, self.embeddings).flatten()
+        stage_timings = {} if timings is None else timings
+        if self.retriever is not None:
+            top_indices, top_scores = self.retriever.search(
+                query_vector, top_k=top_k, entities=entities, candidates=candidates,
+                timings=stage_timings, started=started
+            )
+        else:
+            # Score only the chunks sharing a term with the query and keep the top-k
+            start = time.perf_counter()
+            top_indices, top_scores = self.search_index.search(
+                query_vector, top_k=top_k, candidates=candidates
+            )
+            stage_timings['stages'] = {'search': round((time.perf_counter() - start) * 1000, 3)}
+        stage_timings['stages'] = dict(vectorize=round(vectorize_ms, 3), **stage_timings['stages'])
         
-        # Get top-k indices
-        top_indices = np.argsort(similarities)[::-1][:top_k]
+        if not stage_timings.get('skipped'):
+            self.memo.set_results(self.db_version, mode, text, top_k, entities, top_indices, top_scores)
         
+        return self._results(top_indices, top_scores)
+    
+    def query_vector(self, query):
+        """Vectorizer output for a question (memoized per normalized text)"""
+        text = self.memo.normalize(query)
+        query_vector = self.memo.get_vector(self.db_version, text)
+        if query_vector is None:
+            query_vector = self.vectorizer.transform([text])
+            self.memo.set_vector(self.db_version, text, query_vector)
+        return query_vector
+    
+    def _results(self, top_indices, top_scores):
+        """Search result dicts for ranked chunk ids"""
         results = []
-        for idx in top_indices:
+        for idx, score in zip(top_indices, top_scores):
             results.append({
+                'id': int(idx),
                 'chunk': self.chunks[idx],
                 'metadata': self.metadata[idx],
-                'similarity': float(similarities[idx])
+                'similarity': float(score)
             })
         
         return results
     
-    def answer_question(self, question, top_k=10):
-        """Generate an answer with proper citations"""
+    def search_batch(self, queries, top_k=5, entities=None):
+        """Search for many queries at once
+
+        All queries are vectorized in one transform call and scored as one
+        sparse matrix product; returns one result list per query, as search().
+        """
+        if entities is None:
+            entities = [self.entity_extractor.extract(query) for query in queries]
+        query_vectors = self.vectorizer.transform([self.memo.normalize(query) for query in queries])
+        candidates = [self._entity_candidates(query, found) for query, found in zip(queries, entities)]
+        
+        if self.retriever is not None:
+            batch = self.retriever.search_batch(query_vectors, top_k=top_k, entities=entities,
+                                                candidates=candidates)
+        else:
+            batch = self.search_index.search_batch(query_vectors, top_k=top_k, candidates=candidates)
+        
+        return [self._results(top_indices, top_scores) for top_indices, top_scores in batch]
+    
+    def _entity_candidates(self, query, entities=None):
+        """Sorted chunk ids matching every entity in the query, or None to search everything"""
+        if entities is None:
+            entities = self.entity_extractor.extract(query)
+        if not entities:
+            return None
+        
+        candidates = self.metadata_index.select(entities)
+        if candidates is None or len(candidates) == 0:
+            return None
+        return candidates
+    
+    def route(self, question):
+        """IntentRouter result for a question: intent, entities and aggregate operation"""
+        return self.router.route(question)
+    
+    def answer_question(self, question, top_k=10, route=None):
+        """Generate an answer with proper citations
+        
+        Args:
+            route: the question's route() result, if the caller has it already
+        """
+        if route is None:
+            route = self.route(question)
+        
+        # Greetings and out-of-domain questions are not searched
+        if route['intent'] in OPEN_INTENTS:
+            return dict(self._no_data_answer(), intent=route['intent'])
         
         # Search for relevant chunks with more results
-        search_results = self.search(question, top_k=top_k)
+        timings = {}
+        search_results = self.search(question, top_k=top_k, entities=route['entities'], timings=timings)
+        
+        result = self._compose_answer(question, route, search_results)
+        result['retrieval'] = timings
+        return result
+    
+    def answer_questions(self, questions, top_k=10, routes=None):
+        """answer_question for a batch of questions, with one batched search"""
+        if routes is None:
+            routes = [self.route(question) for question in questions]
+        search = [i for i, route in enumerate(routes) if route['intent'] not in OPEN_INTENTS]
+        batch = self.search_batch([questions[i] for i in search], top_k=top_k,
+                                  entities=[routes[i]['entities'] for i in search])
+        
+        results = [dict(self._no_data_answer(), intent=route['intent']) for route in routes]
+        for i, search_results in zip(search, batch):
+            results[i] = self._compose_answer(questions[i], routes[i], search_results)
+        return results
+    
+    def _no_data_answer(self):
+        """Introduction returned when the knowledge base has nothing for a question"""
+        return {
+            'answer': "Hello! I'm **SaarthiAI**, your agriculture assistant. I specialize in answering questions about Indian agriculture, crop production, and soil health data.\n\n📊 I can help you with:\n\n- Crop production statistics by state/district\n- Soil health and nutrient information\n- Agricultural data analysis\n- Specific crop queries\n\n**Try asking:** \"What is rice production in Andhra Pradesh?\" or \"Tell me about soil health in Kerala\"",
+            'sources': [],
+            'confidence': 0,
+            'search_results_count': 0
+        }
+    
+    def _compose_answer(self, question, route, search_results):
+        """Answer with citations from the search results of one routed question"""
+        
+        # Rankings and trends come from the ranking engine (rollup tables where they fit), soil
+        # ranges and region summaries from the soil index; totals/averages/extremes/comparisons
+        # with entity filters are computed over the full dataset
+        aggregate = self.ranking.answer(question, route['entities'], route['intent'])
+        if aggregate is None:
+            aggregate = self.soil_index.answer(question, route['entities'], route['intent'])
+        if aggregate is None:
+            aggregate = self.aggregation.answer(question, route['entities'], route['intent'])
         
         # Lower threshold to accept more results (0.05 instead of 0.1)
-        if not search_results or search_results[0]['similarity'] < 0.05:
-            return {
-                'answer': "Hello! I'm **SaarthiAI**, your agriculture assistant. I specialize in answering questions about Indian agriculture, crop production, and soil health data.\n\n📊 I can help you with:\n\n- Crop production statistics by state/district\n- Soil health and nutrient information\n- Agricultural data analysis\n- Specific crop queries\n\n**Try asking:** \"What is rice production in Andhra Pradesh?\" or \"Tell me about soil health in Kerala\"",
-                'sources': [],
-                'confidence': 0,
-                'search_results_count': 0
-            }
+        if aggregate is None and (not search_results or search_results[0]['similarity'] < 0.05):
+            return dict(self._no_data_answer(), intent=route['intent'])
         
         # Use all results with similarity > 0.1
         relevant_results = [r for r in search_results if r['similarity'] > 0.1]
@@ -82,6 +297,7 @@ class IntelligentQASystem:
         # Analyze the results and generate an answer
         answer_parts = []
         sources = []
+        chunk_ids = []
         
         # Group by source type
         crop_data = []
@@ -99,16 +315,28 @@ class IntelligentQASystem:
             elif result['metadata']['source'] == 'soil_health':
                 soil_data.append(source_info)
             
+            chunk_ids.append(result['id'])
             sources.append({
                 'dataset': result['metadata']['source'],
-                'details': result['metadata'],
+                'details': dict(result['metadata']),
                 'relevance': f"{result['similarity']:.2%}",
                 'chunk': result['chunk']
             })
         
+        if aggregate is not None:
+            return {
+                'answer': aggregate['answer'],
+                'sources': sources,
+                'confidence': 1.0,
+                'search_results_count': aggregate['count'],
+                'aggregation': aggregate,
+                'chunk_ids': chunk_ids,
+                'intent': route['intent']
+            }
+        
         # Generate answer based on findings
         if crop_data:
-            answer_parts.append(self._format_crop_answer(crop_data, question))
+            answer_parts.append(self._format_crop_answer(crop_data, route['operation']))
         
         if soil_data:
             answer_parts.append(self._format_soil_answer(soil_data))
@@ -124,11 +352,18 @@ class IntelligentQASystem:
             'answer': answer,
             'sources': sources,
             'confidence': float(search_results[0]['similarity']),
-            'search_results_count': len(relevant_results if relevant_results else search_results)
+            'search_results_count': len(relevant_results if relevant_results else search_results),
+            'chunk_ids': chunk_ids,
+            'intent': route['intent']
         }
     
-    def _format_crop_answer(self, crop_data, question=""):
-        """Format crop production information"""
+    def _format_crop_answer(self, crop_data, operation=None):
+        """Format crop production information
+        
+        Args:
+            operation: aggregate keyword group the question used (sum, mean,
+                max or min, from the IntentRouter), if any
+        """
         if not crop_data:
             return ""
         
@@ -141,21 +376,21 @@ class IntelligentQASystem:
         states = set([d['metadata']['state'] for d in crop_data])
         crops = set([d['metadata']['crop'] for d in crop_data])
         
-        # Check if question asks for totals, averages, or largest
-        question_lower = question.lower()
-        
-        if 'total' in question_lower or 'sum' in question_lower:
+        # Totals, averages, or largest, as the question asked
+        if operation == 'sum':
             # Sum all production values
             total_production = sum([d['metadata']['production'] for d in crop_data])
             return f"Total production across {len(crop_data)} records: {total_production:.2f} tons."
         
-        if 'largest' in question_lower or 'highest' in question_lower or 'maximum' in question_lower:
-            # Find the record with highest value
-            max_result = max(crop_data, key=lambda x: x['metadata'].get('production', 0) or x['metadata'].get('area', 0))
+        # Records without a recorded production cannot be the largest
+        produced = [d for d in crop_data if d['metadata'].get('production') is not None]
+        if operation == 'max' and produced:
+            # Find the record with highest production
+            max_result = max(produced, key=lambda x: x['metadata']['production'])
             main_result = max_result['metadata']
-            return f"Largest production found: {main_result['crop']} in {main_result['state']} district {main_result['district']} with {main_result['production']:.2f} tons from {main_result['area']:.2f} hectares."
+            return f"Largest production found: {main_result['crop']} in {main_result['state']} district {main_result['district']} with {main_result['production']:.2f} tons from {main_result['area'] or 0:.2f} hectares."
         
-        if 'average' in question_lower or 'avg' in question_lower:
+        if operation == 'mean':
             # Calculate average
             avg_production = np.mean([d['metadata']['production'] for d in crop_data])
             avg_area = np.mean([d['metadata']['area'] for d in crop_data])
@@ -170,14 +405,23 @@ class IntelligentQASystem:
             return ""
         
         if len(soil_data) == 1:
-            # Single result
+            # Single result; nutrients without a recorded value are left out
             main_result = soil_data[0]['metadata']
-            return f"In {main_result['state']}, district {main_result['district']}, the soil is {main_result['soil_type']} type with pH {main_result['pH']:.2f}, Organic Carbon: {main_result['organic_carbon']:.2f}%, Nitrogen: {main_result['nitrogen']:.2f} kg/ha, Phosphorus: {main_result['phosphorus']:.2f} kg/ha, and Potassium: {main_result['potassium']:.2f} kg/ha."
+            nutrients = [(label, main_result.get(field), unit) for label, field, unit in (
+                ('pH', 'pH', ''), ('Organic Carbon:', 'organic_carbon', '%'), ('Nitrogen:', 'nitrogen', ' kg/ha'),
+                ('Phosphorus:', 'phosphorus', ' kg/ha'), ('Potassium:', 'potassium', ' kg/ha'))]
+            measured = ", ".join(f"{label} {value:.2f}{unit}" for label, value, unit in nutrients if value is not None)
+            return f"In {main_result['state']}, district {main_result['district']}, the soil is {main_result['soil_type']} type with {measured}."
         else:
-            # Multiple results - summarize
+            # Multiple results - summarize over the records that have each value
             states = set([d['metadata']['state'] for d in soil_data])
-            avg_pH = np.mean([d['metadata']['pH'] for d in soil_data])
-            avg_oc = np.mean([d['metadata']['organic_carbon'] for d in soil_data])
+            pH_values = [d['metadata']['pH'] for d in soil_data if d['metadata'].get('pH') is not None]
+            oc_values = [d['metadata']['organic_carbon'] for d in soil_data if d['metadata'].get('organic_carbon') is not None]
+            averages = []
+            if pH_values:
+                averages.append(f"Average pH: {np.mean(pH_values):.2f}")
+            if oc_values:
+                averages.append(f"Average Organic Carbon: {np.mean(oc_values):.2f}%")
             
-            return f"Found soil health data across {len(states)} states. Average pH: {avg_pH:.2f}, Average Organic Carbon: {avg_oc:.2f}%."
+            return f"Found soil health data across {len(states)} states. {', '.join(averages)}."
 
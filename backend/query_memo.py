@@ -0,0 +1,105 @@
+"""
+Query Memo for IntelligentQASystem
+Remembers, per normalized question, the sparse query vector and the ranked
+chunk ids of a search, so a repeated question skips the vectorizer's
+1-3-gram analysis and the similarity scan
+
+Entries are tagged with the vector database version they were computed on;
+invalidate() drops the entries of every other version after a reload.
+Unlike the response cache it holds no answers, only retrieval state, so it
+also helps requests the response cache misses, e.g. /query/stream.
+"""
+
+import threading
+from collections import OrderedDict
+
+from response_cache import CacheStats, normalize_question
+
+
+class BoundedMemo:
+    """Thread-safe LRU mapping with a fixed number of entries"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def invalidate(self, version=None):
+        """Drop entries whose key (version first) belongs to another version"""
+        with self._lock:
+            stale = [key for key in self._entries if version is None or key[0] != version]
+            for key in stale:
+                del self._entries[key]
+            self.stats.invalidations += 1
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats.as_dict(), entries=len(self._entries), max_entries=self.max_entries)
+
+
+class QueryMemo:
+    def __init__(self, max_vectors=4096, max_results=4096):
+        """
+        Args:
+            max_vectors: most query vectors kept; the least recently used go first
+            max_results: most (pipeline, question, top_k, entities) search results kept
+        """
+        self.vectors = BoundedMemo(max_vectors)
+        self.results = BoundedMemo(max_results)
+
+    @staticmethod
+    def normalize(query):
+        """Memo key text; vectorizing it gives the same terms as the raw question"""
+        return normalize_question(query)
+
+    def get_vector(self, version, query):
+        return self.vectors.get((version, query))
+
+    def set_vector(self, version, query, query_vector):
+        self.vectors.set((version, query), query_vector)
+
+    def get_results(self, version, mode, query, top_k, entities):
+        """Memoized ranking of a question by one retrieval pipeline (mode), or None"""
+        return self.results.get((version, mode, query, top_k, entities_key(entities)))
+
+    def set_results(self, version, mode, query, top_k, entities, ids, scores):
+        # Read-only so a caller can never change a memoized ranking in place
+        ids.flags.writeable = False
+        scores.flags.writeable = False
+        self.results.set((version, mode, query, top_k, entities_key(entities)), (ids, scores))
+
+    def invalidate(self, version=None):
+        """Drop everything computed on any vector database other than version"""
+        self.vectors.invalidate(version)
+        self.results.invalidate(version)
+
+    def info(self):
+        return {'vectors': self.vectors.info(), 'results': self.results.info()}
+
+
+def entities_key(entities):
+    """Hashable form of an EntityExtractor result"""
+    if not entities:
+        return ()
+    return tuple(sorted((field, tuple(values)) for field, values in entities.items()))
@@ -0,0 +1,277 @@
+"""
+Crop Ranking and Trend Engine
+Exact top-N / bottom-N groups ("top 10 districts by rice yield in 2012")
+and per-year series ("rice production in Punjab over the years") over the
+full crop production dataset
+
+A ranking whose fields one rollup table covers is read from that table.
+Any other combination (e.g. district x year) is grouped from the rows the
+metadata index selects that have a value for the metric: a bincount over
+the group field's codes sums it per group, and only the best n groups are
+sorted.
+"""
+
+import re
+import numpy as np
+
+from aggregation import UNITS, LABELS, WORD_RE, detect_metric, describe_filters
+from rollups import ROLLUP_FIELDS, metric_sums, top_n
+
+# "top 5 ... states", "bottom 3 districts", "which states produce the most rice"
+RANK_RE = re.compile(r'\b(top|bottom|best|worst|leading|highest|lowest|largest|smallest|biggest|most|least)\b'
+                     r'(?:\s+(\d{1,2})\b)?')
+# "... districts", or a singular group after a rank word: "the top state", "top 3 district"
+RANK_GROUP_RE = re.compile(r'\b(states|districts|crops|years|seasons)\b|'
+                           r'\b(?:top|bottom|best|worst|leading|highest|lowest|largest|smallest|biggest)'
+                           r'\s+(?:\d{1,2}\s+)?(state|district|crop|year|season)\b')
+ASCENDING_WORDS = ('bottom', 'worst', 'lowest', 'smallest', 'least')
+TREND_RE = re.compile(r'\b(trends?|over the years|over time|year[\s-]+(?:over|on|by)[\s-]+year|yoy|'
+                      r'growth|history|historical|year[\s-]?wise|every year|each year|per year|by year)\b')
+MAX_RANK = 20
+
+# Fields a crop row needs a value for to count towards a metric
+METRIC_FIELDS = {'production': ('production',), 'area': ('area',), 'yield': ('production', 'area')}
+
+
+def detect_ranking_query(question):
+    """Return ('rank', group_by, n, ascending), ('trend',) or None"""
+    text = question.lower()
+    if TREND_RE.search(text):
+        return ('trend',)
+
+    rank = RANK_RE.search(text)
+    group = RANK_GROUP_RE.search(text)
+    if rank is None or group is None:
+        return None
+    group_by = (group.group(1) or group.group(2)).rstrip('s')
+    if rank.group(2):
+        n = min(max(int(rank.group(2)), 1), MAX_RANK)
+    else:
+        # "which is the top state" asks for one, "the top states" for a few
+        n = 5 if group.group(1) else 1
+    return ('rank', group_by, n, rank.group(1) in ASCENDING_WORDS)
+
+
+class RankingEngine:
+    def __init__(self, metadata, index, rollups=None):
+        """
+        Args:
+            metadata: ColumnarMetadata store
+            index: MetadataIndex built over the same store
+            rollups: optional RollupTables of the same rows; without them
+                every ranking is grouped from rows
+        """
+        self.metadata = metadata
+        self.index = index
+        self.rollups = rollups
+
+        # Crop rows; each metric is then summed over the rows that have it, as the rollups do
+        self.rows = index.rows('source', 'crop_production')
+        self.is_crop = np.zeros(len(metadata), dtype=bool)
+        self.is_crop[self.rows] = True
+
+    def _select(self, filters, metric):
+        """Sorted crop rows matching the filters that have a value for the metric"""
+        rows = self.index.select(filters)
+        rows = self.rows if rows is None else rows[self.is_crop[rows]]
+        for field in METRIC_FIELDS[metric]:
+            rows = rows[~np.isnan(self.metadata.numeric(field)[rows])]
+        return rows
+
+    def _grouped(self, rows, group_by, metric):
+        """(labels, metric, records) per group_by value over rows"""
+        column = np.asarray(self.metadata.columns[group_by])[rows]
+        if group_by in self.metadata.categories:
+            known = column >= 0
+            rows, codes = rows[known], column[known].astype(np.int64)
+            size = len(self.metadata.categories[group_by])
+        else:
+            values, codes = np.unique(column, return_inverse=True)
+            size = len(values)
+
+        # Every row already has the metric's fields, so one count serves all of them
+        count = np.bincount(codes, minlength=size)
+        sums = {'production_count': count, 'area_count': count, 'paired_count': count}
+        for field in METRIC_FIELDS[metric]:
+            sums[field] = sums[f'paired_{field}'] = np.bincount(
+                codes, weights=self.metadata.numeric(field)[rows], minlength=size)
+        values_by_group, count = metric_sums(sums, metric)
+
+        used = np.flatnonzero(count)
+        if group_by in self.metadata.categories:
+            labels = [self.metadata.categories[group_by][code] for code in used]
+        else:
+            labels = [int(values[code]) for code in used]
+        return labels, values_by_group[used], count[used]
+
+    def rank(self, metric, group_by, filters=None, n=5, ascending=False):
+        """Top (or bottom) n groups by a metric over every matching crop row
+
+        Returns a result dict with 'groups': [{'value', 'metric', 'count'}]
+        best first ('table' names the rollup table used, or is None when
+        grouped from rows), or None if nothing matches.
+        """
+        filters = {f: v for f, v in (filters or {}).items() if f in ROLLUP_FIELDS and v}
+        if self.rollups is not None and self.rollups.table_for(set(filters) | {group_by}):
+            return self.rollups.rank(metric, group_by, filters, n=n, ascending=ascending)
+
+        rows = self._select(filters, metric)
+        if len(rows) == 0:
+            return None
+        labels, values, count = self._grouped(rows, group_by, metric)
+        order = top_n(values, n, ascending)
+        if len(order) == 0:
+            return None
+        return {
+            'kind': 'rank',
+            'table': None,
+            'metric': metric,
+            'group_by': group_by,
+            'ascending': ascending,
+            'filters': filters,
+            'count': int(count.sum()),
+            'groups': [{'value': labels[i], 'metric': float(values[i]), 'count': int(count[i])} for i in order],
+        }
+
+    def trend(self, metric, filters=None):
+        """Metric per year for the matching crop rows, or None
+
+        A state and/or crop series is a slice of the state_crop_year rollup;
+        district, season or year filters group the selected rows by year.
+        Returns a result dict with 'series': [{'year', 'metric', 'count'}]
+        in year order. When a field has several values ("rice in Punjab and
+        Bihar over the years") 'compared' names it and 'series_by' holds
+        [{'value', 'series', 'count'}], one series per value. Several values
+        in more than one field return None (left to AggregationEngine.compare).
+        """
+        filters = {f: v for f, v in (filters or {}).items() if f in ROLLUP_FIELDS and v}
+        if not filters:
+            return None
+        compared = [field for field in ROLLUP_FIELDS if len(filters.get(field, [])) > 1]
+        if len(compared) > 1:
+            return None
+        if compared:
+            return self._compared_trend(metric, filters, compared[0])
+        if self.rollups is not None and set(filters) <= {'state', 'crop'}:
+            return self.rollups.trend(metric, filters)
+
+        rows = self._select(filters, metric)
+        if len(rows) == 0:
+            return None
+        years, values, count = self._grouped(rows, 'year', metric)
+        series = [{'year': year, 'metric': float(value), 'count': int(records)}
+                  for year, value, records in zip(years, values, count) if value == value]
+        if not series:
+            return None
+        return {
+            'kind': 'trend',
+            'table': None,
+            'metric': metric,
+            'filters': filters,
+            'count': int(count.sum()),
+            'series': series,
+        }
+
+    def _compared_trend(self, metric, filters, compared):
+        """One trend per value of the compared field, or None if none has a series"""
+        series_by = []
+        table = None
+        for value in filters[compared]:
+            result = self.trend(metric, dict(filters, **{compared: [value]}))
+            if result is not None:
+                table = result['table']
+                series_by.append({'value': value, 'series': result['series'], 'count': result['count']})
+        if not series_by:
+            return None
+        return {
+            'kind': 'trend',
+            'table': table,
+            'metric': metric,
+            'filters': filters,
+            'compared': compared,
+            'count': sum(item['count'] for item in series_by),
+            'series_by': series_by,
+        }
+
+    def answer(self, question, entities, intent=None):
+        """Ranking or trend answer for a crop question, or None to fall back
+
+        Args:
+            intent: the IntentRouter intent when the question was routed; a
+                comparison ranks nothing and leaves several values of one
+                field to AggregationEngine.compare, unless it asks for a trend
+                (one series per compared value)
+        """
+        detected = detect_ranking_query(question)
+        if detected is None:
+            return None
+        if detected[0] == 'rank' and intent == 'comparison':
+            return None
+        source, metric = detect_metric(set(WORD_RE.findall(question.lower())))
+        if source != 'crop_production':
+            return None
+
+        if detected[0] == 'trend':
+            result = self.trend(metric, entities)
+        else:
+            _, group_by, n, ascending = detected
+            result = self.rank(metric, group_by, entities, n=n, ascending=ascending)
+        if result is None:
+            return None
+
+        result['answer'], result['facts'] = format_ranking(result)
+        return result
+
+
+def format_ranking(result):
+    """(answer sentence, fact lines for the Gemini prompt) of a rank or trend result"""
+    metric = result['metric']
+    unit = UNITS[metric]
+    label = LABELS[metric]
+    scope = describe_filters(result['filters'])
+
+    def amount(value):
+        return f"{value:,.2f} {unit}".rstrip()
+
+    if result['kind'] == 'rank':
+        groups = result['groups']
+        word = 'Bottom' if result['ascending'] else 'Top'
+        facts = [f"{i}. {g['value']}: {amount(g['metric'])} ({g['count']:,} records)"
+                 for i, g in enumerate(groups, 1)]
+        ranked = ", ".join(f"{g['value']} ({amount(g['metric'])})" for g in groups)
+        heading = f"{word} {len(groups)} {result['group_by']}s" if len(groups) > 1 else f"{word} {result['group_by']}"
+        return f"{heading} by {label}{scope}: {ranked}.", facts
+
+    if result.get('compared'):
+        compared = result['compared']
+        scope = describe_filters({f: v for f, v in result['filters'].items() if f != compared})
+        summaries = []
+        facts = []
+        for item in result['series_by']:
+            summary, lines = _format_series(item['series'], amount)
+            summaries.append(f"{item['value']} {summary}")
+            facts += [f"{item['value']} {line}" for line in lines]
+        return f"{label.capitalize()}{scope} by year and {compared}: {'; '.join(summaries)}.", facts
+
+    summary, facts = _format_series(result['series'], amount)
+    return f"{label.capitalize()}{scope} by year, {summary}.", facts
+
+
+def _format_series(series, amount):
+    """(summary, fact lines) of one per-year series"""
+    facts = []
+    previous = None
+    for point in series:
+        change = ""
+        if previous:
+            change = f" ({(point['metric'] - previous) / previous:+.1%})"
+        facts.append(f"{point['year']}: {amount(point['metric'])}{change}")
+        previous = point['metric']
+    first, last = series[0], series[-1]
+    peak = max(series, key=lambda point: point['metric'])
+    summary = f"{first['year']}-{last['year']}: "
+    if len(series) > 1 and first['metric']:
+        summary += (f"{amount(first['metric'])} in {first['year']} to {amount(last['metric'])} in {last['year']} "
+                    f"({(last['metric'] - first['metric']) / first['metric']:+.1%}), ")
+    summary += f"peak {amount(peak['metric'])} in {peak['year']}"
+    return summary, facts
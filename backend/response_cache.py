@@ -0,0 +1,231 @@
+"""
+Response Cache for /query
+Caches serialized answers keyed on the normalized question, top_k,
+use_gemini and the vector database version
+
+Two backends with the same interface:
+- ResponseCache: in-process LRU with a TTL, bounded by entries and bytes
+- SQLiteResponseCache: a SQLite file shared by every gunicorn worker
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SPACE_RE = re.compile(r'\s+')
+TRAILING_PUNCTUATION = '?.!,;: '
+
+
+def normalize_question(question):
+    """Lower-cased question with collapsed whitespace and no trailing punctuation"""
+    return SPACE_RE.sub(' ', str(question or '')).strip().lower().rstrip(TRAILING_PUNCTUATION)
+
+
+def cache_key(question, top_k, use_gemini, version=None):
+    """Stable string key for one /query request"""
+    return json.dumps([normalize_question(question), top_k, bool(use_gemini), version],
+                      ensure_ascii=False, separators=(',', ':'))
+
+
+class CacheStats:
+    """Hit / miss counters, kept per process"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+class ResponseCache:
+    def __init__(self, max_entries=1024, ttl=3600, max_bytes=64 * 1024 * 1024):
+        """
+        Args:
+            max_entries: most responses kept; the least recently used go first
+            ttl: seconds a response stays valid
+            max_bytes: cap on the total size of the cached response bodies
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Cached response body for key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                self._drop(key)
+                self.stats.expired += 1
+                entry = None
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[0]
+
+    def set(self, key, body, version=None):
+        size = len(body.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (body, time.monotonic() + self.ttl, size, version)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self.stats.evictions += 1
+
+    def _drop(self, key):
+        self._bytes -= self._entries.pop(key)[2]
+
+    def invalidate(self, version=None):
+        """Drop responses computed on any vector database other than version"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if version is None or entry[3] != version]
+            for key in stale:
+                self._drop(key)
+            self.stats.invalidations += 1
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats.as_dict(), backend='memory', entries=len(self._entries),
+                        bytes=self._bytes, max_entries=self.max_entries, ttl=self.ttl)
+
+
+class SQLiteResponseCache:
+    def __init__(self, path, max_entries=10000, ttl=3600):
+        """
+        Args:
+            path: SQLite file shared by all worker processes
+            max_entries: most responses kept; the least recently used go first
+            ttl: seconds a response stays valid
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._local = threading.local()
+        self._writes = 0
+        db = self._connect()
+        db.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY, body TEXT NOT NULL, version TEXT,
+            expires REAL NOT NULL, accessed REAL NOT NULL)""")
+        db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def _connect(self):
+        """One connection per thread; WAL lets workers read while another writes"""
+        db = getattr(self._local, 'db', None)
+        # Connections must not cross a fork (e.g. gunicorn --preload)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def get(self, key):
+        now = time.time()
+        try:
+            db = self._connect()
+            row = db.execute("SELECT body, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] <= now:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.stats.expired += 1
+                row = None
+            if row is None:
+                self.stats.misses += 1
+                return None
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            # The cache is an optimization; a locked or broken file must not fail requests
+            print(f"⚠️ Response cache read failed: {e}")
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return row[0]
+
+    def set(self, key, body, version=None):
+        now = time.time()
+        try:
+            db = self._connect()
+            db.execute("INSERT OR REPLACE INTO responses (key, body, version, expires, accessed) "
+                       "VALUES (?, ?, ?, ?, ?)", (key, body, version, now + self.ttl, now))
+            self._writes += 1
+            if self._writes % 64 == 0:
+                self._prune(db, now)
+        except sqlite3.Error as e:
+            print(f"⚠️ Response cache write failed: {e}")
+
+    def _prune(self, db, now):
+        """Drop expired rows and the least recently used rows over max_entries"""
+        db.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+        count = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            db.execute("DELETE FROM responses WHERE key IN "
+                       "(SELECT key FROM responses ORDER BY accessed LIMIT ?)", (excess,))
+            self.stats.evictions += excess
+
+    def invalidate(self, version=None):
+        """Drop responses computed on any vector database other than version"""
+        try:
+            db = self._connect()
+            if version is None:
+                db.execute("DELETE FROM responses")
+            else:
+                db.execute("DELETE FROM responses WHERE version IS NOT ?", (version,))
+        except sqlite3.Error as e:
+            print(f"⚠️ Response cache invalidation failed: {e}")
+        self.stats.invalidations += 1
+
+    def info(self):
+        try:
+            entries = self._connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        except sqlite3.Error:
+            entries = None
+        return dict(self.stats.as_dict(), backend='sqlite', path=self.path, entries=entries,
+                    max_entries=self.max_entries, ttl=self.ttl)
+
+
+def create_response_cache(backend=None, max_entries=None, ttl=None, path=None):
+    """Cache configured from the RESPONSE_CACHE* environment variables
+
+    RESPONSE_CACHE: 'memory' (default), 'sqlite' or 'off'
+    RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL (seconds), RESPONSE_CACHE_PATH
+    """
+    backend = (backend or os.environ.get('RESPONSE_CACHE', 'memory')).lower()
+    ttl = ttl if ttl is not None else float(os.environ.get('RESPONSE_CACHE_TTL', '3600'))
+
+    if backend in ('off', 'none', '0', 'false'):
+        return None
+    if backend == 'sqlite':
+        path = path or os.environ.get('RESPONSE_CACHE_PATH', 'response_cache.sqlite3')
+        size = max_entries or int(os.environ.get('RESPONSE_CACHE_SIZE', '10000'))
+        return SQLiteResponseCache(path, max_entries=size, ttl=ttl)
+    if backend != 'memory':
+        raise ValueError(f"Unknown response cache backend: {backend}")
+    size = max_entries or int(os.environ.get('RESPONSE_CACHE_SIZE', '1024'))
+    return ResponseCache(max_entries=size, ttl=ttl)
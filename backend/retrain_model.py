@@ -11,21 +11,87 @@ import sys
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.decomposition import PCA
 import re
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from metadata_store import ColumnarMetadata
+from parallel_vectorizer import fit_tfidf_parallel, fit_hashing_tfidf
+from dense_search import DENSE_METHOD, QUANTIZATIONS, DenseSearchIndex
+from vector_store import save_vector_store
+from rollups import RollupTables
 
 # Fix Windows console encoding
 if sys.platform == 'win32':
     import io
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 
+# Advanced TF-IDF with better features for statistical queries
+VECTORIZER_PARAMS = dict(
+    max_features=10000,  # More features for better discrimination
+    ngram_range=(1, 3),  # Use unigrams, bigrams, and trigrams
+    min_df=2,  # Minimum document frequency
+    max_df=0.95,  # Maximum document frequency
+    lowercase=True,
+    strip_accents='unicode',
+    analyzer='word',
+    token_pattern=r'\b\w+\b',
+    use_idf=True,
+    smooth_idf=True,
+    sublinear_tf=True  # Logarithmic TF for better performance
+)
+
+VECTORIZER_MODES = ('tfidf', 'parallel', 'hashing')
+
+# 'sparse': TF-IDF postings only; 'lsa': also a dense LSA projection with an IVF index
+INDEX_TYPES = ('sparse', 'lsa')
+
 class AdvancedModelTrainer:
-    def __init__(self):
+    def __init__(self, vectorizer_mode='tfidf', n_jobs=None, index_type='sparse',
+                 dense_dims=256, quantization='float32'):
+        """
+        Args:
+            vectorizer_mode: 'tfidf' (single process), 'parallel' (same vocabulary,
+                fitted over a process pool) or 'hashing' (stateless hashed features)
+            n_jobs: worker processes for the parallel and hashing modes
+            index_type: 'sparse' or 'lsa' (adds a dense ANN index, method 'lsa-ivf')
+            dense_dims: LSA dimensions for the 'lsa' index
+            quantization: 'float32' or 'int8' storage of the dense vectors
+        """
+        if vectorizer_mode not in VECTORIZER_MODES:
+            raise ValueError(f"Unknown vectorizer mode: {vectorizer_mode}")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        self.vectorizer_mode = vectorizer_mode
+        self.n_jobs = n_jobs
+        self.index_type = index_type
+        self.dense_dims = dense_dims
+        self.quantization = quantization
+        self.dense_index = None
+        self.rollups = None
         self.crop_data = []
         self.soil_data = []
         self.chunks = []
         self.metadata = []
         self.vectorizer = None
         self.embeddings = None
+        self.timings = {}
+    
+    @contextmanager
+    def timed_stage(self, name):
+        """Measure the wall time of one training stage"""
+        start = time.perf_counter()
+        yield
+        self.timings[name] = time.perf_counter() - start
+        print(f"   ⏱️  {name}: {self.timings[name]:.2f}s")
+    
+    def print_timings(self):
+        """Print how long each training stage took"""
+        total = sum(self.timings.values())
+        print("\n⏱️  Stage timings:")
+        for name, elapsed in self.timings.items():
+            share = elapsed / total * 100 if total else 0
+            print(f"   {name:<24} {elapsed:8.2f}s  {share:5.1f}%")
+        print(f"   {'total':<24} {total:8.2f}s")
         
     def load_and_preprocess_data(self):
         """Load and preprocess the datasets"""
@@ -52,213 +118,255 @@ class AdvancedModelTrainer:
         return df_crop, df_soil
     
     def create_crop_chunks(self, df):
-        """Create informative chunks for crop production data"""
+        """Create informative chunks for crop production data
+        
+        Vectorized over the whole DataFrame; produces the same chunk text as
+        formatting each row with f-strings.
+        
+        Returns:
+            (chunks, columns) where columns maps metadata field -> list of values
+        """
         print("\n📦 Creating crop production chunks...")
         
-        chunks = []
-        metadata_list = []
-        
-        # Group by state for better context
-        for idx, row in df.iterrows():
-            state = str(row['state_name']).strip()
-            district = str(row['district_name']).strip()
-            year = row['crop_year']
-            season = str(row['season']).strip()
-            crop = str(row['crop']).strip()
-            area = row['area_']
-            production = row['production_']
-            
-            # Skip if critical data is missing
-            if pd.isna(area) or pd.isna(production) or pd.isna(year):
-                continue
-            
-            # Create informative chunk text
-            chunk_text = (
-                f"In {state}, district {district}, during the {season} season of {int(year)}, "
-                f"{crop} was cultivated on {area:.2f} hectares with a total production of {production:.2f} tons. "
-                f"This data represents agricultural production in {state}, specifically in the {district} district."
-            )
-            
-            # Create detailed metadata
-            metadata = {
-                'source': 'crop_production',
-                'state': state,
-                'district': district,
-                'year': int(year),
-                'season': season,
-                'crop': crop,
-                'area': float(area),
-                'production': float(production),
-                'record_id': idx
-            }
-            
-            chunks.append(chunk_text)
-            metadata_list.append(metadata)
-            
-            if len(chunks) % 10000 == 0:
-                print(f"   Processed {len(chunks):,} crop records...")
+        # Skip if critical data is missing
+        keep = df['area_'].notna() & df['production_'].notna() & df['crop_year'].notna()
+        df = df[keep]
+        
+        state = df['state_name'].map(str).str.strip()
+        district = df['district_name'].map(str).str.strip()
+        season = df['season'].map(str).str.strip()
+        crop = df['crop'].map(str).str.strip()
+        year = df['crop_year'].astype(np.int64)
+        area = df['area_'].astype(np.float64)
+        production = df['production_'].astype(np.float64)
         
+        # Create informative chunk text
+        chunk_text = (
+            "In " + state + ", district " + district + ", during the " + season + " season of "
+            + year.astype(str) + ", " + crop + " was cultivated on " + area.map('{:.2f}'.format)
+            + " hectares with a total production of " + production.map('{:.2f}'.format) + " tons. "
+            + "This data represents agricultural production in " + state
+            + ", specifically in the " + district + " district."
+        )
+        
+        # Create detailed metadata, one column per field
+        columns = {
+            'source': ['crop_production'] * len(df),
+            'state': state.tolist(),
+            'district': district.tolist(),
+            'year': year.tolist(),
+            'season': season.tolist(),
+            'crop': crop.tolist(),
+            'area': area.tolist(),
+            'production': production.tolist(),
+            'record_id': df.index.tolist()
+        }
+        
+        chunks = chunk_text.tolist()
         print(f"✅ Created {len(chunks):,} crop production chunks")
-        return chunks, metadata_list
+        return chunks, columns
     
     def create_soil_chunks(self, df):
-        """Create informative chunks for soil health data"""
+        """Create informative chunks for soil health data
+        
+        Vectorized over the whole DataFrame; produces the same chunk text as
+        formatting each row with f-strings.
+        
+        Returns:
+            (chunks, columns) where columns maps metadata field -> list of values
+        """
         print("\n🌿 Creating soil health chunks...")
         
-        chunks = []
-        metadata_list = []
-        
-        for idx, row in df.iterrows():
-            state = str(row['state_name']).strip()
-            district = str(row['district_name']).strip()
-            subdistrict = str(row['subdistrict_name']).strip()
-            soil_type = str(row['soil_type']).strip()
-            
-            # Extract numeric values with validation
-            ph_value = row['pH_value'] if pd.notna(row['pH_value']) else None
-            organic_carbon = row['organic_carbon'] if pd.notna(row['organic_carbon']) else None
-            nitrogen = row['nitrogen'] if pd.notna(row['nitrogen']) else None
-            phosphorus = row['phosphorus'] if pd.notna(row['phosphorus']) else None
-            potassium = row['potassium'] if pd.notna(row['potassium']) else None
-            
-            # Skip if critical data is missing
-            if pd.isna(ph_value):
-                continue
-            
-            # Create informative chunk text
-            soil_info_parts = []
-            if organic_carbon: soil_info_parts.append(f"organic carbon {organic_carbon:.2f}%")
-            if nitrogen: soil_info_parts.append(f"nitrogen {nitrogen:.2f} kg/ha")
-            if phosphorus: soil_info_parts.append(f"phosphorus {phosphorus:.2f} kg/ha")
-            if potassium: soil_info_parts.append(f"potassium {potassium:.2f} kg/ha")
-            
-            nutrient_text = ", ".join(soil_info_parts) if soil_info_parts else "standard nutrient levels"
-            
-            chunk_text = (
-                f"In {state}, district {district} (subdistrict: {subdistrict}), "
-                f"the soil type is {soil_type} with a pH value of {ph_value:.2f}. "
-                f"The soil contains: {nutrient_text}. "
-                f"This data represents soil health information for {state}, {district}."
-            )
-            
-            # Create detailed metadata
-            metadata = {
-                'source': 'soil_health',
-                'state': state,
-                'district': district,
-                'subdistrict': subdistrict,
-                'soil_type': soil_type,
-                'pH': float(ph_value) if ph_value else None,
-                'organic_carbon': float(organic_carbon) if organic_carbon else None,
-                'nitrogen': float(nitrogen) if nitrogen else None,
-                'phosphorus': float(phosphorus) if phosphorus else None,
-                'potassium': float(potassium) if potassium else None,
-                'record_id': idx
-            }
-            
-            chunks.append(chunk_text)
-            metadata_list.append(metadata)
-            
-            if len(chunks) % 5000 == 0:
-                print(f"   Processed {len(chunks):,} soil records...")
+        # Skip if critical data is missing
+        df = df[df['pH_value'].notna()]
+        
+        state = df['state_name'].map(str).str.strip()
+        district = df['district_name'].map(str).str.strip()
+        subdistrict = df['subdistrict_name'].map(str).str.strip()
+        soil_type = df['soil_type'].map(str).str.strip()
+        ph_value = df['pH_value'].astype(np.float64)
         
+        # Nutrients that are missing or zero are left out of the text and stored as None
+        nutrient_text = pd.Series('', index=df.index)
+        nutrients = {}
+        for field, label, unit in (
+            ('organic_carbon', 'organic carbon', '%'),
+            ('nitrogen', 'nitrogen', ' kg/ha'),
+            ('phosphorus', 'phosphorus', ' kg/ha'),
+            ('potassium', 'potassium', ' kg/ha'),
+        ):
+            values = df[field].astype(np.float64)
+            present = values.notna() & (values != 0)
+            part = ", " + label + " " + values.map('{:.2f}'.format) + unit
+            nutrient_text = nutrient_text + part.where(present, '')
+            nutrients[field] = values.astype(object).where(present, None).tolist()
+        
+        nutrient_text = nutrient_text.str[2:].replace('', 'standard nutrient levels')
+        
+        # Create informative chunk text
+        chunk_text = (
+            "In " + state + ", district " + district + " (subdistrict: " + subdistrict + "), "
+            + "the soil type is " + soil_type + " with a pH value of " + ph_value.map('{:.2f}'.format) + ". "
+            + "The soil contains: " + nutrient_text + ". "
+            + "This data represents soil health information for " + state + ", " + district + "."
+        )
+        
+        # Create detailed metadata, one column per field
+        columns = {
+            'source': ['soil_health'] * len(df),
+            'state': state.tolist(),
+            'district': district.tolist(),
+            'subdistrict': subdistrict.tolist(),
+            'soil_type': soil_type.tolist(),
+            'pH': ph_value.astype(object).where(ph_value != 0, None).tolist(),
+            'organic_carbon': nutrients['organic_carbon'],
+            'nitrogen': nutrients['nitrogen'],
+            'phosphorus': nutrients['phosphorus'],
+            'potassium': nutrients['potassium'],
+            'record_id': df.index.tolist()
+        }
+        
+        chunks = chunk_text.tolist()
         print(f"✅ Created {len(chunks):,} soil health chunks")
-        return chunks, metadata_list
+        return chunks, columns
     
     def create_vectorizer(self, chunks):
         """Create optimized TF-IDF vectorizer"""
-        print("\n🔧 Creating optimized TF-IDF vectorizer...")
-        
-        # Advanced TF-IDF with better features for statistical queries
-        vectorizer = TfidfVectorizer(
-            max_features=10000,  # More features for better discrimination
-            ngram_range=(1, 3),  # Use unigrams, bigrams, and trigrams
-            min_df=2,  # Minimum document frequency
-            max_df=0.95,  # Maximum document frequency
-            lowercase=True,
-            strip_accents='unicode',
-            analyzer='word',
-            token_pattern=r'\b\w+\b',
-            use_idf=True,
-            smooth_idf=True,
-            sublinear_tf=True  # Logarithmic TF for better performance
-        )
+        print(f"\n🔧 Creating optimized TF-IDF vectorizer ({self.vectorizer_mode})...")
         
-        print("   Fitting vectorizer on all chunks...")
-        embeddings = vectorizer.fit_transform(chunks)
+        if self.vectorizer_mode == 'parallel':
+            vectorizer, embeddings = fit_tfidf_parallel(chunks, VECTORIZER_PARAMS, n_jobs=self.n_jobs)
+        elif self.vectorizer_mode == 'hashing':
+            vectorizer, embeddings = fit_hashing_tfidf(chunks, VECTORIZER_PARAMS, n_jobs=self.n_jobs)
+        else:
+            vectorizer = TfidfVectorizer(**VECTORIZER_PARAMS)
+            print("   Fitting vectorizer on all chunks...")
+            embeddings = vectorizer.fit_transform(chunks)
         
-        print(f"   Vocabulary size: {len(vectorizer.vocabulary_):,}")
+        if hasattr(vectorizer, 'vocabulary_'):
+            print(f"   Vocabulary size: {len(vectorizer.vocabulary_):,}")
         print(f"   Embedding shape: {embeddings.shape}")
         
         return vectorizer, embeddings
     
-    def train_model(self):
+    def train_model(self, write_pickle=False):
         """Main training function"""
         print("\n" + "="*80)
         print("🚀 Starting Advanced Model Training")
         print("="*80)
         
+        self.timings = {}
+        
         # Load data
-        df_crop, df_soil = self.load_and_preprocess_data()
+        with self.timed_stage('load_data'):
+            df_crop, df_soil = self.load_and_preprocess_data()
         
         # Create chunks
-        crop_chunks, crop_metadata = self.create_crop_chunks(df_crop)
-        soil_chunks, soil_metadata = self.create_soil_chunks(df_soil)
+        with self.timed_stage('crop_chunks'):
+            crop_chunks, crop_columns = self.create_crop_chunks(df_crop)
+        with self.timed_stage('soil_chunks'):
+            soil_chunks, soil_columns = self.create_soil_chunks(df_soil)
         
         # Combine all chunks
         all_chunks = crop_chunks + soil_chunks
-        all_metadata = crop_metadata + soil_metadata
+        with self.timed_stage('metadata_columns'):
+            all_metadata = ColumnarMetadata.from_column_sets([crop_columns, soil_columns])
+        
+        # Per-group sums for ranking and trend questions
+        with self.timed_stage('rollups'):
+            self.rollups = RollupTables.build(all_metadata)
         
         print(f"\n📊 Total chunks created: {len(all_chunks):,}")
         print(f"   - Crop production: {len(crop_chunks):,}")
         print(f"   - Soil health: {len(soil_chunks):,}")
         
         # Create vectorizer and embeddings
-        self.vectorizer, self.embeddings = self.create_vectorizer(all_chunks)
+        with self.timed_stage('vectorizer'):
+            self.vectorizer, self.embeddings = self.create_vectorizer(all_chunks)
+        
+        if self.index_type == 'lsa':
+            with self.timed_stage('dense_index'):
+                print(f"\n🧭 Building dense LSA index ({self.quantization})...")
+                self.dense_index = DenseSearchIndex.build(self.embeddings, dims=self.dense_dims,
+                                                          quantization=self.quantization)
         
         # Save to vector database
-        self.save_vector_database(all_chunks, all_metadata)
+        with self.timed_stage('save'):
+            self.save_vector_database(all_chunks, all_metadata, write_pickle=write_pickle)
+        
+        self.print_timings()
         
         print("\n" + "="*80)
         print("✅ Training Complete!")
         print("="*80)
         
-    def save_vector_database(self, chunks, metadata):
-        """Save the trained model to disk"""
+    def save_vector_database(self, chunks, metadata, output_dir='vector_database', write_pickle=False):
+        """Save the trained model to disk in the memory-mapped format"""
         print("\n💾 Saving vector database...")
         
+        if self.dense_index is not None:
+            method = DENSE_METHOD
+        else:
+            method = 'tf-idf_hashing' if self.vectorizer_mode == 'hashing' else 'tf-idf_advanced'
         vector_db = {
             'chunks': chunks,
             'metadata': metadata,
             'embeddings': self.embeddings,
             'vectorizer': self.vectorizer,
-            'method': 'tf-idf_advanced',
+            'method': method,
             'n_features': self.embeddings.shape[1],
             'n_chunks': len(chunks),
             'trained_date': datetime.now().isoformat(),
             'version': '2.0_optimized'
         }
+        if self.dense_index is not None:
+            vector_db['dense_index'] = self.dense_index
+        if self.rollups is not None:
+            vector_db['rollups'] = self.rollups
         
-        output_path = 'vector_database.pkl'
-        with open(output_path, 'wb') as f:
-            pickle.dump(vector_db, f)
+        save_vector_store(vector_db, output_dir)
+        size = sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, names in os.walk(output_dir) for name in names
+        )
         
-        print(f"✅ Saved vector database to: {output_path}")
-        print(f"   File size: {os.path.getsize(output_path) / (1024*1024):.2f} MB")
+        print(f"✅ Saved vector database to: {output_dir}/")
+        print(f"   Size on disk: {size / (1024*1024):.2f} MB")
         print(f"   Chunks: {len(chunks):,}")
         print(f"   Features: {self.embeddings.shape[1]:,}")
+        
+        if write_pickle:
+            # Legacy single-file format, only needed by older deployments
+            output_path = 'vector_database.pkl'
+            with open(output_path, 'wb') as f:
+                pickle.dump(vector_db, f)
+            print(f"✅ Saved legacy pickle to: {output_path}")
 
 def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Train the agricultural vector database")
+    parser.add_argument('--vectorizer', choices=VECTORIZER_MODES, default='tfidf',
+                        help="tfidf: single process, parallel: process pool, hashing: stateless hashed features")
+    parser.add_argument('--jobs', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--pickle', action='store_true', help="also write the legacy vector_database.pkl")
+    parser.add_argument('--index', choices=INDEX_TYPES, default='sparse',
+                        help="sparse: TF-IDF postings, lsa: also a dense LSA + IVF index for paraphrases")
+    parser.add_argument('--dense-dims', type=int, default=256, help="LSA dimensions for --index lsa")
+    parser.add_argument('--quantize', choices=QUANTIZATIONS, default='float32',
+                        help="storage of the dense vectors (int8 is 4x smaller)")
+    args = parser.parse_args()
+    
     print("\n" + "="*80)
     print("🌾 Advanced Agricultural AI Model Trainer")
     print("="*80)
     print("Optimized for complex statistical queries with high performance")
     print("="*80)
     
-    trainer = AdvancedModelTrainer()
+    trainer = AdvancedModelTrainer(vectorizer_mode=args.vectorizer, n_jobs=args.jobs, index_type=args.index,
+                                   dense_dims=args.dense_dims, quantization=args.quantize)
     
     try:
-        trainer.train_model()
+        trainer.train_model(write_pickle=args.pickle)
         
         print("\n" + "="*80)
         print("✨ Model Training Successful!")
@@ -0,0 +1,301 @@
+"""
+Crop Production Rollup Tables
+Production, area and record counts summed per group at training time, so
+ranking ("top 5 rice producing states") and trend ("wheat production in
+Punjab over the years") questions are answered without touching raw rows
+
+Tables (crop_production rows only):
+    state_crop_year    state x crop x year
+    district_crop      state x district x crop
+    crop_season        state x crop x season
+
+Every table is one sorted int64 array of mixed-radix group keys (the codes
+of its fields in order) with parallel sum and count arrays. Like the
+aggregation engine, production is summed over the rows that have a
+production value, area over the rows that have an area, and yield comes
+from the rows that have both. A missing field value is a group of its own
+(label None) that is never ranked, so no table drops rows for a field
+outside its key.
+A full key is found with a binary search, and fixing the leading fields
+(e.g. state and crop of state_crop_year) selects one contiguous run, so a
+trend is a slice. Stored as rollup_* arrays next to the vector database.
+"""
+
+import itertools
+import os
+
+import numpy as np
+
+ROLLUPS = {
+    'state_crop_year': ('state', 'crop', 'year'),
+    'district_crop': ('state', 'district', 'crop'),
+    'crop_season': ('state', 'crop', 'season'),
+}
+ROLLUP_FIELDS = ('state', 'district', 'crop', 'year', 'season')
+CROP_ROLLUP_METRICS = ('production', 'area', 'yield')
+ROLLUP_VERSION = 2
+
+# Summed columns of every table; 'paired_*' only cover rows with both production and area
+SUM_COLUMNS = ('production', 'production_count', 'area', 'area_count',
+               'paired_production', 'paired_area', 'paired_count')
+METRIC_SUMS = {
+    'production': ('production', 'production_count'),
+    'area': ('area', 'area_count'),
+    'yield': ('paired_production', 'paired_count'),
+}
+
+
+def metric_sums(sums, metric):
+    """(metric per group, records per group) from summed columns; NaN where no record has the metric
+
+    Yield is the summed production over the summed area of the rows that
+    have both.
+    """
+    total, count = (sums[column] for column in METRIC_SUMS[metric])
+    if metric == 'yield':
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(sums['paired_area'] > 0, total / sums['paired_area'], np.nan)
+    else:
+        values = np.asarray(total, dtype=np.float64)
+    return np.where(count > 0, values, np.nan), count
+
+
+def top_n(values, n, ascending=False):
+    """Positions of the n largest (smallest) non-NaN values, best first
+
+    np.partition finds the n-th best value and only the values up to it
+    are sorted; ties keep position order, as a stable full sort would.
+    """
+    present = np.flatnonzero(~np.isnan(values))
+    scores = values[present] if ascending else -values[present]
+    if n < len(present):
+        kth = np.partition(scores, n - 1)[n - 1]
+        keep = np.flatnonzero(scores <= kth)
+        present, scores = present[keep], scores[keep]
+    return present[np.lexsort((present, scores))[:n]]
+
+
+class RollupTables:
+    def __init__(self, labels, tables):
+        """
+        Args:
+            labels: field -> list of values; a field's code is its position
+            tables: table name -> dict of 'keys' (sorted int64 group keys)
+                and one array per SUM_COLUMNS entry
+        """
+        self.labels = labels
+        self.tables = tables
+        self._lookup = {field: {value: i for i, value in enumerate(values) if value is not None}
+                        for field, values in labels.items()}
+        self._radix = {name: [max(len(labels[field]), 1) for field in fields]
+                       for name, fields in ROLLUPS.items()}
+
+    @classmethod
+    def build(cls, metadata, exclude=None):
+        """Sum the crop_production rows of a ColumnarMetadata store per group
+
+        Args:
+            exclude: optional row ids left out (e.g. rows replaced by a segment)
+        """
+        present = metadata.source_mask('production')
+        if exclude is not None and len(exclude):
+            present[exclude] = False
+        rows = np.flatnonzero(present)
+        production = metadata.numeric('production')[rows]
+        area = metadata.numeric('area')[rows]
+        has_production = ~np.isnan(production)
+        has_area = ~np.isnan(area)
+        paired = has_production & has_area
+        measures = {
+            'production': np.where(has_production, production, 0.0),
+            'production_count': has_production,
+            'area': np.where(has_area, area, 0.0),
+            'area_count': has_area,
+            'paired_production': np.where(paired, production, 0.0),
+            'paired_area': np.where(paired, area, 0.0),
+            'paired_count': paired,
+        }
+        measured = has_production | has_area
+        rows, measures = rows[measured], {column: values[measured] for column, values in measures.items()}
+
+        labels = {}
+        codes = {}
+        for field in ROLLUP_FIELDS:
+            column = np.asarray(metadata.columns[field])[rows]
+            known = column >= 0 if field in metadata.categories else np.ones(len(rows), dtype=bool)
+            used, inverse = np.unique(column[known], return_inverse=True)
+            if field in metadata.categories:
+                labels[field] = [metadata.categories[field][code] for code in used]
+            else:
+                labels[field] = [int(value) for value in used]
+            codes[field] = np.full(len(rows), len(used), dtype=np.int64)
+            codes[field][known] = inverse
+            if not known.all():
+                labels[field].append(None)
+
+        tables = {}
+        for name, fields in ROLLUPS.items():
+            key = np.zeros(len(rows), dtype=np.int64)
+            for field in fields:
+                key = key * max(len(labels[field]), 1) + codes[field]
+            keys, inverse = np.unique(key, return_inverse=True)
+            table = {'keys': keys}
+            for column, values in measures.items():
+                summed = np.bincount(inverse, weights=values, minlength=len(keys))
+                table[column] = summed.astype(np.int32) if column.endswith('_count') else summed
+            tables[name] = table
+        return cls(labels, tables)
+
+    def params(self):
+        """Manifest entry: the field values the stored codes refer to"""
+        return {'version': ROLLUP_VERSION, 'labels': self.labels,
+                'tables': {name: list(fields) for name, fields in ROLLUPS.items()}}
+
+    def arrays(self):
+        """File name -> array, as written into the vector database directory"""
+        return {f'rollup_{name}_{column}.npy': array
+                for name, table in self.tables.items() for column, array in table.items()}
+
+    @classmethod
+    def load(cls, path, params, mmap_mode='r'):
+        """Open the arrays written by arrays() (memory-mapped by default)
+
+        Returns None for tables written in an older layout; they are rebuilt
+        from the metadata on load.
+        """
+        if params.get('version') != ROLLUP_VERSION:
+            return None
+        tables = {}
+        for name in params['tables']:
+            tables[name] = {column: np.asarray(np.load(os.path.join(path, f'rollup_{name}_{column}.npy'),
+                                                       mmap_mode=mmap_mode))
+                            for column in ('keys',) + SUM_COLUMNS}
+        return cls(params['labels'], tables)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for table in self.tables.values() for array in table.values())
+
+    def table_for(self, fields):
+        """Smallest table whose key covers every field, or None"""
+        fitting = [name for name, key_fields in ROLLUPS.items() if set(fields) <= set(key_fields)]
+        if not fitting:
+            return None
+        return min(fitting, key=lambda name: len(self.tables[name]['keys']))
+
+    def codes(self, table, rows, field):
+        """Codes of one key field for some rows of a table"""
+        fields = ROLLUPS[table]
+        radix = self._radix[table]
+        position = fields.index(field)
+        span = int(np.prod(radix[position + 1:], dtype=np.int64))
+        return (self.tables[table]['keys'][rows] // span) % radix[position]
+
+    def select(self, table, filters):
+        """Sorted row positions of a table matching field -> list of values
+
+        Leading key fields with given values are found by binary search
+        (one contiguous run per value combination); any later field is
+        filtered on the selected rows only.
+        """
+        fields = ROLLUPS[table]
+        radix = self._radix[table]
+        keys = self.tables[table]['keys']
+
+        wanted = {}
+        for field in fields:
+            values = filters.get(field)
+            if values:
+                found = [self._lookup[field][v] for v in values if v in self._lookup[field]]
+                if not found:
+                    return np.empty(0, dtype=np.int64)
+                wanted[field] = sorted(set(found))
+
+        leading = 0
+        while leading < len(fields) and fields[leading] in wanted:
+            leading += 1
+        if leading:
+            span = int(np.prod(radix[leading:], dtype=np.int64))
+            runs = []
+            for prefix in itertools.product(*(wanted[field] for field in fields[:leading])):
+                base = 0
+                for field, code in zip(fields, prefix):
+                    base = base * radix[fields.index(field)] + code
+                lo, hi = np.searchsorted(keys, [base * span, (base + 1) * span])
+                runs.append(np.arange(lo, hi, dtype=np.int64))
+            rows = np.concatenate(runs)
+        else:
+            rows = np.arange(len(keys), dtype=np.int64)
+
+        for field in fields[leading:]:
+            if field in wanted and len(rows):
+                rows = rows[np.isin(self.codes(table, rows, field), wanted[field])]
+        return rows
+
+    def grouped(self, table, rows, group_by, metric):
+        """(labels, metric, records) per group_by value over rows of a table"""
+        data = self.tables[table]
+        codes, inverse = np.unique(self.codes(table, rows, group_by), return_inverse=True)
+        sums = {column: np.bincount(inverse, weights=data[column][rows], minlength=len(codes))
+                for column in SUM_COLUMNS}
+        values, count = metric_sums(sums, metric)
+        # Records with no group_by value are left out
+        labels = [self.labels[group_by][code] for code in codes]
+        known = np.array([label is not None for label in labels], dtype=bool)
+        return [label for label in labels if label is not None], values[known], count[known].astype(np.int64)
+
+    def rank(self, metric, group_by, filters=None, n=5, ascending=False):
+        """Top (or bottom) n groups by a metric, or None if no table fits
+
+        Returns a result dict with 'groups': [{'value', 'metric', 'count'}]
+        best first, and the record count covered.
+        """
+        filters = {f: v for f, v in (filters or {}).items() if f in ROLLUP_FIELDS and v}
+        table = self.table_for(set(filters) | {group_by})
+        if table is None:
+            return None
+        rows = self.select(table, filters)
+        if len(rows) == 0:
+            return None
+
+        labels, values, count = self.grouped(table, rows, group_by, metric)
+        order = top_n(values, n, ascending)
+        if len(order) == 0:
+            return None
+        return {
+            'kind': 'rank',
+            'table': table,
+            'metric': metric,
+            'group_by': group_by,
+            'ascending': ascending,
+            'filters': filters,
+            'count': int(count.sum()),
+            'groups': [{'value': labels[i], 'metric': float(values[i]), 'count': int(count[i])} for i in order],
+        }
+
+    def trend(self, metric, filters=None):
+        """Metric per year for a state and/or crop, or None if no table fits
+
+        Returns a result dict with 'series': [{'year', 'metric', 'count'}] in
+        year order.
+        """
+        filters = {f: v for f, v in (filters or {}).items() if f in ('state', 'crop') and v}
+        if not filters:
+            return None
+        rows = self.select('state_crop_year', filters)
+        if len(rows) == 0:
+            return None
+
+        years, values, count = self.grouped('state_crop_year', rows, 'year', metric)
+        series = [{'year': year, 'metric': float(value), 'count': int(records)}
+                  for year, value, records in zip(years, values, count) if value == value]
+        if not series:
+            return None
+        return {
+            'kind': 'trend',
+            'table': 'state_crop_year',
+            'metric': metric,
+            'filters': filters,
+            'count': int(count.sum()),
+            'series': series,
+        }
@@ -0,0 +1,209 @@
+"""
+Semantic Cache for Gemini Answers
+Reuses a Gemini answer for a reworded question ("rice production Bihar" /
+"how much rice does Bihar produce") that the exact-key response cache misses
+
+Entries hold the L2-normalized TF-IDF query vector of the question (from
+IntelligentQASystem.vectorizer), the evidence the answer was generated from
+(ranked chunk ids and any aggregate) and the answer. A question is a hit when
+its cosine similarity to a cached question reaches the threshold AND its own
+retrieval produced the same evidence, so only the Gemini call is skipped.
+Cosine similarity is scored through term -> entry postings, like the sparse
+search index, so a lookup touches only entries sharing a term.
+
+A sampled share of hits is audited: the request is answered fresh and the
+two answers are compared; a low word overlap counts as a suspected false hit
+and drops the entry.
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from response_cache import CacheStats
+
+WORD_RE = re.compile(r'\w+')
+
+# Word overlap (Jaccard) below which an audited hit counts as a suspected false hit
+AUDIT_AGREEMENT = 0.35
+
+
+def answer_agreement(cached, fresh):
+    """Jaccard overlap of the words (and numbers) of two answers"""
+    a = set(WORD_RE.findall(str(cached).lower()))
+    b = set(WORD_RE.findall(str(fresh).lower()))
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def evidence_key(result):
+    """What an answer_question result's Gemini answer is grounded on"""
+    aggregation = result.get('aggregation')
+    return (tuple(result.get('chunk_ids', ())), aggregation['answer'] if aggregation else None)
+
+
+class SemanticCache:
+    def __init__(self, max_entries=512, ttl=3600, threshold=0.9, audit_rate=0.0):
+        """
+        Args:
+            max_entries: most answers kept; the least recently used go first
+            ttl: seconds an answer stays valid
+            threshold: cosine similarity a question needs to a cached one
+            audit_rate: share of hits answered fresh to check the cached answer
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.audit_rate = audit_rate
+        self.stats = CacheStats()
+        self.near_misses = 0
+        self.audits = 0
+        self.suspected_false_hits = 0
+        self.agreement_total = 0.0
+        self._entries = OrderedDict()
+        self._postings = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _terms(query_vector):
+        """term -> weight of a 1-row sparse query vector, L2-normalized"""
+        row = query_vector.tocsr()
+        norm = float(np.sqrt(np.dot(row.data, row.data)))
+        if not norm:
+            return {}
+        return {int(term): float(weight) / norm for term, weight in zip(row.indices, row.data)}
+
+    def get(self, scope, query_vector, evidence):
+        """Cached entry for a similar question with the same evidence, or None
+
+        Args:
+            scope: (db_version, top_k) the answer must share
+            query_vector: the question's vectorizer output
+            evidence: evidence_key of the question's own retrieval
+
+        Returns:
+            dict with the cached 'answer', its 'question', the 'similarity'
+            and 'audit' (True when this hit should be checked), or None
+        """
+        terms = self._terms(query_vector)
+        now = time.monotonic()
+        with self._lock:
+            postings = self._postings.get(scope, {})
+            scores = {}
+            for term, weight in terms.items():
+                for entry_id in postings.get(term, ()):
+                    scores[entry_id] = scores.get(entry_id, 0.0) + weight * self._entries[entry_id]['terms'][term]
+
+            similar = False
+            for entry_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+                if score < self.threshold:
+                    break
+                entry = self._entries[entry_id]
+                if entry['expires'] <= now:
+                    self._drop(entry_id)
+                    self.stats.expired += 1
+                    continue
+                if entry['evidence'] != evidence:
+                    similar = True
+                    continue
+                self._entries.move_to_end(entry_id)
+                self.stats.hits += 1
+                return {
+                    'id': entry_id,
+                    'answer': entry['answer'],
+                    'question': entry['question'],
+                    'similarity': round(min(score, 1.0), 4),
+                    'audit': self.audit_rate > 0 and random.random() < self.audit_rate,
+                }
+
+            # A reworded question whose retrieval differs is not the same question
+            self.near_misses += similar
+            self.stats.misses += 1
+            return None
+
+    def set(self, scope, query_vector, evidence, question, answer):
+        terms = self._terms(query_vector)
+        if self.max_entries <= 0 or not terms:
+            return
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                'scope': scope, 'terms': terms, 'evidence': evidence, 'question': question,
+                'answer': answer, 'expires': time.monotonic() + self.ttl,
+            }
+            postings = self._postings.setdefault(scope, {})
+            for term in terms:
+                postings.setdefault(term, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.stats.evictions += 1
+
+    def audit(self, hit, fresh_answer):
+        """Compare an audited hit's cached answer with the fresh one
+
+        Returns the agreement; a suspected false hit drops the entry.
+        """
+        agreement = answer_agreement(hit['answer'], fresh_answer)
+        with self._lock:
+            self.audits += 1
+            self.agreement_total += agreement
+            if agreement < AUDIT_AGREEMENT:
+                self.suspected_false_hits += 1
+                if hit['id'] in self._entries:
+                    self._drop(hit['id'])
+        return agreement
+
+    def _drop(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        postings = self._postings[entry['scope']]
+        for term in entry['terms']:
+            ids = postings[term]
+            ids.discard(entry_id)
+            if not ids:
+                del postings[term]
+        if not postings:
+            del self._postings[entry['scope']]
+
+    def invalidate(self, version=None):
+        """Drop answers computed on any vector database other than version"""
+        with self._lock:
+            stale = [entry_id for entry_id, entry in self._entries.items()
+                     if version is None or entry['scope'][0] != version]
+            for entry_id in stale:
+                self._drop(entry_id)
+            self.stats.invalidations += 1
+
+    def info(self):
+        with self._lock:
+            return dict(self.stats.as_dict(), entries=len(self._entries), max_entries=self.max_entries,
+                        ttl=self.ttl, threshold=self.threshold, near_misses=self.near_misses,
+                        audit_rate=self.audit_rate, audits=self.audits,
+                        suspected_false_hits=self.suspected_false_hits,
+                        avg_audit_agreement=round(self.agreement_total / self.audits, 3) if self.audits else None)
+
+
+def create_semantic_cache(enabled=None, max_entries=None, ttl=None, threshold=None, audit_rate=None):
+    """Cache configured from the SEMANTIC_CACHE* environment variables
+
+    SEMANTIC_CACHE: 'on' (default) or 'off'
+    SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_TTL (seconds),
+    SEMANTIC_CACHE_THRESHOLD (cosine similarity), SEMANTIC_CACHE_AUDIT (share of hits)
+    """
+    if enabled is None:
+        enabled = os.environ.get('SEMANTIC_CACHE', 'on').lower() not in ('off', 'none', '0', 'false')
+    if not enabled:
+        return None
+    return SemanticCache(
+        max_entries=max_entries if max_entries is not None else int(os.environ.get('SEMANTIC_CACHE_SIZE', '512')),
+        ttl=ttl if ttl is not None else float(os.environ.get('SEMANTIC_CACHE_TTL', '3600')),
+        threshold=threshold if threshold is not None else float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', '0.9')),
+        audit_rate=audit_rate if audit_rate is not None else float(os.environ.get('SEMANTIC_CACHE_AUDIT', '0.02')),
+    )
@@ -0,0 +1,349 @@
+"""
+Soil Health Range Index
+Answers nutrient range questions ("districts in Kerala with pH below 5.5")
+and per-region nutrient summaries ("soil health in Kerala") with exact
+counts over every soil_health record, not just the retrieved chunks
+
+Every nutrient (pH, organic_carbon, nitrogen, phosphorus, potassium) keeps
+its soil rows sorted by value, so a range is a binary search and its count
+is the slice length. Regions (state / district / subdistrict / soil type)
+come from the MetadataIndex postings. A query starts from the smaller of
+the two and checks the other conditions on those rows only.
+"""
+
+import re
+import numpy as np
+
+from aggregation import UNITS, LABELS, SOIL_METRICS, WORD_RE, detect_metric, describe_filters
+
+SOIL_FIELDS = ('state', 'district', 'subdistrict', 'soil_type')
+
+# Subdistrict names repeat across districts, so they are grouped with their district
+GROUP_PARENT = {'subdistrict': 'district'}
+
+METRIC_WORDS = {'organic carbon': 'organic_carbon'}
+for _metric, _keywords in SOIL_METRICS.items():
+    for _keyword in _keywords:
+        METRIC_WORDS.setdefault(_keyword, _metric)
+
+OPERATORS = {
+    'below': 'lt', 'under': 'lt', 'less than': 'lt', 'lower than': 'lt', 'smaller than': 'lt', '<': 'lt',
+    'at most': 'le', 'up to': 'le', '<=': 'le',
+    'above': 'gt', 'over': 'gt', 'greater than': 'gt', 'more than': 'gt', 'higher than': 'gt', '>': 'gt',
+    'at least': 'ge', '>=': 'ge',
+    'between': 'between', 'from': 'between', '=': 'eq',
+}
+
+# "pH below 5.5", "nitrogen of at least 280", "potassium between 100 and 200"
+CONDITION_RE = re.compile(
+    r'\b(' + '|'.join(sorted(METRIC_WORDS, key=len, reverse=True)) + r')\b'
+    r'(?:\s+(?:levels?|values?|content|is|are|was|of|level of))*\s*'
+    r'(' + '|'.join(re.escape(op) for op in sorted(OPERATORS, key=len, reverse=True)) + r')\s*'
+    r'(\d+(?:\.\d+)?)(?:\s*(?:and|to|-)\s*(\d+(?:\.\d+)?))?'
+)
+GROUP_RE = re.compile(r'\b(states|districts|sub-?districts|subdistrict|district|state)\b')
+MAX_GROUPS = 10
+
+
+def detect_conditions(question):
+    """[(metric, operator, low, high)] nutrient ranges a question asks for"""
+    conditions = []
+    for match in CONDITION_RE.finditer(question.lower()):
+        metric = METRIC_WORDS[match.group(1)]
+        operator = OPERATORS[match.group(2)]
+        value = float(match.group(3))
+        if operator == 'between':
+            if match.group(4) is None:
+                continue
+            low, high = sorted((value, float(match.group(4))))
+        else:
+            low = high = value
+        conditions.append((metric, operator, low, high))
+    return conditions
+
+
+def describe_condition(condition):
+    """'pH below 5.5' / 'nitrogen between 200 and 300 kg/ha'"""
+    metric, operator, low, high = condition
+    unit = f" {UNITS[metric]}" if UNITS[metric] else ""
+    words = {'lt': 'below', 'le': 'at most', 'gt': 'above', 'ge': 'at least', 'eq': 'equal to'}
+    if operator == 'between':
+        return f"{LABELS[metric]} between {low:g} and {high:g}{unit}"
+    return f"{LABELS[metric]} {words[operator]} {low:g}{unit}"
+
+
+class SoilIndex:
+    def __init__(self, metadata, index):
+        """
+        Args:
+            metadata: ColumnarMetadata store
+            index: MetadataIndex built over the same store
+        """
+        self.metadata = metadata
+        self.index = index
+        self.rows = index.rows('source', 'soil_health')
+        self.is_soil = np.zeros(len(metadata), dtype=bool)
+        self.is_soil[self.rows] = True
+        self._totals = {}
+
+        # Per nutrient: soil rows with a value, ordered by value
+        self.sorted_values = {}
+        self.sorted_rows = {}
+        for metric in SOIL_METRICS:
+            if metric not in metadata.columns:
+                continue
+            values = metadata.numeric(metric)[self.rows]
+            present = ~np.isnan(values)
+            order = np.argsort(values[present], kind='stable')
+            self.sorted_values[metric] = values[present][order]
+            self.sorted_rows[metric] = self.rows[present][order]
+
+    def _bounds(self, condition):
+        """Slice of a nutrient's sorted rows inside a condition's range"""
+        metric, operator, low, high = condition
+        values = self.sorted_values[metric]
+        lo = 0 if operator in ('lt', 'le') else np.searchsorted(values, low, side='right' if operator == 'gt' else 'left')
+        hi = len(values) if operator in ('gt', 'ge') else np.searchsorted(values, high, side='left' if operator == 'lt' else 'right')
+        return int(lo), int(max(hi, lo))
+
+    def _matches(self, condition, rows):
+        """Boolean mask over rows: True where the row's value is inside the range"""
+        metric, operator, low, high = condition
+        values = self.metadata.numeric(metric)[rows]
+        with np.errstate(invalid='ignore'):
+            if operator == 'lt':
+                return values < high
+            if operator == 'le':
+                return values <= high
+            if operator == 'gt':
+                return values > low
+            if operator == 'ge':
+                return values >= low
+            return (values >= low) & (values <= high)
+
+    @staticmethod
+    def region_filters(filters):
+        """The entity filters that narrow soil records"""
+        return {f: v for f, v in (filters or {}).items() if f in SOIL_FIELDS and v}
+
+    def region(self, filters):
+        """Sorted soil rows of a region (every soil row without filters)"""
+        filters = self.region_filters(filters)
+        if not filters:
+            return self.rows
+        rows = self.index.select(filters)
+        return rows[self.is_soil[rows]]
+
+    def select(self, conditions, filters=None):
+        """(matching sorted soil rows, region rows) for nutrient ranges within a region
+
+        The smallest of the region and the condition slices is the starting
+        set; the other conditions and the region are checked on it.
+        """
+        region = self.region(filters)
+        conditions = [c for c in conditions if c[0] in self.sorted_values]
+        bounds = [self._bounds(condition) for condition in conditions]
+
+        if not conditions or len(region) <= min(hi - lo for lo, hi in bounds):
+            rows = region
+            rest = conditions
+        else:
+            first = int(np.argmin([hi - lo for lo, hi in bounds]))
+            lo, hi = bounds[first]
+            rows = np.sort(self.sorted_rows[conditions[first][0]][lo:hi])
+            rest = conditions[:first] + conditions[first + 1:]
+            if len(region) < len(self.rows) and len(rows):
+                # Region membership of the sorted slice, as in MetadataIndex.select
+                positions = np.minimum(np.searchsorted(region, rows), len(region) - 1)
+                rows = rows[region[positions] == rows]
+
+        for condition in rest:
+            if len(rows):
+                rows = rows[self._matches(condition, rows)]
+        return rows, region
+
+    def count(self, conditions, filters=None):
+        """Exact number of soil records matching every condition within a region"""
+        if len(conditions) == 1 and not self.region_filters(filters) and conditions[0][0] in self.sorted_values:
+            lo, hi = self._bounds(conditions[0])
+            return hi - lo
+        return len(self.select(conditions, filters)[0])
+
+    def _group_codes(self, rows, group_by):
+        """Group code per row; subdistricts are keyed by (district, subdistrict)"""
+        codes = np.asarray(self.metadata.columns[group_by])[rows].astype(np.int64)
+        parent = GROUP_PARENT.get(group_by)
+        if parent is None:
+            return codes
+        parent_codes = np.asarray(self.metadata.columns[parent])[rows].astype(np.int64)
+        width = len(self.metadata.categories[group_by]) + 1
+        return np.where(codes >= 0, (parent_codes + 1) * width + codes, -1)
+
+    def _group_label(self, code, group_by):
+        labels = self.metadata.categories[group_by]
+        parent = GROUP_PARENT.get(group_by)
+        if parent is None:
+            return labels[code]
+        width = len(labels) + 1
+        parent_code, code = divmod(int(code), width)
+        parent_labels = self.metadata.categories[parent]
+        return f"{labels[code]} ({parent_labels[parent_code - 1]})" if parent_code > 0 else labels[code]
+
+    def grouped_counts(self, rows, region, group_by):
+        """[(label, matching records, region records)] per group, most matches first"""
+        matched = self._group_codes(rows, group_by)
+        matched = matched[matched >= 0]
+        if len(matched) == 0:
+            return []
+        codes, counts = np.unique(matched, return_counts=True)
+        all_codes, all_counts = self._group_totals(region, group_by)
+        region_counts = all_counts[np.searchsorted(all_codes, codes)]
+        order = np.lexsort((codes, -counts))
+        return [(self._group_label(codes[i], group_by), int(counts[i]), int(region_counts[i])) for i in order]
+
+    def _group_totals(self, region, group_by):
+        """(group codes, record counts) of a region; kept per level for all soil rows"""
+        if len(region) == len(self.rows) and group_by in self._totals:
+            return self._totals[group_by]
+        codes = self._group_codes(region, group_by)
+        totals = np.unique(codes[codes >= 0], return_counts=True)
+        if len(region) == len(self.rows):
+            self._totals[group_by] = totals
+        return totals
+
+    def summary(self, rows):
+        """metric -> {'count', 'mean', 'min', 'max'} over some soil rows"""
+        stats = {}
+        for metric in self.sorted_values:
+            values = self.metadata.numeric(metric)[rows]
+            values = values[~np.isnan(values)]
+            if len(values):
+                stats[metric] = {'count': int(len(values)), 'mean': float(values.mean()),
+                                 'min': float(values.min()), 'max': float(values.max())}
+        return stats
+
+    def range_query(self, conditions, filters=None, group_by=None):
+        """Soil records within nutrient ranges, counted per group_by region"""
+        filters = self.region_filters(filters)
+        rows, region = self.select(conditions, filters)
+        group_by = group_by or default_group(filters)
+        return {
+            'kind': 'soil_range',
+            'source': 'soil_health',
+            'conditions': conditions,
+            'filters': filters,
+            'group_by': group_by,
+            'count': int(len(rows)),
+            'region_count': int(len(region)),
+            'groups': self.grouped_counts(rows, region, group_by),
+            'stats': self.summary(rows),
+        }
+
+    def region_summary(self, filters=None, group_by=None):
+        """Nutrient statistics of a region, overall and per group_by region"""
+        filters = self.region_filters(filters)
+        rows = self.region(filters)
+        if len(rows) == 0:
+            return None
+        group_by = group_by or default_group(filters)
+        codes = self._group_codes(rows, group_by)
+        rows, codes = rows[codes >= 0], codes[codes >= 0]
+        order = np.argsort(codes, kind='stable')
+        found, starts = np.unique(codes[order], return_index=True)
+        groups = []
+        for code, group_rows in zip(found, np.split(rows[order], starts[1:])):
+            groups.append((self._group_label(code, group_by), int(len(group_rows)), self.summary(group_rows)))
+
+        soil_types = []
+        if 'soil_type' in self.metadata.columns:
+            types = np.asarray(self.metadata.columns['soil_type'])[rows]
+            found, counts = np.unique(types[types >= 0], return_counts=True)
+            soil_types = [(self.metadata.categories['soil_type'][code], int(n))
+                          for code, n in sorted(zip(found, counts), key=lambda item: -item[1])]
+        return {
+            'kind': 'soil_summary',
+            'source': 'soil_health',
+            'filters': filters,
+            'group_by': group_by,
+            'count': int(len(rows)),
+            'stats': self.summary(rows),
+            'groups': groups,
+            'soil_types': soil_types,
+        }
+
+    def answer(self, question, entities, intent=None):
+        """Range or region summary answer for a soil question, or None to fall back
+
+        Args:
+            intent: the IntentRouter intent when the question was routed;
+                region summaries are only given for lookups
+        """
+        conditions = detect_conditions(question)
+        match = GROUP_RE.search(question.lower())
+        group_by = None
+        if match:
+            group_by = match.group(1).replace('-', '').rstrip('s')
+
+        if conditions:
+            result = self.range_query(conditions, entities, group_by)
+        else:
+            words = set(WORD_RE.findall(question.lower()))
+            if intent not in (None, 'lookup') or detect_metric(words)[0] != 'soil_health':
+                return None
+            if not self.region_filters(entities):
+                return None
+            result = self.region_summary(entities, group_by)
+            if result is None:
+                return None
+
+        result['answer'], result['facts'] = format_soil(result)
+        return result
+
+
+def default_group(filters):
+    """The region level one step finer than the filters"""
+    if filters.get('district'):
+        return 'subdistrict'
+    if filters.get('state'):
+        return 'district'
+    return 'state'
+
+
+def format_soil(result):
+    """(answer sentence, fact lines for the Gemini prompt) of a range or summary result"""
+    scope = describe_filters(result['filters'])
+    noun = result['group_by'] + 's'
+
+    def amount(metric, value):
+        return f"{value:,.2f} {UNITS[metric]}".rstrip()
+
+    def stat_line(metric, stats):
+        return (f"{LABELS[metric]}: average {amount(metric, stats['mean'])} "
+                f"(range {stats['min']:,.2f}-{stats['max']:,.2f}, {stats['count']:,} samples)")
+
+    if result['kind'] == 'soil_range':
+        condition = " and ".join(describe_condition(c) for c in result['conditions'])
+        if not result['count']:
+            return (f"No soil samples{scope} have {condition} "
+                    f"(checked {result['region_count']:,} samples)."), []
+        groups = result['groups']
+        facts = [f"{label}: {matched:,} of {total:,} samples ({matched / total:.0%})"
+                 for label, matched, total in groups]
+        listed = ", ".join(f"{label} ({matched:,} of {total:,})" for label, matched, total in groups[:MAX_GROUPS])
+        more = f" and {len(groups) - MAX_GROUPS} more" if len(groups) > MAX_GROUPS else ""
+        return (f"{result['count']:,} of {result['region_count']:,} soil samples{scope} have {condition}, "
+                f"in {len(groups)} {noun}: {listed}{more}."), facts
+
+    stats = result['stats']
+    facts = [stat_line(metric, values) for metric, values in stats.items()]
+    for label, count, group_stats in result['groups']:
+        parts = ", ".join(f"{LABELS[metric]} {amount(metric, values['mean'])}" for metric, values in group_stats.items())
+        facts.append(f"{label} ({count:,} samples): {parts}")
+    summary = "; ".join(f"{LABELS[metric]} {amount(metric, values['mean'])} "
+                        f"({values['min']:,.2f}-{values['max']:,.2f})" for metric, values in stats.items())
+    answer = (f"Soil health{scope} across {result['count']:,} samples in {len(result['groups'])} {noun}: "
+              f"average {summary}.")
+    if result['soil_types']:
+        answer += " Soil types: " + ", ".join(f"{name} ({count / result['count']:.0%})"
+                                              for name, count in result['soil_types']) + "."
+    return answer, facts
@@ -0,0 +1,284 @@
+"""
+Sparse Inverted-Index Search Engine
+Scores only the chunks that share at least one term with the query
+"""
+
+import math
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+EMPTY_IDS = np.empty(0, dtype=np.int64)
+EMPTY_SCORES = np.empty(0, dtype=np.float64)
+
+
+class SparseSearchIndex:
+    # Chunk ids that must never be returned (e.g. rows replaced by a newer segment)
+    deleted_ids = EMPTY_IDS
+
+    def __init__(self, embeddings):
+        """Build term -> postings lists from the CSR embedding matrix"""
+        # Normalize rows exactly like cosine_similarity does so scores match
+        rows = sparse.csr_matrix(embeddings)
+        self.rows = normalize(rows) if rows.shape[0] else rows
+        postings = self.rows.tocsc()
+
+        self.n_chunks, self.n_features = postings.shape
+        self.postings_ptr = postings.indptr
+        self.postings_docs = postings.indices
+        self.postings_weights = postings.data
+
+    @classmethod
+    def from_postings(cls, postings_ptr, postings_docs, postings_weights, rows):
+        """Wrap precomputed postings arrays (e.g. memory-mapped from disk)
+
+        Args:
+            rows: the row-normalized CSR embedding matrix the postings came from
+        """
+        index = cls.__new__(cls)
+        index.rows = rows
+        index.n_chunks, index.n_features = rows.shape
+        index.postings_ptr = postings_ptr
+        index.postings_docs = postings_docs
+        index.postings_weights = postings_weights
+        return index
+
+    def score(self, query_vector, mask=None):
+        """Return (candidate chunk ids, cosine scores) for a single query vector
+
+        Args:
+            mask: optional boolean array over chunks; only True chunks are scored
+        """
+        return self._score_postings(normalize_query(query_vector), mask)
+
+    def _score_postings(self, query, mask=None):
+        """Accumulate postings of an already normalized (terms, weights) query"""
+        terms, weights = query
+
+        if len(terms) == 0:
+            return EMPTY_IDS, EMPTY_SCORES
+
+        starts = self.postings_ptr[terms]
+        ends = self.postings_ptr[terms + 1]
+        lengths = ends - starts
+        total = int(lengths.sum())
+
+        if total == 0:
+            return EMPTY_IDS, EMPTY_SCORES
+
+        # Gather the postings of every query term, in query term order
+        docs = np.concatenate([self.postings_docs[s:e] for s, e in zip(starts, ends)])
+        contrib = np.concatenate([
+            self.postings_weights[s:e] * w for s, e, w in zip(starts, ends, weights)
+        ])
+
+        if mask is not None:
+            keep = mask[docs]
+            docs, contrib = docs[keep], contrib[keep]
+            total = len(docs)
+            if total == 0:
+                return EMPTY_IDS, EMPTY_SCORES
+
+        if total > self.n_chunks // 8:
+            # Dense accumulator is cheaper once postings cover a big part of the corpus
+            scores = np.bincount(docs, weights=contrib, minlength=self.n_chunks)
+            candidates = np.flatnonzero(scores)
+            return candidates, scores[candidates]
+
+        candidates, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=contrib, minlength=len(candidates))
+        return candidates, scores
+
+    def _score_rows(self, query, candidates):
+        """Cosine scores of the given chunk ids only, read row by row"""
+        terms, weights = query
+        if len(candidates) == 0 or len(terms) == 0:
+            return EMPTY_IDS, EMPTY_SCORES
+
+        order = np.argsort(terms, kind='stable')
+        terms, weights = terms[order], weights[order]
+
+        indptr = self.rows.indptr
+        starts = indptr[candidates]
+        ends = indptr[candidates + 1]
+        features = np.concatenate([self.rows.indices[s:e] for s, e in zip(starts, ends)])
+        values = np.concatenate([self.rows.data[s:e] for s, e in zip(starts, ends)])
+
+        # Query weight of each row feature by binary search over the sorted query
+        # terms, so the cost follows the rows read and not the vocabulary size
+        row_ids = np.repeat(np.arange(len(candidates)), ends - starts)
+        pos = np.minimum(np.searchsorted(terms, features), len(terms) - 1)
+        match = terms[pos] == features
+
+        # Per-row dot products: sum feature weight * query weight over each row
+        products = values[match] * weights[pos[match]]
+        scores = np.bincount(row_ids[match], weights=products, minlength=len(candidates))
+
+        hit = scores > 0
+        return candidates[hit], scores[hit]
+
+    def score_candidates(self, query_vector, candidates):
+        """Score a pre-filtered candidate set with whichever path touches less data"""
+        return self._score_candidates(normalize_query(query_vector),
+                                      np.asarray(candidates, dtype=np.int64))
+
+    def _score_candidates(self, query, candidates):
+        terms = query[0]
+        postings_cost = int((self.postings_ptr[terms + 1] - self.postings_ptr[terms]).sum())
+        rows_cost = int((self.rows.indptr[candidates + 1] - self.rows.indptr[candidates]).sum())
+
+        if rows_cost <= postings_cost:
+            return self._score_rows(query, candidates)
+
+        # Large candidate sets: walk the postings and drop non-candidates with a bitmap
+        mask = np.zeros(self.n_chunks, dtype=bool)
+        mask[candidates] = True
+        return self._score_postings(query, mask=mask)
+
+    def search(self, query_vector, top_k=5, candidates=None):
+        """Return (chunk ids, scores) of the top_k chunks for a query vector
+
+        Args:
+            candidates: optional sorted chunk ids to restrict scoring to. When
+                fewer than top_k candidates match, the remaining slots are
+                filled from an unrestricted search.
+        """
+        top_k = min(top_k, self.n_chunks - len(self.deleted_ids))
+        if top_k <= 0:
+            return EMPTY_IDS, EMPTY_SCORES
+
+        query = normalize_query(query_vector)
+
+        if candidates is not None:
+            ids, scores = self._score_candidates(query, np.asarray(candidates, dtype=np.int64))
+            top_ids, top_scores = select_top_k(ids, scores, top_k)
+            if len(top_ids) == top_k:
+                return top_ids, top_scores
+
+            rest_ids, rest_scores = self._search_all(query, top_k)
+            fresh = ~np.isin(rest_ids, top_ids)
+            top_ids = np.concatenate([top_ids, rest_ids[fresh]])[:top_k]
+            top_scores = np.concatenate([top_scores, rest_scores[fresh]])[:top_k]
+            return top_ids, top_scores
+
+        return self._search_all(query, top_k)
+
+    def _search_all(self, query, top_k):
+        candidates, scores = self._score_postings(query)
+        top_ids, top_scores = select_top_k(candidates, scores, top_k)
+
+        if len(top_ids) < top_k:
+            # Pad with zero-score chunks like a full descending argsort would
+            excluded = np.union1d(candidates, self.deleted_ids) if len(self.deleted_ids) else candidates
+            padding = zero_score_padding(excluded, top_k - len(top_ids), self.n_chunks)
+            top_ids = np.concatenate([top_ids, padding])
+            top_scores = np.concatenate([top_scores, np.zeros(len(padding))])
+
+        return top_ids, top_scores
+
+    def score_matrix(self, queries):
+        """(n_queries x n_chunks) CSR matrix of cosine scores for row-normalized queries
+
+        Reuses the postings arrays as a (n_features x n_chunks) CSR matrix,
+        so the whole batch is one sparse matrix product.
+        """
+        postings = sparse.csr_matrix(
+            (self.postings_weights, self.postings_docs, self.postings_ptr),
+            shape=(self.n_features, self.n_chunks), copy=False
+        )
+        return sparse.csr_matrix(queries @ postings)
+
+    def search_batch(self, query_vectors, top_k=5, candidates=None):
+        """Top-k (chunk ids, scores) for every row of a query matrix
+
+        Same ranking as calling search() per query, up to float rounding in
+        the accumulation order.
+
+        Args:
+            query_vectors: sparse matrix with one query per row
+            candidates: optional list with, per query, None or sorted chunk
+                ids to prefer (see search())
+        """
+        n_queries = query_vectors.shape[0]
+        top_k = min(top_k, self.n_chunks - len(self.deleted_ids))
+        if top_k <= 0 or n_queries == 0:
+            return [(EMPTY_IDS, EMPTY_SCORES) for _ in range(n_queries)]
+
+        scores = self.score_matrix(normalize(sparse.csr_matrix(query_vectors, dtype=np.float64)))
+        rows = np.repeat(np.arange(n_queries), np.diff(scores.indptr))
+        ids = scores.indices.astype(np.int64)
+        values = scores.data
+
+        if len(self.deleted_ids):
+            live = ~np.isin(ids, self.deleted_ids)
+            rows, ids, values = rows[live], ids[live], values[live]
+        bounds = np.searchsorted(rows, np.arange(n_queries + 1))
+
+        results = []
+        for i in range(n_queries):
+            top_ids, top_scores = self._select_row(
+                ids[bounds[i]:bounds[i + 1]], values[bounds[i]:bounds[i + 1]], top_k,
+                None if candidates is None else candidates[i]
+            )
+            results.append((top_ids, top_scores))
+        return results
+
+    def _select_row(self, ids, scores, top_k, candidates=None):
+        """Top-k of one row of the score matrix, ranked like search()"""
+        if candidates is None:
+            top_ids, top_scores = select_top_k(ids, scores, top_k)
+        else:
+            # Entity candidates rank ahead of every other chunk
+            candidates = np.asarray(candidates, dtype=np.int64)
+            positions = np.minimum(np.searchsorted(candidates, ids), max(len(candidates) - 1, 0))
+            preferred = candidates[positions] == ids if len(candidates) else np.zeros(len(ids), dtype=bool)
+            top_ids, top_scores = select_top_k(ids[preferred], scores[preferred], top_k)
+            if len(top_ids) < top_k:
+                rest_ids, rest_scores = select_top_k(ids[~preferred], scores[~preferred], top_k - len(top_ids))
+                top_ids = np.concatenate([top_ids, rest_ids])
+                top_scores = np.concatenate([top_scores, rest_scores])
+
+        if len(top_ids) < top_k:
+            # Pad with zero-score chunks like a full descending argsort would
+            excluded = np.union1d(ids, self.deleted_ids) if len(self.deleted_ids) else ids
+            padding = zero_score_padding(excluded, top_k - len(top_ids), self.n_chunks)
+            top_ids = np.concatenate([top_ids, padding])
+            top_scores = np.concatenate([top_scores, np.zeros(len(padding))])
+        return top_ids, top_scores
+
+
+def normalize_query(query_vector):
+    """L2-normalize a single-row sparse query into (terms, weights) arrays
+
+    Same arithmetic as sklearn's normalize (sequential sum of squares, then
+    one division), without its per-call validation overhead.
+    """
+    query_vector = sparse.csr_matrix(query_vector)
+    terms = query_vector.indices.astype(np.int64)
+    weights = query_vector.data.astype(np.float64)
+    norm = math.sqrt(sum(w * w for w in weights.tolist()))
+    if norm > 0:
+        weights = weights / norm
+    return terms, weights
+
+
+def select_top_k(ids, scores, top_k):
+    """Pick the top_k (id, score) pairs without sorting every score
+
+    Ties are broken by descending id, which is the order
+    np.argsort(scores, kind='stable')[::-1] produces.
+    """
+    if len(scores) > top_k:
+        threshold = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+        keep = scores >= threshold
+        ids = ids[keep]
+        scores = scores[keep]
+
+    order = np.lexsort((-ids, -scores))[:top_k]
+    return ids[order], scores[order]
+
+
+def zero_score_padding(candidates, count, n_chunks):
+    """Highest chunk ids that are not candidates, in descending order"""
+    window = np.arange(max(n_chunks - count - len(candidates), 0), n_chunks)
+    return np.setdiff1d(window, candidates)[::-1][:count]
@@ -0,0 +1,289 @@
+"""
+Memory-Mapped Vector Database Format
+Stores the vector database as raw .npy arrays so every worker can open it
+with np.load(mmap_mode='r') and share the same page-cache pages
+
+Layout of a vector database directory:
+    manifest.json              method, version, shapes, vectorizer params, metadata schema
+    embeddings_data.npy        row-normalized CSR embeddings (data / indices / indptr)
+    embeddings_indices.npy
+    embeddings_indptr.npy
+    postings_ptr.npy           inverted index used by SparseSearchIndex
+    postings_docs.npy
+    postings_weights.npy
+    chunks_blob.npy            UTF-8 chunk text, concatenated
+    chunks_offsets.npy         start offset of every chunk in the blob (n_chunks + 1)
+    vocabulary.json            vectorizer terms ordered by feature index (tfidf only)
+    idf.npy                    vectorizer IDF weights
+    metadata/<field>.npy       one column per metadata field
+    dense_*.npy, ivf_*.npy     optional dense ANN index (see dense_search.py)
+    rollup_*.npy               optional crop production rollup tables (see rollups.py)
+"""
+
+import json
+import os
+import pickle
+import shutil
+import sys
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from dense_search import DenseSearchIndex
+from metadata_store import ColumnarMetadata
+from parallel_vectorizer import HashingTfidfVectorizer
+from rollups import RollupTables
+from sparse_search import SparseSearchIndex
+
+FORMAT_NAME = 'saarthi-mmap'
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+
+
+class ChunkStore:
+    """Read-only list of chunk strings backed by a memory-mapped UTF-8 blob"""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, chunks):
+        encoded = [chunk.encode('utf-8') for chunk in chunks]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(blob, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        idx = int(idx)
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("chunk index out of range")
+        return self.blob[self.offsets[idx]:self.offsets[idx + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+
+def is_vector_store(path):
+    """True if path is a directory in the memory-mapped format"""
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def _vectorizer_params(vectorizer):
+    """JSON-serializable constructor params of a TfidfVectorizer"""
+    if isinstance(vectorizer, HashingTfidfVectorizer):
+        return vectorizer.get_params()
+    params = vectorizer.get_params()
+    params['dtype'] = np.dtype(params['dtype']).name
+    params.pop('vocabulary', None)
+    for name in ('tokenizer', 'preprocessor'):
+        if params.get(name) is not None:
+            raise ValueError(f"Cannot store a vectorizer with a custom {name}")
+    if callable(params.get('analyzer')):
+        raise ValueError("Cannot store a vectorizer with a custom analyzer")
+    if isinstance(params.get('stop_words'), (set, frozenset, tuple)):
+        params['stop_words'] = sorted(params['stop_words'])
+    params['ngram_range'] = list(params['ngram_range'])
+    return params
+
+
+def _load_vectorizer(vectorizer_type, params, vocabulary, idf):
+    """Rebuild a fitted vectorizer from stored params, terms and IDF"""
+    if vectorizer_type == 'hashing':
+        return HashingTfidfVectorizer(idf=np.asarray(idf), **params)
+    params = dict(params)
+    params['dtype'] = np.dtype(params['dtype']).type
+    params['ngram_range'] = tuple(params['ngram_range'])
+    vectorizer = TfidfVectorizer(**params)
+    vectorizer.vocabulary_ = {term: i for i, term in enumerate(vocabulary)}
+    if params.get('use_idf', True):
+        vectorizer.idf_ = np.asarray(idf)
+    return vectorizer
+
+
+def save_vector_store(vector_db, output_dir, extra_arrays=None):
+    """Write a vector database dict to output_dir in the memory-mapped format
+
+    The directory is written next to the target and renamed into place, so
+    readers never see a half-written database.
+
+    Args:
+        extra_arrays: optional file name -> array written into the same directory
+    """
+    output_dir = os.path.abspath(output_dir)
+    tmp_dir = f"{output_dir}.tmp-{os.getpid()}"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(os.path.join(tmp_dir, 'metadata'))
+
+    def put(name, array):
+        np.save(os.path.join(tmp_dir, name), np.ascontiguousarray(array))
+
+    # Rows are stored L2-normalized so they double as the search index's row store
+    index = SparseSearchIndex(vector_db['embeddings'])
+    embeddings = index.rows
+    put('embeddings_data.npy', embeddings.data)
+    put('embeddings_indices.npy', embeddings.indices)
+    put('embeddings_indptr.npy', embeddings.indptr)
+
+    put('postings_ptr.npy', index.postings_ptr)
+    put('postings_docs.npy', index.postings_docs)
+    put('postings_weights.npy', index.postings_weights)
+
+    chunks = vector_db['chunks']
+    if not isinstance(chunks, ChunkStore):
+        chunks = ChunkStore.from_strings(chunks)
+    put('chunks_blob.npy', chunks.blob)
+    put('chunks_offsets.npy', chunks.offsets)
+
+    metadata = vector_db['metadata']
+    if not isinstance(metadata, ColumnarMetadata):
+        metadata = ColumnarMetadata.from_records(metadata)
+    for field, column in metadata.columns.items():
+        put(os.path.join('metadata', f'{field}.npy'), column)
+
+    vectorizer = vector_db['vectorizer']
+    if isinstance(vectorizer, HashingTfidfVectorizer):
+        vectorizer_type = 'hashing'
+        put('idf.npy', vectorizer.idf_)
+    else:
+        vectorizer_type = 'tfidf'
+        vocabulary = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+        with open(os.path.join(tmp_dir, 'vocabulary.json'), 'w', encoding='utf-8') as f:
+            json.dump(vocabulary, f, ensure_ascii=False)
+        if getattr(vectorizer, 'use_idf', False):
+            put('idf.npy', vectorizer.idf_)
+
+    manifest = {
+        'format': FORMAT_NAME,
+        'format_version': FORMAT_VERSION,
+        'method': vector_db.get('method', 'tf-idf_advanced'),
+        'n_features': int(embeddings.shape[1]),
+        'n_chunks': int(embeddings.shape[0]),
+        'embeddings_normalized': True,
+        'trained_date': vector_db.get('trained_date'),
+        'version': vector_db.get('version'),
+        'vectorizer_type': vectorizer_type,
+        'vectorizer': _vectorizer_params(vectorizer),
+        'metadata': {
+            'fields': list(metadata.columns),
+            'categories': metadata.categories,
+            'schemas': metadata.schemas,
+            'decimals': metadata.decimals,
+        },
+    }
+    dense_index = vector_db.get('dense_index')
+    if dense_index is not None:
+        for name, array in dense_index.arrays().items():
+            put(name, array)
+        manifest['dense'] = dense_index.params()
+    rollups = vector_db.get('rollups')
+    if rollups is not None:
+        for name, array in rollups.arrays().items():
+            put(name, array)
+        manifest['rollups'] = rollups.params()
+
+    for name, array in (extra_arrays or {}).items():
+        put(name, array)
+
+    with open(os.path.join(tmp_dir, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+    # Swap the new directory into place
+    old_dir = f"{output_dir}.old-{os.getpid()}"
+    if os.path.exists(output_dir):
+        os.rename(output_dir, old_dir)
+    os.rename(tmp_dir, output_dir)
+    if os.path.exists(old_dir):
+        shutil.rmtree(old_dir)
+
+    return output_dir
+
+
+def load_vector_store(path, mmap_mode='r'):
+    """Open a memory-mapped vector database as a vector_db dict
+
+    The returned dict has the same keys as the pickled format, plus
+    'search_index' holding a ready SparseSearchIndex and, for databases
+    with a dense index or rollup tables, 'dense_index' / 'rollups'.
+    """
+    with open(os.path.join(path, MANIFEST), encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if manifest.get('format') != FORMAT_NAME:
+        raise ValueError(f"Unknown vector database format in {path}")
+    if manifest.get('format_version', 0) > FORMAT_VERSION:
+        raise ValueError(f"Vector database format version {manifest['format_version']} is newer than supported")
+
+    def get(name):
+        return np.load(os.path.join(path, name), mmap_mode=mmap_mode)
+
+    n_chunks = manifest['n_chunks']
+    n_features = manifest['n_features']
+
+    embeddings = sparse.csr_matrix(
+        (get('embeddings_data.npy'), get('embeddings_indices.npy'), get('embeddings_indptr.npy')),
+        shape=(n_chunks, n_features), copy=False
+    )
+    search_index = SparseSearchIndex.from_postings(
+        get('postings_ptr.npy'), get('postings_docs.npy'), get('postings_weights.npy'), embeddings
+    )
+
+    chunks = ChunkStore(get('chunks_blob.npy'), get('chunks_offsets.npy'))
+
+    meta = manifest['metadata']
+    columns = {field: get(os.path.join('metadata', f'{field}.npy')) for field in meta['fields']}
+    metadata = ColumnarMetadata(columns, meta['categories'], meta['schemas'], meta.get('decimals'))
+
+    vectorizer_type = manifest.get('vectorizer_type', 'tfidf')
+    vocabulary = None
+    if vectorizer_type == 'tfidf':
+        with open(os.path.join(path, 'vocabulary.json'), encoding='utf-8') as f:
+            vocabulary = json.load(f)
+    idf_path = os.path.join(path, 'idf.npy')
+    idf = np.load(idf_path) if os.path.exists(idf_path) else None
+    vectorizer = _load_vectorizer(vectorizer_type, manifest['vectorizer'], vocabulary, idf)
+
+    vector_db = {
+        'chunks': chunks,
+        'metadata': metadata,
+        'embeddings': embeddings,
+        'vectorizer': vectorizer,
+        'search_index': search_index,
+        'method': manifest['method'],
+        'n_features': n_features,
+        'n_chunks': n_chunks,
+        'trained_date': manifest.get('trained_date'),
+        'version': manifest.get('version'),
+        'format': manifest['format'],
+    }
+    if 'dense' in manifest:
+        vector_db['dense_index'] = DenseSearchIndex.load(path, manifest['dense'], mmap_mode=mmap_mode)
+    if 'rollups' in manifest:
+        vector_db['rollups'] = RollupTables.load(path, manifest['rollups'], mmap_mode=mmap_mode)
+    return vector_db
+
+
+def convert_pickle(pickle_path, output_dir):
+    """Convert a legacy vector_database.pkl into the memory-mapped format"""
+    print(f"Loading pickled vector database from {pickle_path}...")
+    with open(pickle_path, 'rb') as f:
+        vector_db = pickle.load(f)
+
+    print(f"Writing memory-mapped vector database to {output_dir}...")
+    save_vector_store(vector_db, output_dir)
+    print(f"✅ Converted {len(vector_db['chunks']):,} chunks")
+    return output_dir
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else 'vector_database.pkl'
+    target = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(source)[0]
+    convert_pickle(source, target)
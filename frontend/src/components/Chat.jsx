@@ -1,6 +1,5 @@
 import { useState, useEffect, useRef } from 'react'
 import { Send, Plus, Menu, Settings, MessageSquare, Loader2 } from 'lucide-react'
-import axios from 'axios'
 import ReactMarkdown from 'react-markdown'
 import remarkGfm from 'remark-gfm'
 
@@ -42,6 +41,76 @@ const Chat = () => {
     }
   }, [isLoading])
 
+  // Replace the last (assistant) message with updated fields
+  const updateLastMessage = (fields) => {
+    setMessages(prev => [...prev.slice(0, -1), { ...prev[prev.length - 1], ...fields }])
+  }
+
+  // Ask /query/stream: sources arrive first, then Gemini tokens, then a final "done" event
+  const streamAnswer = async (question) => {
+    const response = await fetch(`${API_URL}/query/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      credentials: 'include',
+      body: JSON.stringify({
+        question,
+        top_k: 10,  // Get more results for better accuracy
+        use_gemini: true  // Enable Gemini enhancement
+      })
+    })
+    if (!response.ok || !response.body) {
+      const data = await response.json().catch(() => ({}))
+      throw new Error(data.error || `Server returned ${response.status}`)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    let streamed = ''
+
+    const handleEvent = (event, data) => {
+      if (event === 'sources') {
+        setMessages(prev => [...prev, {
+          role: 'assistant',
+          content: '',
+          sources: data.sources || [],
+          confidence: data.confidence || 0,
+          ai_enhanced: false,
+          streaming: true
+        }])
+      } else if (event === 'token') {
+        streamed += data.text
+        updateLastMessage({ content: streamed })
+      } else if (event === 'done') {
+        updateLastMessage({
+          content: data.answer || 'I received an empty response.',
+          sources: data.sources || [],
+          confidence: data.confidence || 0,
+          ai_enhanced: data.ai_enhanced || false,
+          streaming: false
+        })
+      }
+    }
+
+    while (true) {
+      const { value, done } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+      let boundary
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const block = buffer.slice(0, boundary)
+        buffer = buffer.slice(boundary + 2)
+        let event = 'message'
+        let data = ''
+        for (const line of block.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7)
+          else if (line.startsWith('data: ')) data += line.slice(6)
+        }
+        if (data) handleEvent(event, JSON.parse(data))
+      }
+    }
+  }
+
   const handleSend = async (e) => {
     e.preventDefault()
     if (!input.trim() || isLoading) return
@@ -53,25 +122,12 @@ const Chat = () => {
     setIsLoading(true)
 
     try {
-      const response = await axios.post(`${API_URL}/query`, {
-        question: userMessage,
-        top_k: 10,  // Get more results for better accuracy
-        use_gemini: true  // Enable Gemini enhancement
-      })
-
-      const answer = response.data.answer || 'I received an empty response.'
-      const assistantMessage = { 
-        role: 'assistant', 
-        content: answer,
-        sources: response.data.sources || [],
-        confidence: response.data.confidence || 0,
-        ai_enhanced: response.data.ai_enhanced || false
-      }
-      
-      setMessages(prev => [...prev, assistantMessage])
+      await streamAnswer(userMessage)
     } catch (error) {
       console.error('Error fetching response:', error)
-      const errorMessage = error.response?.data?.error || 'Failed to get response from the server. Please make sure the backend is running.'
+      const errorMessage = error.message && error.name !== 'TypeError'
+        ? error.message
+        : 'Failed to get response from the server. Please make sure the backend is running.'
       setMessages(prev => [...prev, { 
         role: 'assistant', 
         content: `Error: ${errorMessage}`
@@ -221,7 +277,7 @@ const Chat = () => {
               )}
             </div>
           ))}
-          {isLoading && (
+          {isLoading && !messages[messages.length - 1]?.streaming && (
             <div className="flex gap-4 justify-start">
               <div className="flex-shrink-0">
                 <div className="w-10 h-10 rounded-full bg-gradient-to-br from-purple-500 to-pink-500 flex items-center justify-center text-sm font-bold text-white shadow-xl">